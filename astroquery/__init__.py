@@ -14,6 +14,8 @@ from ._astropy_init import *
 
 import os
 
+from astropy import config as _config
+
 
 # Set the bibtex entry to the article referenced in CITATION.
 def _get_bibtex():
@@ -27,3 +29,128 @@ def _get_bibtex():
 
 
 __citation__ = __bibtex__ = _get_bibtex()
+
+
+class Cache_Conf(_config.ConfigNamespace):
+    """
+    Configuration parameters for the astroquery request cache.
+    """
+    cache_backend = _config.ConfigItem(
+        ['filesystem', 'sqlite'],
+        'Storage backend used for cached responses.  "filesystem" keeps '
+        'track of entries with file timestamps, "sqlite" keeps an index '
+        'database next to the entries in each cache directory.')
+
+    cache_timeout = _config.ConfigItem(
+        604800,
+        'Astroquery-wide cache timeout (seconds).  Default is 1 week '
+        '(604800).  Setting to None prevents the cache from expiring.',
+        cfgtype='integer(default=None)')
+
+    cache_service_timeouts = _config.ConfigItem(
+        [],
+        'Per-service cache timeouts overriding cache_timeout, given as a '
+        'list of "Service = seconds" entries, e.g. "Simbad = 86400".  The '
+        'service name is the name of the service cache directory.',
+        cfgtype='string_list')
+
+    cache_max_size = _config.ConfigItem(
+        None,
+        'Maximum size (bytes) of the cache of each service.  The least '
+        'recently used entries are evicted beyond that size.  None means '
+        'unlimited.',
+        cfgtype='integer(default=None)')
+
+    cache_parsed_results = _config.ConfigItem(
+        False,
+        'Also cache the results parsed from cached responses by the '
+        'synchronous query methods of the services supporting it, so that '
+        'repeated queries skip parsing.')
+
+    cache_lock_timeout = _config.ConfigItem(
+        None,
+        'Maximum time (seconds) to wait for another process fetching the '
+        'same cache entry or downloading the same file.  None waits as long '
+        'as that process does.',
+        cfgtype='float(default=None)')
+
+    cache_compression = _config.ConfigItem(
+        ['none', 'gzip', 'bz2', 'lzma', 'zstd'],
+        'Codec compressing the cached responses of the content types listed '
+        'in cache_compressed_types.  "zstd" requires the zstandard package '
+        '(gzip is used otherwise).  Compressed entries are read whatever '
+        'this setting.')
+
+    cache_compressed_types = _config.ConfigItem(
+        ['text/*', 'application/*xml', 'application/*json',
+         'application/x-votable*', 'application/csv'],
+        'Patterns of the content types of the responses compressed in the '
+        'cache, e.g. "text/*".  Bodies starting like FITS files or '
+        'compressed data are never compressed.',
+        cfgtype='string_list')
+
+
+cache_conf = Cache_Conf()
+
+
+class Connection_Conf(_config.ConfigNamespace):
+    """
+    Configuration parameters for the HTTP connections of the query classes.
+    """
+    connection_pool_size = _config.ConfigItem(
+        20,
+        'Number of connections kept open to each host, shared by all the '
+        'query classes of the process.')
+
+    connection_pool_block = _config.ConfigItem(
+        False,
+        'Wait for a connection of the pool of a host to be free rather than '
+        'opening (and discarding) more connections than connection_pool_size '
+        'when that many requests are sent at once.')
+
+    connection_keep_alive = _config.ConfigItem(
+        True,
+        'Enable TCP keep-alive on the pooled connections, so that idle '
+        'connections are not dropped by firewalls and NAT gateways.')
+
+    connection_idle_timeout = _config.ConfigItem(
+        60.,
+        'Time (seconds) after which an idle pooled connection is closed '
+        'rather than reused.  0 to reuse the connections until the server '
+        'closes them.')
+
+    rate_limit = _config.ConfigItem(
+        0.,
+        'Maximum number of requests per second sent by a service to a host, '
+        'for the services setting it neither in their own configuration nor '
+        'in service_settings.  0 disables the limit.')
+
+    rate_burst = _config.ConfigItem(
+        1,
+        'Number of requests that can be sent at once before rate_limit '
+        'applies.')
+
+    max_retries = _config.ConfigItem(
+        None,
+        'Number of times a request which failed, with a connection error or '
+        'an HTTP 429, 502, 503 or 504 response, is sent again, for the '
+        'services setting it neither in their own configuration nor in '
+        'service_settings.  None uses the retry policy of the service.',
+        cfgtype='integer(default=None)')
+
+    backoff_factor = _config.ConfigItem(
+        None,
+        'Time (seconds) waited before retrying a failed request, doubled '
+        'after each retry.  None uses the retry policy of the service.',
+        cfgtype='float(default=None)')
+
+    service_settings = _config.ConfigItem(
+        [],
+        'Per-service request settings overriding the items above and those '
+        'of the configuration of the services, given as a list of '
+        '"Service.item = value" entries, e.g. "Vizier.rate_limit = 2".  The '
+        'service name is the name of the service cache directory.',
+        cfgtype='string_list')
+
+
+connection_conf = Connection_Conf()
@@ -2,7 +2,6 @@
 from __future__ import print_function
 import json
 import os.path
-import keyring
 import numpy as np
 import re
 import tarfile
@@ -24,6 +23,7 @@ from astropy.time import Time
 
 from ..exceptions import (RemoteServiceError, LoginError)
 from ..utils import commons
+from ..utils.retry import RetryPolicy
 from ..utils.process_asyncs import async_to_sync
 from ..query import QueryWithLogin
 from .tapsql import _gen_pos_sql, _gen_str_sql, _gen_numeric_sql,\
@@ -189,6 +189,8 @@ class AlmaClass(QueryWithLogin):
     TIMEOUT = conf.timeout
     archive_url = conf.archive_url
     USERNAME = conf.username
+    # empirically, downloads failing with HTTP 500 work the second time
+    retry_policy = RetryPolicy(statuses=(429, 500, 502, 503, 504))
 
     def __init__(self):
         # sia service does not need disambiguation but tap does
@@ -667,16 +669,9 @@ class AlmaClass(QueryWithLogin):
                                                            'dataPortal/sso/'),
                                           fileLink))
                     raise ex
-                elif ex.response.status_code == 500:
-                    # empirically, this works the second time most of the time...
-                    filename = self._request("GET", fileLink, save=True,
-                                             savedir=savedir,
-                                             timeout=self.TIMEOUT,
-                                             cache=cache,
-                                             auth=auth,
-                                             continuation=continuation)
-                    downloaded_files.append(filename)
                 else:
+                    # server errors (500 ...) have already been retried
+                    # according to self.retry_policy
                     raise ex
         return downloaded_files
 
@@ -759,6 +754,7 @@ class AlmaClass(QueryWithLogin):
         """
         Get the auth info (user, password) for use in another function
         """
+        import keyring
 
         if username is None:
             if not self.USERNAME:
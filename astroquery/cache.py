@@ -0,0 +1,1053 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Storage backends for the responses cached by `~astroquery.query.BaseQuery`.
+
+Every service caches its responses in its own directory
+(``BaseQuery.cache_location``).  A backend manages the entries of one such
+directory: it looks them up by request hash, expires them after the
+configured timeout and evicts the least recently used entries once the
+directory grows beyond the configured maximum size.
+
+An entry is made of the raw response body (``<hash>.body``) and a small JSON
+record with the status, headers and URL of the response (``<hash>.json``).
+On a hit, a `CachedResponse` is rebuilt from the record and only reads the
+body when its content is first accessed.  Entries written by earlier
+versions of astroquery as pickled responses (``<hash>.pickle``) are still
+read.
+
+The record keeps the ``ETag`` and ``Last-Modified`` validators of the
+response, so that queries made with ``cache='revalidate'`` can ask the
+server whether an entry is still current (see
+`CacheBackend.conditional_headers`) and keep using it, refreshed, when the
+server answers ``304 Not Modified``.
+
+Entries are written to temporary files renamed once complete, so that
+processes sharing a cache directory never read partially written entries.
+The `CacheBackend.lock` of an entry lets the processes missing it wait for
+the one fetching it rather than all sending the same request.
+
+Bodies of textual content types (VOTables, CSV, JSON...) can be stored
+compressed with the codec set by ``cache_conf.cache_compression``, which is
+recorded in the record of each entry: they are decompressed transparently
+when read, whatever the codec configured at that time.  Bodies of other
+content types, such as FITS files, and small bodies are stored as they are.
+
+When ``cache_conf.cache_parsed_results`` is set, the tables (or lists of
+tables) parsed from cached responses by the synchronous ``query_*`` methods
+of the services opting in (see ``BaseQuery._parse_result_key``) are stored
+as well, as FITS binary tables along with their metadata
+(``<hash>.result``), so that repeated queries skip parsing altogether.
+
+The caches of all the services, in the subdirectories of
+`get_cache_root`, are inspected with `list_entries`, pruned with `prune`
+and filled ahead of time with `warm`, also available from the command line
+as ``astroquery-cache``.
+"""
+import abc
+import bz2
+import collections
+import copy
+import fnmatch
+import gzip
+import importlib
+import json
+import lzma
+import mmap
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from astropy.config import paths
+from astropy.io import fits
+from astropy.logger import log
+from astropy.table import Column, MaskedColumn, Table
+
+from . import cache_conf
+from .utils.filelock import FileLock, atomic_write
+
+__all__ = ['CacheBackend', 'FileSystemCache', 'SQLiteCache', 'CacheEntry',
+           'CachedResponse', 'CACHE_BACKENDS', 'get_cache_backend',
+           'get_cache_timeout', 'get_compression', 'CacheInfo',
+           'get_cache_root', 'get_lock_dir', 'list_entries', 'prune',
+           'warm']
+__doctest_skip__ = ['warm']
+
+
+# Headers of a 304 response describing its (empty) body rather than the
+# cached one
+_ENTITY_HEADERS = ('content-length', 'content-encoding', 'content-type',
+                   'transfer-encoding')
+
+# Bodies smaller than this (bytes) are not worth compressing
+_MIN_COMPRESSED_SIZE = 1024
+
+# Leading bytes of binary formats, which are stored uncompressed whatever
+# their announced content type: FITS and already compressed data
+_BINARY_SIGNATURES = (b'SIMPLE  =', b'\x1f\x8b', b'PK\x03\x04', b'BZh',
+                      b'\xfd7zXZ\x00', b'\x28\xb5\x2f\xfd')
+
+CacheEntry = collections.namedtuple('CacheEntry',
+                                    ['key', 'path', 'size', 'created',
+                                     'accessed'])
+
+CacheInfo = collections.namedtuple('CacheInfo',
+                                   ['service', 'key', 'url', 'size',
+                                    'created', 'accessed'])
+
+
+def get_cache_timeout(service=None):
+    """
+    Return the cache timeout (seconds) configured for ``service``.
+
+    Entries of ``cache_conf.cache_service_timeouts`` take precedence over
+    the astroquery-wide ``cache_conf.cache_timeout``.  `None` means the
+    entries never expire.
+    """
+    for item in cache_conf.cache_service_timeouts:
+        name, _, value = item.partition('=')
+        if name.strip() == service:
+            value = value.strip()
+            return None if value.lower() in ('', 'none') else float(value)
+    return cache_conf.cache_timeout
+
+
+def _compression_writer(compression, fileobj):
+    """ Wrap the binary file ``fileobj`` to write to it compressed """
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=6,
+                             mtime=0)
+    elif compression == 'bz2':
+        return bz2.BZ2File(fileobj, 'wb')
+    elif compression == 'lzma':
+        return lzma.LZMAFile(fileobj, 'wb')
+    elif compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor().stream_writer(fileobj,
+                                                        closefd=False)
+    raise ValueError("Unknown compression {0!r}".format(compression))
+
+
+def _compression_reader(compression, path):
+    """ Open the file ``path``, compressed with ``compression``, to read """
+    if compression == 'gzip':
+        return gzip.open(path, 'rb')
+    elif compression == 'bz2':
+        return bz2.open(path, 'rb')
+    elif compression == 'lzma':
+        return lzma.open(path, 'rb')
+    elif compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'))
+    raise ValueError("Unknown compression {0!r}".format(compression))
+
+
+_zstd_warned = False
+
+
+def get_compression(response):
+    """
+    Return the codec compressing the body of ``response`` in the cache, or
+    `None` to store it as it is.
+
+    The codec is ``cache_conf.cache_compression``, for the bodies of at
+    least 1 kB with a content type matching one of the patterns of
+    ``cache_conf.cache_compressed_types`` and not starting with the
+    signature of a binary format (FITS, gzip, zip, ...).
+    """
+    global _zstd_warned
+    compression = cache_conf.cache_compression
+    if compression == 'none':
+        return None
+    content = response.content
+    if len(content) < _MIN_COMPRESSED_SIZE:
+        return None
+    content_type = response.headers.get('Content-Type', '')
+    content_type = content_type.split(';')[0].strip().lower()
+    if not any(fnmatch.fnmatchcase(content_type, pattern.strip().lower())
+               for pattern in cache_conf.cache_compressed_types):
+        return None
+    if content.startswith(_BINARY_SIGNATURES):
+        return None
+    if compression == 'zstd':
+        try:
+            import zstandard  # noqa
+        except ImportError:
+            if not _zstd_warned:
+                log.warning("zstandard is not installed, cached responses "
+                            "are compressed with gzip instead")
+                _zstd_warned = True
+            return 'gzip'
+    return compression
+
+
+def _json_default(value):
+    """ Convert the numpy scalars of the metadata of a table for `json` """
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("{0!r} cannot be serialized".format(value))
+
+
+def _result_to_fits(result):
+    """
+    Return the `~astropy.io.fits.HDUList` storing ``result``, a
+    `~astropy.table.Table` or a `~astroquery.utils.TableList` of them, or
+    `None` for other results.
+
+    Each table is stored in a binary table HDU, of its columns named after
+    their position (``c<i>``) and of the masks of its masked columns
+    (``m<i>``).  Strings are stored as arrays of bytes, UTF-8 encoded for
+    unicode columns.  The primary HDU holds, as JSON, the names and
+    metadata of the tables and the names, types, units, formats,
+    descriptions and metadata of their columns.  Tables with mixin columns
+    (e.g. `~astropy.time.Time`) or metadata which cannot be written as JSON
+    raise `TypeError`.
+    """
+    from .utils.commons import TableList
+    if type(result) is Table:
+        kind, tables = 'Table', [(None, result)]
+    elif type(result) is TableList:
+        if not all(type(table) is Table for table in result.values()):
+            return None
+        kind, tables = 'TableList', list(zip(result.keys(), result.values()))
+    else:
+        return None
+    header = {'result': kind, 'tables': []}
+    hdus = [None]
+    for name, table in tables:
+        columns = Table()
+        infos = []
+        for index, column in enumerate(table.itercols()):
+            if not isinstance(column, Column):
+                raise TypeError("Column {0!r} is a mixin"
+                                .format(column.info.name))
+            data = np.asarray(column)
+            if data.dtype.kind == 'U':
+                data = np.char.encode(data, 'utf-8')
+            if data.dtype.kind == 'S':
+                # as bytes, FITS strips the trailing spaces of the strings
+                data = np.ascontiguousarray(data)
+                data = data.view('u1').reshape(data.shape
+                                               + (data.dtype.itemsize,))
+            elif data.dtype.kind == 'i' and data.dtype.itemsize == 1:
+                # FITS has no signed bytes
+                data = data.astype('i2')
+            columns['c{0}'.format(index)] = data
+            if isinstance(column, MaskedColumn):
+                columns['m{0}'.format(index)] = np.ma.getmaskarray(column)
+            infos.append({'name': column.info.name,
+                          'dtype': column.dtype.str,
+                          'shape': column.shape[1:],
+                          'unit': (None if column.unit is None
+                                   else column.unit.to_string()),
+                          'format': column.info.format,
+                          'description': column.info.description,
+                          'meta': column.info.meta})
+        header['tables'].append({'name': name, 'meta': table.meta,
+                                 'columns': infos})
+        hdus.append(fits.table_to_hdu(columns))
+    hdus[0] = fits.PrimaryHDU(np.frombuffer(
+        json.dumps(header, default=_json_default).encode('utf-8'),
+        dtype=np.uint8))
+    return fits.HDUList(hdus)
+
+
+def _result_from_fits(hdus):
+    """ Return the result stored in ``hdus`` by `_result_to_fits` """
+    from .utils.commons import TableList
+    header = json.loads(hdus[0].data.tobytes().decode('utf-8'),
+                        object_pairs_hook=collections.OrderedDict)
+    tables = []
+    for table, hdu in zip(header['tables'], hdus[1:]):
+        data = hdu.data
+        columns = []
+        for index, info in enumerate(table['columns']):
+            dtype = np.dtype(info['dtype'])
+            values = np.array(data['c{0}'.format(index)])
+            if not len(values):
+                values = np.zeros((0,) + tuple(info['shape']), dtype=dtype)
+            elif dtype.kind in 'SU':
+                values = np.ascontiguousarray(values, dtype='u1')
+                values = values.view('S{0}'.format(values.shape[-1]))
+                values = values.reshape(values.shape[:-1])
+                if dtype.kind == 'U':
+                    values = np.char.decode(values, 'utf-8')
+            attributes = dict(data=values.astype(dtype), name=info['name'],
+                              unit=info['unit'], format=info['format'],
+                              description=info['description'],
+                              meta=info['meta'])
+            mask = 'm{0}'.format(index)
+            if data is not None and mask in data.names:
+                columns.append(MaskedColumn(mask=np.array(data[mask]),
+                                            **attributes))
+            else:
+                columns.append(Column(**attributes))
+        tables.append((table['name'],
+                       Table(columns, meta=table['meta'], copy=False)))
+    if header['result'] == 'Table':
+        return tables[0][1]
+    return TableList(tables)
+
+
+class CachedResponse(requests.Response):
+    """
+    A `requests.Response` rebuilt from a cache entry.
+
+    The body is read from ``body_path`` the first time the content is
+    accessed.  Parsers working on files can use `open` or `mmap` instead and
+    never hold a copy of the body in memory.  Bodies stored compressed
+    (``compression`` being the codec) are decompressed as they are read.
+    """
+
+    def __init__(self, body_path, status_code=200, headers=None, url=None,
+                 encoding=None, reason=None, compression=None):
+        super(CachedResponse, self).__init__()
+        self.body_path = body_path
+        self.compression = compression
+        self.status_code = status_code
+        self.headers.update(headers or {})
+        self.url = url
+        self.encoding = encoding
+        self.reason = reason
+        self._content_consumed = True
+
+    @property
+    def _content(self):
+        if self._body is False and self.__dict__.get('body_path'):
+            with self.open() as f:
+                self._body = f.read()
+        return self._body
+
+    @_content.setter
+    def _content(self, value):
+        self._body = value
+
+    def open(self):
+        """ Open the cached body as a binary file """
+        if self.compression:
+            return _compression_reader(self.compression, self.body_path)
+        return open(self.body_path, 'rb')
+
+    def mmap(self):
+        """
+        Memory-map the cached body, read-only.  Compressed bodies cannot be
+        mapped, and are returned decompressed in memory instead.
+        """
+        if self.compression:
+            return self.content
+        with self.open() as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class CacheBackend(metaclass=abc.ABCMeta):
+    """
+    Base class of the cache backends, which implement `entries`.
+
+    Parameters
+    ----------
+    location : str
+        The directory holding the cache entries.
+    timeout : float or None
+        Age (seconds) after which entries expire.  `None` to never expire.
+    max_size : int or None
+        Maximum total size (bytes) of the entries.  The least recently used
+        entries are evicted beyond that size.  `None` for no limit.
+    """
+
+    def __init__(self, location, timeout=None, max_size=None):
+        self.location = location
+        self.timeout = timeout
+        self.max_size = max_size
+        os.makedirs(location, exist_ok=True)
+
+    def path(self, key):
+        """ Path of the file holding the body of the entry ``key`` """
+        return os.path.join(self.location, key + '.body')
+
+    def meta_path(self, key):
+        """ Path of the record of the entry ``key`` """
+        return os.path.join(self.location, key + '.json')
+
+    def legacy_path(self, key):
+        """ Path of the entry ``key`` as pickled by earlier versions """
+        return os.path.join(self.location, key + '.pickle')
+
+    def result_path(self, key):
+        """ Path of the parsed result stored under ``key`` """
+        return os.path.join(self.location, key + '.result')
+
+    def lock(self, key):
+        """
+        Return a `~astroquery.utils.filelock.FileLock` serializing the
+        processes (and threads) fetching the entry ``key``.
+        """
+        return FileLock(os.path.join(self.location, key + '.lock'),
+                        timeout=cache_conf.cache_lock_timeout)
+
+    def expired(self, created, now=None):
+        if self.timeout is None:
+            return False
+        return (now or time.time()) - created > self.timeout
+
+    def get(self, key):
+        """
+        Return the cached response for ``key``, or `None` if there is no
+        valid entry.
+        """
+        return self._get(key, self._load)
+
+    def set(self, key, response):
+        """ Store ``response`` under ``key`` """
+        if self.cacheable(response):
+            self._set(key, self._dump, response)
+
+    def revalidated(self, key, cached, response):
+        """
+        Record that the server confirmed, with the ``304 Not Modified``
+        ``response``, that the entry ``key`` holding the response ``cached``
+        is still current.  The entry is refreshed as if it was just stored,
+        with the headers sent along the 304 response, and returned.
+        """
+        for name, value in response.headers.items():
+            if name.lower() not in _ENTITY_HEADERS:
+                cached.headers[name] = value
+        if isinstance(cached, CachedResponse):
+            size = self._dump_meta(key, cached, cached.compression)
+            size += os.path.getsize(self.path(key))
+            self._added(key, size)
+        else:
+            self._set(key, self._dump, cached)
+        return cached
+
+    def get_result(self, key):
+        """
+        Return the parsed result stored under ``key``, or `None` if there is
+        no valid entry.
+        """
+        return self._get(key, self._load_result)
+
+    def set_result(self, key, result):
+        """ Store the parsed result ``result`` under ``key`` """
+        self._set(key, self._dump_result, result)
+
+    def url(self, key):
+        """
+        Return the URL of the response cached under ``key``, or `None` if
+        unknown (e.g. for parsed results).
+        """
+        try:
+            with open(self.meta_path(key), "r") as f:
+                return json.load(f)['url']
+        except (IOError, ValueError, KeyError):
+            response = self._load_legacy(key)
+            return None if response is None else response.url
+
+    def remove(self, key):
+        """ Remove the entry ``key`` if it exists """
+        for path in (self.meta_path(key), self.path(key),
+                     self.legacy_path(key), self.result_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @abc.abstractmethod
+    def entries(self):
+        """ Return a list of `CacheEntry` for all entries """
+
+    def total_size(self):
+        return sum(entry.size for entry in self.entries())
+
+    def clear(self):
+        for entry in self.entries():
+            self.remove(entry.key)
+
+    def evict(self):
+        """
+        Remove expired entries, then the least recently used entries until
+        the total size fits within ``max_size``.
+        """
+        now = time.time()
+        entries = sorted(self.entries(), key=lambda entry: entry.accessed)
+        total = sum(entry.size for entry in entries)
+        for entry in entries:
+            if self.expired(entry.created, now):
+                self.remove(entry.key)
+                total -= entry.size
+        if self.max_size is None or total <= self.max_size:
+            return
+        for entry in entries:
+            if total <= self.max_size:
+                break
+            if self.expired(entry.created, now):
+                continue
+            log.debug("Evicting {0} from the cache".format(entry.path))
+            self.remove(entry.key)
+            total -= entry.size
+
+    def _get(self, key, load):
+        found = self._lookup(key)
+        if found is None:
+            return None
+        record_path, created, size = found
+        if self.expired(created):
+            self.remove(key)
+            return None
+        value = load(key)
+        if value is None:
+            self._missing(key)
+        else:
+            self._accessed(key, record_path, created, size)
+        return value
+
+    def _set(self, key, dump, value):
+        size = dump(key, value)
+        if size is None:
+            return
+        # the other files of the entry, if any, count as well
+        found = self._stat(key)
+        self._added(key, found[2] if found is not None else size)
+        if self.max_size is not None:
+            self.evict()
+
+    # The hooks below keep the bookkeeping of the backends up to date
+
+    def _lookup(self, key):
+        """
+        Return ``(record_path, created, size)`` of the entry ``key``, or
+        `None` if it does not exist.
+        """
+        return self._stat(key)
+
+    def _accessed(self, key, record_path, created, size):
+        pass
+
+    def _added(self, key, size):
+        pass
+
+    def _missing(self, key):
+        pass
+
+    def _load(self, key):
+        try:
+            with open(self.meta_path(key), "r") as f:
+                meta = json.load(f)
+        except (IOError, ValueError):
+            return self._load_legacy(key)
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        log.debug("Retrieving data from {0}".format(path))
+        return CachedResponse(path, status_code=meta['status_code'],
+                              headers=meta['headers'], url=meta['url'],
+                              encoding=meta['encoding'],
+                              reason=meta['reason'],
+                              compression=meta.get('compression'))
+
+    def _load_legacy(self, key):
+        path = self.legacy_path(key)
+        try:
+            with open(path, "rb") as f:
+                response = pickle.load(f)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            return None
+        if not isinstance(response, requests.Response):
+            return None
+        log.debug("Retrieving data from {0}".format(path))
+        return response
+
+    def _load_result(self, key):
+        path = self.result_path(key)
+        try:
+            with fits.open(path, memmap=False) as hdus:
+                result = _result_from_fits(hdus)
+        except Exception as ex:
+            # missing, or not written by this version
+            log.debug("Parsed result cannot be read: {0}".format(ex))
+            return None
+        log.debug("Retrieving parsed result from {0}".format(path))
+        return result
+
+    def _dump(self, key, response):
+        """ Write the entry ``key`` and return its size """
+        path = self.path(key)
+        compression = get_compression(response)
+        log.debug("Caching data to {0}{1}".format(
+            path, " ({0})".format(compression) if compression else ""))
+        with atomic_write(path, "wb") as f:
+            if compression:
+                with _compression_writer(compression, f) as out:
+                    out.write(response.content)
+            else:
+                f.write(response.content)
+        size = self._dump_meta(key, response, compression)
+        try:
+            os.remove(self.legacy_path(key))
+        except OSError:
+            pass
+        return os.path.getsize(path) + size
+
+    def _dump_meta(self, key, response, compression=None):
+        """ Write the record of the entry ``key`` and return its size """
+        meta = {'status_code': response.status_code,
+                'headers': dict(response.headers),
+                'url': response.url,
+                'encoding': response.encoding,
+                'reason': response.reason,
+                'compression': compression}
+        with atomic_write(self.meta_path(key), "w") as f:
+            json.dump(meta, f)
+        return os.path.getsize(self.meta_path(key))
+
+    def _dump_result(self, key, result):
+        """ Write the parsed result ``key`` and return its size """
+        path = self.result_path(key)
+        try:
+            hdus = _result_to_fits(result)
+            if hdus is None:
+                # only tables are stored, as they are read back
+                return None
+            log.debug("Caching parsed result to {0}".format(path))
+            with atomic_write(path, "wb") as f:
+                hdus.writeto(f)
+        except Exception as ex:
+            # e.g. metadata or columns which cannot be serialized
+            log.debug("Parsed result cannot be cached: {0}".format(ex))
+            return None
+        return os.path.getsize(path)
+
+    def _stat(self, key):
+        """
+        Return ``(record_path, created, size)`` of the entry ``key`` from its
+        files, the size being that of all of them, or `None`.
+        """
+        found = None
+        size = 0
+        for record_path in (self.meta_path(key), self.legacy_path(key),
+                            self.result_path(key)):
+            try:
+                stat = os.stat(record_path)
+                record_size = stat.st_size
+                if record_path == self.meta_path(key):
+                    record_size += os.path.getsize(self.path(key))
+            except OSError:
+                continue
+            size += record_size
+            if found is None:
+                found = record_path, stat.st_mtime
+        if found is None:
+            return None
+        return found + (size,)
+
+    @staticmethod
+    def cacheable(response):
+        # Only genuine, successful responses are worth keeping; error
+        # responses are refetched anyway (they evaluate to False).
+        return (isinstance(response, requests.Response) and response.ok
+                and response.status_code != 304)
+
+    @staticmethod
+    def conditional_headers(response):
+        """
+        Return the headers asking the server to answer ``304 Not Modified``
+        instead of resending ``response`` if it is still current.  Empty if
+        ``response`` has no ``ETag`` or ``Last-Modified`` validator.
+        """
+        headers = {}
+        if 'ETag' in response.headers:
+            headers['If-None-Match'] = response.headers['ETag']
+        if 'Last-Modified' in response.headers:
+            headers['If-Modified-Since'] = response.headers['Last-Modified']
+        return headers
+
+
+class FileSystemCache(CacheBackend):
+    """
+    Cache backend keeping track of the entries with file timestamps.
+
+    The modification time of the record of an entry is its creation time
+    and its access time is updated on every hit, so that no bookkeeping
+    beyond the entry files themselves is needed.
+    """
+
+    def _accessed(self, key, record_path, created, size):
+        try:
+            os.utime(record_path, (time.time(), created))
+        except OSError:
+            pass
+
+    def url(self, key):
+        # Reading the record to inspect the entry is not an access
+        try:
+            stat = os.stat(self.meta_path(key))
+        except OSError:
+            return super(FileSystemCache, self).url(key)
+        url = super(FileSystemCache, self).url(key)
+        try:
+            os.utime(self.meta_path(key),
+                     ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        except OSError:
+            pass
+        return url
+
+    def entries(self):
+        try:
+            dir_entries = list(os.scandir(self.location))
+        except OSError:
+            return []
+        # The records of an entry, by precedence as in _stat
+        records = ('.json', '.pickle', '.result')
+        found = []
+        for dir_entry in dir_entries:
+            key, ext = os.path.splitext(dir_entry.name)
+            if ext in records and len(key) == 56:
+                found.append((records.index(ext), key, ext, dir_entry))
+        entries = {}
+        for _, key, ext, dir_entry in sorted(found, key=lambda item: item[0]):
+            try:
+                stat = dir_entry.stat()
+                size = stat.st_size
+                if ext == '.json':
+                    size += os.path.getsize(self.path(key))
+            except OSError:
+                continue
+            entry = entries.get(key)
+            if entry is None:
+                entries[key] = CacheEntry(key, os.path.join(self.location,
+                                                            dir_entry.name),
+                                          size, stat.st_mtime, stat.st_atime)
+            else:
+                # a response and a parsed result stored under the same key
+                # are removed together, as one entry
+                entries[key] = entry._replace(
+                    size=entry.size + size,
+                    accessed=max(entry.accessed, stat.st_atime))
+        return list(entries.values())
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Cache backend keeping an index of the entries in an SQLite database.
+
+    The entries are stored as files, as for `FileSystemCache`, while their
+    sizes and creation and access times live in the ``index.sqlite``
+    database of the cache directory.  Size accounting and eviction are then
+    single queries rather than directory scans.
+    """
+
+    index_name = 'index.sqlite'
+
+    def __init__(self, location, timeout=None, max_size=None):
+        super(SQLiteCache, self).__init__(location, timeout=timeout,
+                                          max_size=max_size)
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        connection = sqlite3.connect(os.path.join(self.location,
+                                                  self.index_name),
+                                     timeout=60)
+        if not self._initialized:
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    "key TEXT PRIMARY KEY, size INTEGER, "
+                    "created REAL, accessed REAL)")
+            self._initialized = True
+        return connection
+
+    def _execute(self, sql, parameters=()):
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    return connection.execute(sql, parameters).fetchall()
+            finally:
+                connection.close()
+
+    def _lookup(self, key):
+        rows = self._execute("SELECT created, size FROM entries "
+                             "WHERE key = ?", (key,))
+        if rows:
+            return None, rows[0][0], rows[0][1]
+        # Entry written before the index existed
+        return self._stat(key)
+
+    def _accessed(self, key, record_path, created, size):
+        self._execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                      (key, size, created, time.time()))
+
+    def _added(self, key, size):
+        now = time.time()
+        self._execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                      (key, size, now, now))
+
+    def _missing(self, key):
+        self._execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def remove(self, key):
+        super(SQLiteCache, self).remove(key)
+        self._execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def entries(self):
+        rows = self._execute("SELECT key, size, created, accessed "
+                             "FROM entries")
+        return [CacheEntry(key, self.path(key), size, created, accessed)
+                for key, size, created, accessed in rows]
+
+    def total_size(self):
+        return self._execute("SELECT COALESCE(SUM(size), 0) "
+                             "FROM entries")[0][0]
+
+    def evict(self):
+        if self.timeout is not None:
+            expired = self._execute("SELECT key FROM entries "
+                                    "WHERE created < ?",
+                                    (time.time() - self.timeout,))
+            for key, in expired:
+                self.remove(key)
+        if self.max_size is None:
+            return
+        total = self.total_size()
+        if total <= self.max_size:
+            return
+        rows = self._execute("SELECT key, size FROM entries "
+                             "ORDER BY accessed")
+        for key, size in rows:
+            if total <= self.max_size:
+                break
+            log.debug("Evicting {0} from the cache".format(self.path(key)))
+            self.remove(key)
+            total -= size
+
+
+CACHE_BACKENDS = {'filesystem': FileSystemCache,
+                  'sqlite': SQLiteCache}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_cache_backend(location, timeout=None, max_size=None, backend=None):
+    """
+    Return the cache backend managing the directory ``location``.
+
+    Backends are shared between all the users of a directory with the same
+    settings.  ``backend`` is a key of `CACHE_BACKENDS`, defaulting to
+    ``cache_conf.cache_backend``; further backends can be plugged in by
+    adding them to `CACHE_BACKENDS`.
+    """
+    if backend is None:
+        backend = cache_conf.cache_backend
+    if max_size is None:
+        max_size = cache_conf.cache_max_size
+    key = (backend, os.path.abspath(location), timeout, max_size)
+    with _backends_lock:
+        instance = _backends.get(key)
+        if instance is None:
+            instance = _backends[key] = CACHE_BACKENDS[backend](
+                location, timeout=timeout, max_size=max_size)
+    return instance
+
+
+def get_cache_root():
+    """
+    Return the directory holding the cache directories of the services,
+    ``astroquery`` in the astropy cache directory.
+    """
+    return os.path.join(paths.get_cache_dir(), 'astroquery')
+
+
+# The directory of the cache root which holds the locks of the downloads,
+# rather than the cache of a service
+_LOCK_DIRECTORY = 'locks'
+
+
+def get_lock_dir():
+    """
+    Return the directory holding the locks of the files being downloaded by
+    ``BaseQuery._download_file``, in `get_cache_root`.
+    """
+    return os.path.join(get_cache_root(), _LOCK_DIRECTORY)
+
+
+def _service_backends(services=None, root=None):
+    """ Yield ``(service, backend)`` for the caches found in ``root`` """
+    root = root or get_cache_root()
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        return
+    for name in names:
+        if name == _LOCK_DIRECTORY or (services and name not in services):
+            continue
+        location = os.path.join(root, name)
+        if os.path.isdir(location):
+            yield name, get_cache_backend(
+                location, timeout=get_cache_timeout(name))
+
+
+def list_entries(services=None, root=None):
+    """
+    Return the entries of the caches of ``services``.
+
+    Parameters
+    ----------
+    services : list of str or None
+        Names of the services (the names of their cache directories, e.g.
+        ``'Simbad'``).  `None` for all the services.
+    root : str or None
+        Directory holding the cache directories, `get_cache_root` by
+        default.
+
+    Returns
+    -------
+    entries : list of `CacheInfo`
+        The service, key, URL, size (bytes), and creation and last access
+        times (seconds since the epoch) of each entry.
+    """
+    entries = []
+    for service, backend in _service_backends(services, root):
+        for entry in backend.entries():
+            entries.append(CacheInfo(service, entry.key,
+                                     backend.url(entry.key), entry.size,
+                                     entry.created, entry.accessed))
+    return entries
+
+
+def prune(services=None, older_than=None, max_size=None, root=None,
+          dry_run=False):
+    """
+    Remove entries from the caches of ``services``.
+
+    Entries created more than ``older_than`` seconds ago are removed, then
+    the least recently used ones until the entries left take at most
+    ``max_size`` bytes altogether.  Without ``older_than`` and ``max_size``,
+    all the entries are removed.
+
+    Parameters
+    ----------
+    services : list of str or None
+        Names of the services, `None` for all of them.
+    older_than : float or None
+        Maximum age (seconds) of the entries kept.
+    max_size : int or None
+        Maximum total size (bytes) of the entries kept.
+    root : str or None
+        Directory holding the cache directories, `get_cache_root` by
+        default.
+    dry_run : bool
+        Only return the entries which would be removed.
+
+    Returns
+    -------
+    removed : list of `CacheInfo`
+        The entries removed.
+    """
+    backends = dict(_service_backends(services, root))
+    entries = sorted(list_entries(services, root),
+                     key=lambda entry: entry.accessed)
+    if older_than is None and max_size is None:
+        removed = entries
+    else:
+        now = time.time()
+        removed = [entry for entry in entries
+                   if older_than is not None
+                   and now - entry.created > older_than]
+        if max_size is not None:
+            expired = set(removed)
+            kept = [entry for entry in entries if entry not in expired]
+            total = sum(entry.size for entry in kept)
+            for entry in kept:
+                if total <= max_size:
+                    break
+                removed.append(entry)
+                total -= entry.size
+    if not dry_run:
+        for entry in removed:
+            backends[entry.service].remove(entry.key)
+    return removed
+
+
+def _get_service(name):
+    """
+    Return the query object designated by ``name``: ``'module.Object'``
+    within astroquery (e.g. ``'vizier.Vizier'``), a full dotted path, or
+    ``'Object'`` for ``astroquery.object.Object``.  Classes are
+    instantiated.
+    """
+    module, _, attribute = name.rpartition('.')
+    candidates = ([module] if module.startswith('astroquery')
+                  else ['astroquery.' + (module or attribute.lower()),
+                        module])
+    for candidate in candidates:
+        if not candidate:
+            continue
+        try:
+            service = getattr(importlib.import_module(candidate), attribute)
+        except (ImportError, AttributeError):
+            continue
+        return service() if isinstance(service, type) else service
+    raise ValueError("Unknown service {0!r}".format(name))
+
+
+def _run_spec(spec, root):
+    service = _get_service(spec['service'])
+    if root is not None:
+        service = copy.copy(service)
+        service.cache_location = os.path.join(root,
+                                              service._service_name())
+    return getattr(service, spec['method'])(*spec.get('args', ()),
+                                            **spec.get('kwargs', {}))
+
+
+def warm(specs, max_workers=8, root=None):
+    """
+    Fill the caches by running queries concurrently, e.g. ahead of jobs run
+    without network access.
+
+    Parameters
+    ----------
+    specs : iterable of dict or str
+        The queries, as dicts with the ``service`` (e.g. ``'vizier.Vizier'``
+        or ``'simbad.Simbad'``) and ``method`` to call, and optional
+        ``args`` (list) and ``kwargs`` (dict).  A str is the path of a JSON
+        file holding a list of such dicts, or one dict per line.
+    max_workers : int
+        Maximum number of concurrent queries.
+    root : str or None
+        Directory holding the cache directories, by default those of the
+        query objects (`get_cache_root` unless changed).
+
+    Returns
+    -------
+    results : list
+        The result, or the raised exception, of each query.
+
+    Examples
+    --------
+    >>> from astroquery import cache
+    >>> results = cache.warm([
+    ...     {'service': 'simbad.Simbad', 'method': 'query_object',
+    ...      'args': ['M1']},
+    ...     {'service': 'vizier.Vizier', 'method': 'query_object',
+    ...      'args': ['M31'], 'kwargs': {'catalog': 'II/246'}}])
+    """
+    from .query import _future_result
+    if isinstance(specs, str):
+        with open(specs) as f:
+            text = f.read()
+        if text.lstrip().startswith('['):
+            specs = json.loads(text)
+        else:
+            specs = [json.loads(line) for line in text.splitlines()
+                     if line.strip()]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_run_spec, spec, root) for spec in specs]
+        return [_future_result(future) for future in futures]
@@ -6,7 +6,6 @@ import warnings
 import numpy as np
 import sys
 from bs4 import BeautifulSoup
-import keyring
 import time
 import smtplib
 import re
@@ -59,6 +58,7 @@ class CosmoSimClass(QueryWithLogin):
             keyring. This is the way to overwrite an already stored passwork
             on the keyring. Default is False.
         """
+        import keyring
         if username is None:
             if self.USERNAME == "":
                 raise LoginError("If you do not pass a username to login(), "
@@ -127,6 +127,7 @@ class CosmoSimClass(QueryWithLogin):
         Returns
         -------
         """
+        import keyring
 
         if (hasattr(self, 'username') and hasattr(self, 'password') and
                 hasattr(self, 'session')):
@@ -1282,6 +1283,7 @@ class CosmoSimClass(QueryWithLogin):
         text : string
             The user-provided cell phone receiving the job alert.
         """
+        import keyring
 
         self._smsaddress = "donotreply.astroquery.cosmosim@gmail.com"
         password_from_keyring = keyring.get_password(
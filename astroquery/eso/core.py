@@ -6,7 +6,6 @@ import os.path
 import shutil
 import webbrowser
 import warnings
-import keyring
 import numpy as np
 import re
 from bs4 import BeautifulSoup
@@ -209,6 +208,7 @@ class EsoClass(QueryWithLogin):
             keyring. This is the way to overwrite an already stored passwork
             on the keyring. Default is False.
         """
+        import keyring
         if username is None:
             if self.USERNAME != "":
                 username = self.USERNAME
@@ -7,6 +7,7 @@ from astropy.utils.exceptions import AstropyWarning
 
 __all__ = ['TimeoutError', 'InvalidQueryError', 'RemoteServiceError',
            'TableParseError', 'LoginError', 'ResolverError',
+           'CircuitOpenError', 'CassetteError',
            'NoResultsWarning', 'LargeQueryWarning', 'InputWarning',
            'AuthenticationWarning', 'MaxResultsWarning']
 
@@ -44,6 +45,22 @@ class RemoteServiceError(Exception):
     pass
 
 
+class CircuitOpenError(RemoteServiceError):
+    """
+    Raised instead of sending a request to a host that failed too many times
+    in a row, until it is given another chance.
+    """
+    pass
+
+
+class CassetteError(Exception):
+    """
+    Raised when replaying a request which is not recorded in the cassette in
+    use.
+    """
+    pass
+
+
 class LoginError(Exception):
     """
     Errors due to failed logins.  Should only be raised for services for which
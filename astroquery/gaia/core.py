@@ -853,7 +853,7 @@ class GaiaClass(TapPlus):
                          output_format="votable", verbose=False,
                          dump_to_file=False, background=False,
                          upload_resource=None, upload_table_name=None,
-                         autorun=True):
+                         autorun=True, partition=None):
         """Launches an asynchronous job
 
         Parameters
@@ -883,6 +883,12 @@ class GaiaClass(TapPlus):
         autorun : boolean, optional, default True
             if 'True', sets 'phase' parameter to 'RUN',
             so the framework can start the job.
+        partition : Partition, optional, default None
+            if provided, the query is split into one job per partition of
+            the values of a column, such as
+            ``Partition.from_healpix(level)`` for the HEALPix pixels of the
+            sources, run concurrently, and their results are merged.
+            See `~astroquery.utils.tap.TapPlus.launch_job_async`
 
         Returns
         -------
@@ -897,7 +903,8 @@ class GaiaClass(TapPlus):
                                         background=background,
                                         upload_resource=upload_resource,
                                         upload_table_name=upload_table_name,
-                                        autorun=autorun)
+                                        autorun=autorun,
+                                        partition=partition)
 
 
 Gaia = GaiaClass()
@@ -41,6 +41,14 @@ class HeasarcClass(BaseQuery):
     def query_mission_list(self, cache=True, get_query_payload=False):
         """
         Returns a list of all available mission tables with descriptions
+
+        Parameters
+        ----------
+        cache : bool or 'revalidate'
+            Whether to use the cache.  ``'revalidate'`` checks with the
+            server that a cached list is still current.
+        get_query_payload : bool
+            Return the payload of the query instead of sending it.
         """
         request_payload = self._args_to_payload(
             Entry='none',
@@ -14,6 +14,7 @@ from astropy.coordinates import SkyCoord, Angle
 
 from ..query import BaseQuery
 from ..utils import async_to_sync, commons
+from ..utils.threadlocal import ThreadLocalAttribute
 from . import conf
 
 __all__ = ['Miriade', 'MiriadeClass', 'Skybot', 'SkybotClass']
@@ -26,8 +27,8 @@ class MiriadeClass(BaseQuery):
     `IMCCE/Miriade <http://vo.imcce.fr/webservices/miriade/>`_ service.
     """
 
-    _query_uri = None  # uri used in query
-    _get_raw_response = False
+    _query_uri = ThreadLocalAttribute()  # uri used in query
+    _get_raw_response = ThreadLocalAttribute(False)
 
     @property
     def uri(self):
@@ -398,8 +399,8 @@ class SkybotClass(BaseQuery):
     """A class for querying the `IMCCE SkyBoT
     <http://vo.imcce.fr/webservices/skybot>`_ service.
     """
-    _uri = None  # query uri
-    _get_raw_response = False
+    _uri = ThreadLocalAttribute()  # query uri
+    _get_raw_response = ThreadLocalAttribute(False)
 
     @property
     def uri(self):
@@ -19,6 +19,7 @@ from astropy.time import Time
 from ..query import BaseQuery
 # async_to_sync generates the relevant query tools from _async methods
 from ..utils import async_to_sync
+from ..utils.threadlocal import ThreadLocalAttribute
 # import configurable items declared in __init__.py
 from . import conf
 
@@ -34,6 +35,17 @@ class HorizonsClass(BaseQuery):
 
     TIMEOUT = conf.timeout
 
+    # state of the current query of the thread, so that an object can be
+    # queried from several threads at once
+    # return raw response?
+    return_raw = ThreadLocalAttribute(False)
+    # ['ephemerides', 'elements', 'vectors']
+    query_type = ThreadLocalAttribute()
+    # will contain query URL
+    uri = ThreadLocalAttribute()
+    # will contain raw response from server
+    raw_response = ThreadLocalAttribute()
+
     def __init__(self, id=None, location=None, epochs=None,
                  id_type='smallbody'):
         """Instantiate JPL query.
@@ -109,14 +121,6 @@ class HorizonsClass(BaseQuery):
             raise ValueError('id_type ({:s}) not allowed'.format(id_type))
         self.id_type = id_type
 
-        # return raw response?
-        self.return_raw = False
-
-        self.query_type = None  # ['ephemerides', 'elements', 'vectors']
-
-        self.uri = None  # will contain query URL
-        self.raw_response = None  # will contain raw response from server
-
     def __str__(self):
         """
         String representation of HorizonsClass object instance'
@@ -1269,6 +1273,13 @@ class HorizonsClass(BaseQuery):
 
         return data
 
+    def _parse_result_key(self):
+        # raw responses are not cached, as the parser resets return_raw;
+        # raw_response is only set when a response is actually parsed
+        if self.return_raw:
+            return None
+        return 'query_type={0}'.format(self.query_type)
+
     def _parse_result(self, response, verbose=None):
         """
         Routine for managing parser calls;
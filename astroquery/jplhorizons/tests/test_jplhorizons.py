@@ -4,12 +4,14 @@ from __future__ import print_function
 import pytest
 import os
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
+import requests
 from numpy.ma import is_masked
-from ...utils.testing_tools import MockResponse
+from ...utils.testing_tools import MockResponse, make_response
 from astropy.tests.helper import assert_quantity_allclose
 
-from ... import jplhorizons
+from ... import cache_conf, jplhorizons
 
 # files in data/ for different query types
 DATA_FILES = {'ephemerides': 'ceres_ephemerides.txt',
@@ -229,3 +231,55 @@ def test_no_H(patch_request):
     """testing missing H value (also applies for G, M1, k1, M2, k2)"""
     res = jplhorizons.Horizons(id='2010 NY104').ephemerides()[0]
     assert 'H' not in res
+
+
+def test_concurrent_queries(patch_request):
+    # one object queried from several threads, with and without raw
+    # responses
+    obj = jplhorizons.Horizons(id='Ceres', location='500',
+                               epochs=2451544.5)
+
+    def query(i):
+        query_type = ('ephemerides', 'elements', 'vectors')[i % 3]
+        raw = i % 2 == 0
+        return (query_type, raw,
+                getattr(obj, query_type)(get_raw_response=raw))
+
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(query, range(60)))
+    for query_type, raw, result in results:
+        if raw:
+            assert isinstance(result, str)
+        else:
+            assert result['targetname'][0] == "1 Ceres (A801 AA)"
+            assert {'ephemerides': 'RA', 'elements': 'e',
+                    'vectors': 'x'}[query_type] in result.colnames
+
+
+def test_parsed_results(monkeypatch, tmpdir):
+    # the parser returns the raw response or a table depending on the
+    # query: only the tables are cached
+    def request(session, method, url, params=None, **kwargs):
+        with open(data_path(DATA_FILES['ephemerides']), 'rb') as f:
+            return make_response(f.read(), url=url, encoding='utf-8')
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    obj = jplhorizons.Horizons(id='Ceres', location='500',
+                               epochs=2451544.5)
+    obj.cache_location = tmpdir.strpath
+    with cache_conf.set_temp('cache_parsed_results', True):
+        raw = obj.ephemerides(get_raw_response=True)
+        table = obj.ephemerides()
+        assert isinstance(raw, str)
+        assert table['targetname'][0] == "1 Ceres (A801 AA)"
+        assert obj.raw_response == raw
+        assert isinstance(obj.ephemerides(get_raw_response=True), str)
+        assert len(tmpdir.listdir(lambda path: path.ext == '.result')) == 1
+
+        monkeypatch.setattr(jplhorizons.HorizonsClass, '_parse_horizons',
+                            None)
+        cached = obj.ephemerides()
+        assert cached.colnames == table.colnames
+        assert cached['targetname'][0] == "1 Ceres (A801 AA)"
+        assert cached['RA'].unit == table['RA'].unit
+        assert list(cached['RA']) == list(table['RA'])
@@ -9,6 +9,7 @@ import astropy.units as u
 from ..query import BaseQuery
 from ..utils import commons
 from ..utils import async_to_sync
+from ..utils.threadlocal import ThreadLocalAttribute
 from . import conf
 
 __all__ = ['SBDB', 'SBDBClass']
@@ -23,10 +24,10 @@ class SBDBClass(BaseQuery):
     """
 
     # internal flag whether to return the raw reponse
-    _return_raw = False
+    _return_raw = ThreadLocalAttribute(False)
 
     # actual query uri
-    _uri = None
+    _uri = ThreadLocalAttribute()
 
     def query_async(self, targetid, id_type='search',
                     neo_only=False,
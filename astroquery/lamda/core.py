@@ -133,6 +133,8 @@ class LamdaClass(BaseQuery):
                          url
                          for url in datfile_urls}
 
+        if not os.path.exists(self.cache_location):
+            os.makedirs(self.cache_location)
         with open(self.moldict_path, 'w') as f:
             s = json.dumps(molecule_dict)
             f.write(s)
@@ -8,7 +8,6 @@ authenticating MAST users.
 """
 
 import os
-import keyring
 import warnings
 
 from getpass import getpass
@@ -59,6 +58,7 @@ class MastAuth(object):
             Asks for the token even if it is already stored in the keyring or $MAST_API_TOKEN environment variable.
             This is the way to overwrite an already stored password on the keyring.
         """
+        import keyring
 
         if token is None and "MAST_API_TOKEN" in os.environ:
             token = os.environ["MAST_API_TOKEN"]
@@ -21,6 +21,7 @@ from astropy.utils import deprecated
 from ..query import BaseQuery, QueryWithLogin
 from ..utils import async_to_sync
 from ..utils.class_or_instance import class_or_instance
+from ..utils.threadlocal import ThreadLocalAttribute
 from ..exceptions import InputWarning, NoResultsWarning, RemoteServiceError
 
 from . import conf, utils
@@ -116,6 +117,9 @@ class PortalAPI(BaseQuery):
     Should be used to facilitate all Portal API queries.
     """
 
+    # service of the current query of the thread, for _parse_result
+    _current_service = ThreadLocalAttribute()
+
     def __init__(self, session=None):
 
         super(PortalAPI, self).__init__()
@@ -131,7 +135,6 @@ class PortalAPI(BaseQuery):
         self.PAGESIZE = conf.pagesize
 
         self._column_configs = dict()
-        self._current_service = None
 
     def _request(self, method, url, params=None, data=None, headers=None,
                  files=None, stream=False, auth=None, retrieve_all=True):
@@ -257,6 +260,12 @@ class PortalAPI(BaseQuery):
             for col, val in self._column_configs[service].items():
                 val.pop('hist', None)  # don't want to save all this unecessary data
 
+    def _parse_result_key(self):
+        # the columns config of the current service is applied to the tables
+        service = self._current_service
+        return json.dumps([service, self._column_configs.get(service)],
+                          sort_keys=True, default=str)
+
     def _parse_result(self, responses, verbose=False):
         """
         Parse the results of a list of `~requests.Response` objects and returns an `~astropy.table.Table` of results.
@@ -52,6 +52,9 @@ class ObservationsClass(MastQueryWithLogin):
     Class for querying MAST observational data.
     """
 
+    def _parse_result_key(self):
+        return self._portal_api_connection._parse_result_key()
+
     def _parse_result(self, responses, verbose=False):  # Used by the async_to_sync decorator functionality
         """
         Parse the results of a list of `~requests.Response` objects and returns an `~astropy.table.Table` of results.
@@ -822,6 +825,9 @@ class MastClass(MastQueryWithLogin):
     more flexible but less user friendly than `ObservationsClass`.
     """
 
+    def _parse_result_key(self):
+        return self._portal_api_connection._parse_result_key()
+
     def _parse_result(self, responses, verbose=False):  # Used by the async_to_sync decorator functionality
         """
         Parse the results of a list of `~requests.Response` objects and returns an `~astropy.table.Table` of results.
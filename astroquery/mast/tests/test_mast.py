@@ -235,6 +235,15 @@ def test_observations_query_region(patch_post):
     assert isinstance(result, Table)
 
 
+def test_observations_parse_result_key(patch_post):
+    # the parsed tables depend on the columns config of the service queried
+    mast.Observations.query_region_async(regionCoords, radius=0.2)
+    key = mast.Observations._parse_result_key()
+    assert 'Mast.Caom.Cone' in key
+    mast.Observations._portal_api_connection._current_service = None
+    assert mast.Observations._parse_result_key() != key
+
+
 def test_observations_query_object_async(patch_post):
     responses = mast.Observations.query_object_async("M103", radius="0.2 deg")
     assert isinstance(responses, list)
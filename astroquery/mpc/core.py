@@ -20,6 +20,7 @@ except ImportError:
 from ..query import BaseQuery
 from . import conf
 from ..utils import async_to_sync, class_or_instance
+from ..utils.threadlocal import ThreadLocalAttribute
 from ..exceptions import InvalidQueryError
 
 
@@ -62,6 +63,15 @@ class MPCClass(BaseQuery):
         'sky': 's'
     }
 
+    # options of the current query of the thread, for _parse_result
+    query_type = ThreadLocalAttribute()
+    obsformat = ThreadLocalAttribute()
+    get_raw_response = ThreadLocalAttribute(False)
+    _ra_format = ThreadLocalAttribute()
+    _dec_format = ThreadLocalAttribute()
+    _proper_motion_unit = ThreadLocalAttribute()
+    _unc_links = ThreadLocalAttribute()
+
     def __init__(self):
         super(MPCClass, self).__init__()
 
@@ -2,10 +2,8 @@
 from __future__ import print_function
 
 import re
-import os
 import warnings
 import functools
-import keyring
 
 import numpy as np
 import astropy.units as u
@@ -277,6 +275,7 @@ class NraoClass(QueryWithLogin):
             keyring. This is the way to overwrite an already stored passwork
             on the keyring. Default is False.
         """
+        import keyring
 
         # Developer notes:
         # Login via https://my.nrao.edu/cas/login
@@ -356,9 +355,7 @@ class NraoClass(QueryWithLogin):
         # fail if response is entirely whitespace or if it is empty
         if not response.content.strip():
             if cache:
-                last_pickle = self._last_query.hash()+".pickle"
-                cache_fn = os.path.join(self.cache_location, last_pickle)
-                os.remove(cache_fn)
+                self._get_cache_backend().remove(self._last_query.hash())
             if retry > 0:
                 log.warning("Query resulted in an empty result.  Retrying {0}"
                             " more times.".format(retry))
@@ -2,32 +2,318 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 import abc
+import collections
+import copy
+import datetime
+import functools
+import importlib.util
 import inspect
 import pickle
-import getpass
 import hashlib
-import keyring
 import io
 import os
+import json
+import sys
+import threading
+import time
+import weakref
 import requests
+from concurrent.futures import (ThreadPoolExecutor, as_completed, wait,
+                                FIRST_EXCEPTION)
 
 import six
-from astropy.config import paths
+from six.moves.urllib_parse import urlparse
+from astropy.config import paths, ConfigNamespace
 from astropy.logger import log
 import astropy.units as u
 from astropy.utils.console import ProgressBarOrSpinner
+from astropy.utils.decorators import lazyproperty
 import astropy.utils.data
 
 from . import version
-from .utils import system_tools
+from . import cache, cache_conf, connection_conf
+from .utils import system_tools, ratelimit, retry, metrics, sessions
+from .utils.threadlocal import ThreadLocalAttribute
+from .utils.filelock import FileLock
+from .utils.singleflight import SingleFlight
+
+# aiohttp is only imported by the coroutines sending requests with it
+HAS_AIOHTTP = importlib.util.find_spec('aiohttp') is not None
 
 __all__ = ['BaseQuery', 'QueryWithLogin']
+__doctest_skip__ = ['BaseQuery.query_many']
+
+# The requests in flight, shared by identical concurrent requests
+_in_flight = SingleFlight()
+
+
+def _future_result(future):
+    try:
+        return future.result()
+    except Exception as ex:
+        log.warning("Query failed: {0!r}".format(ex))
+        return ex
+
+
+def _copy_response(response):
+    """
+    A shallow copy of ``response``, for a caller sharing it with others.
+    Unlike `copy.copy`, keeps the body of a `~astroquery.cache.CachedResponse`
+    unread.
+    """
+    response_copy = object.__new__(type(response))
+    response_copy.__dict__.update(response.__dict__)
+    return response_copy
+
+
+def _response_size(response):
+    """ Size of the body of ``response``, if it was read """
+    if isinstance(response, cache.CachedResponse):
+        try:
+            return os.path.getsize(response.body_path)
+        except OSError:
+            return None
+    content = getattr(response, '_content', None)
+    if isinstance(content, bytes):
+        return len(content)
+    return None
+
+
+def _record_response(response):
+    """ Record the status and latency of ``response`` in the current event """
+    event = metrics.current()
+    if event is not None:
+        event.status = getattr(response, 'status_code', None)
+        elapsed = getattr(response, 'elapsed', None)
+        if isinstance(elapsed, datetime.timedelta):
+            event.wait = (event.wait or 0.) + elapsed.total_seconds()
+
+
+def _aiohttp_fields(fields):
+    """
+    Convert ``params`` or ``data`` to the list of pairs of strings expected
+    by aiohttp, dropping `None` values and expanding lists as requests does.
+    """
+    if not isinstance(fields, dict):
+        return fields
+    pairs = []
+    for key, values in fields.items():
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        pairs.extend((key, str(value)) for value in values
+                     if value is not None)
+    return pairs
+
+
+# The aiohttp session of each event loop, see _aio_session
+_aio_sessions = weakref.WeakKeyDictionary()
+
+
+async def _aio_session():
+    """
+    Return the `aiohttp.ClientSession` shared by the coroutines of the
+    current event loop, whose connections are pooled per host like those of
+    the synchronous sessions.
+
+    The session is closed when the loop shuts down its asynchronous
+    generators, as `asyncio.run` does.
+    """
+    import asyncio
+    import aiohttp
+    loop = asyncio.get_event_loop()
+    if loop not in _aio_sessions:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit_per_host=connection_conf.connection_pool_size),
+            headers={'User-Agent': 'astroquery/{vers} {olduseragent}'.format(
+                vers=version.version,
+                olduseragent=aiohttp.http.SERVER_SOFTWARE)})
+        # the loop keeps track of the generator once started
+        closing = _close_on_shutdown(loop, session)
+        _aio_sessions[loop] = session, closing
+        await closing.asend(None)
+    return _aio_sessions[loop][0]
+
+
+async def _close_on_shutdown(loop, session):
+    try:
+        yield
+    finally:
+        _aio_sessions.pop(loop, None)
+        await session.close()
+
+
+class _PendingRequest(BaseException):
+    """
+    Raised by `BaseQuery._request` while a ``query_*_aio`` coroutine captures
+    the requests of a query (see `BaseQuery._query_aio`), for a request whose
+    response is yet to be fetched by `BaseQuery._request_aio` with
+    ``kwargs``.  It is not an `Exception`, so that the query methods let it
+    through.
+    """
+
+    def __init__(self, query, kwargs):
+        super(_PendingRequest, self).__init__(query.url)
+        self.query = query
+        self.kwargs = kwargs
+
+
+class _SyncRequest(BaseException):
+    """
+    Raised by `BaseQuery._request` while a ``query_*_aio`` coroutine captures
+    the requests of a query, for a request `BaseQuery._request_aio` cannot
+    send: a download, a streamed request, or one with uploads or
+    credentials.
+    """
+
+
+class _AioCapture(object):
+    """
+    The responses fetched by `BaseQuery._request_aio` for a query run again
+    by `BaseQuery._query_aio` until all its requests are answered, by
+    `AstroQuery.hash` and order among the identical requests of a run.
+    """
+
+    def __init__(self):
+        self.responses = collections.defaultdict(list)
+        self.sent = collections.Counter()
+
+    def response(self, query, kwargs):
+        """
+        Return the response to ``query``, or raise `_PendingRequest` if it
+        is not fetched yet.
+        """
+        key = query.hash()
+        index = self.sent[key]
+        if index == len(self.responses[key]):
+            raise _PendingRequest(query, kwargs)
+        self.sent[key] += 1
+        return self.responses[key][index]
+
+
+class _RangesNotSupported(Exception):
+    """ The server ignored a range request """
+
+
+# errors interrupting a segment of a download, after which it is resumed
+_STREAM_ERRORS = ((requests.exceptions.ChunkedEncodingError,)
+                  + retry.RETRY_EXCEPTIONS)
+
+
+def _load_segments(state_path, url, length):
+    """
+    Return the byte ranges ``[start, end, next]`` of an interrupted
+    segmented download of ``url`` recorded in ``state_path``, or `None`.
+    """
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if state.get('url') != url or state.get('length') != length:
+        return None
+    return state['segments']
+
+
+# Size (bytes) of the chunks in which uploaded content is hashed; larger
+# strings and all file-like objects are keyed on their digest
+_HASH_CHUNK_SIZE = 2 ** 20
+
+
+class _UnhashableContent(TypeError):
+    """ An upload which cannot be hashed without consuming it """
+
+
+def _hash_content(value):
+    """
+    Return what stands for ``value``, an item of the ``params``, ``data`` or
+    ``files`` of a request, in its cache key.
+
+    File-like objects are read in chunks into a SHA-224 digest, from their
+    current position to which they are rewound, and so are large strings,
+    so that the key never holds a copy of an upload.  The ``(filename,
+    fileobj, ...)`` tuples of ``files`` are handled item by item.  Raises
+    ``_UnhashableContent`` for file-like objects which cannot seek.
+    """
+    if isinstance(value, tuple):
+        return tuple(_hash_content(item) for item in value)
+    if hasattr(value, 'read'):
+        seekable = getattr(value, 'seekable', lambda: hasattr(value, 'seek'))
+        if not seekable():
+            raise _UnhashableContent("{0!r} cannot be read without consuming "
+                                     "it".format(value))
+        digest = hashlib.sha224()
+        position = value.tell()
+        for chunk in iter(functools.partial(value.read, _HASH_CHUNK_SIZE),
+                          value.read(0)):
+            digest.update(chunk.encode('utf-8') if isinstance(chunk, str)
+                          else chunk)
+        value.seek(position)
+        return ('sha224', digest.hexdigest())
+    if ((isinstance(value, (six.string_types, bytes, bytearray))
+         and len(value) > _HASH_CHUNK_SIZE)):
+        digest = hashlib.sha224()
+        for start in range(0, len(value), _HASH_CHUNK_SIZE):
+            chunk = value[start:start + _HASH_CHUNK_SIZE]
+            digest.update(chunk.encode('utf-8') if isinstance(chunk, str)
+                          else chunk)
+        return ('sha224', digest.hexdigest())
+    return value
+
+
+# Types of the request settings of the services, see
+# BaseQuery._service_setting
+_SERVICE_SETTINGS = {'rate_limit': float, 'rate_burst': int,
+                     'max_retries': int, 'backoff_factor': float}
+
+
+def _download_lock(local_filepath):
+    """
+    Return the lock serializing the downloads to ``local_filepath``, whose
+    file is kept in `astroquery.cache.get_lock_dir` rather than next to the
+    downloaded file.
+    """
+    directory = cache.get_lock_dir()
+    os.makedirs(directory, exist_ok=True)
+    name = hashlib.sha224(
+        os.path.abspath(local_filepath).encode('utf-8')).hexdigest()
+    return FileLock(os.path.join(directory, name + '.lock'),
+                    timeout=cache_conf.cache_lock_timeout)
 
 
-def to_cache(response, cache_file):
-    log.debug("Caching data to {0}".format(cache_file))
-    with open(cache_file, "wb") as f:
-        pickle.dump(response, f)
+def _uploads(query):
+    """
+    Return the file-like objects uploaded by ``query``, in its ``data`` or
+    its ``files`` (given as a dict or a list of items, the file-like objects
+    as such or in ``(filename, fileobj, ...)`` tuples).
+    """
+    values = [query.data]
+    files = query.files
+    if isinstance(files, dict):
+        files = files.items()
+    for item in files or ():
+        value = item[1]
+        values.append(value[1] if isinstance(value, (tuple, list)) else value)
+    return [value for value in values if hasattr(value, 'read')]
+
+
+def _rewinder(uploads):
+    """
+    Return a function seeking the file-like objects ``uploads`` back to their
+    current position, to send them again, or `None` if some cannot seek.
+    """
+    positions = []
+    for upload in uploads:
+        seekable = getattr(upload, 'seekable',
+                           lambda: hasattr(upload, 'seek'))
+        if not seekable():
+            return None
+        positions.append((upload, upload.tell()))
+
+    def rewind():
+        for upload, position in positions:
+            upload.seek(position)
+    return rewind
 
 
 def _replace_none_iterable(iterable):
@@ -38,7 +324,7 @@ class AstroQuery(object):
 
     def __init__(self, method, url,
                  params=None, data=None, headers=None,
-                 files=None, timeout=None, json=None):
+                 files=None, timeout=None, json=None, content_digest=None):
         self.method = method
         self.url = url
         self.params = params
@@ -46,6 +332,7 @@ class AstroQuery(object):
         self.json = json
         self.headers = headers
         self.files = files
+        self.content_digest = content_digest
         self._hash = None
         self.timeout = timeout
 
@@ -62,58 +349,87 @@ class AstroQuery(object):
 
     def request(self, session, cache_location=None, stream=False,
                 auth=None, verify=True, allow_redirects=True,
-                json=None):
+                json=None, headers=None):
+        if headers:
+            # extra headers, e.g. conditional ones, not part of the hash
+            headers = dict(self.headers or {}, **headers)
+        else:
+            headers = self.headers
         return session.request(self.method, self.url, params=self.params,
-                               data=self.data, headers=self.headers,
+                               data=self.data, headers=headers,
                                files=self.files, timeout=self.timeout,
                                stream=stream, auth=auth, verify=verify,
                                allow_redirects=allow_redirects,
                                json=json)
 
+    async def request_aio(self, session, headers=None, verify=True,
+                          allow_redirects=True):
+        """
+        Send the request with the `aiohttp.ClientSession` ``session`` and
+        return its response as a `requests.Response`.
+        """
+        import aiohttp
+        start = time.perf_counter()
+        async with session.request(
+                self.method, self.url,
+                params=_aiohttp_fields(self.params),
+                data=_aiohttp_fields(self.data),
+                json=self.json,
+                headers=dict(self.headers or {}, **(headers or {})),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                allow_redirects=allow_redirects,
+                ssl=None if verify else False) as aio_response:
+            elapsed = time.perf_counter() - start
+            content = await aio_response.read()
+        response = requests.Response()
+        response.elapsed = datetime.timedelta(seconds=elapsed)
+        response.status_code = aio_response.status
+        response.headers.update(aio_response.headers)
+        response.url = str(aio_response.url)
+        response.reason = aio_response.reason
+        response.encoding = requests.utils.get_encoding_from_headers(
+            response.headers)
+        response._content = content
+        return response
+
     def hash(self):
         if self._hash is None:
             request_key = (self.method, self.url)
-            for k in (self.params, self.data, self.json,
-                      self.headers, self.files):
-                if isinstance(k, dict):
+            for name in ('params', 'data', 'json', 'headers', 'files'):
+                k = getattr(self, name)
+                if ((self.content_digest is not None and k is not None
+                     and (name == 'files' or (name == 'data'
+                                              and not isinstance(k, dict))))):
+                    request_key += (('digest', self.content_digest),)
+                elif isinstance(k, dict):
                     entry = (tuple(sorted(k.items(),
                                           key=_replace_none_iterable)))
-                    entry = tuple((k_, v_.read()) if hasattr(v_, 'read')
-                                  else (k_, v_) for k_, v_ in entry)
-                    for k_, v_ in entry:
-                        if hasattr(v_, 'read') and hasattr(v_, 'seek'):
-                            v_.seek(0)
-
-                    request_key += entry
+                    request_key += tuple((k_, _hash_content(v_))
+                                         for k_, v_ in entry)
                 elif isinstance(k, tuple) or isinstance(k, list):
                     request_key += (tuple(sorted(k,
                                                  key=_replace_none_iterable)),)
                 elif k is None:
                     request_key += (None,)
-                elif isinstance(k, six.string_types):
-                    request_key += (k,)
+                elif isinstance(k, (six.string_types, bytes)) or hasattr(
+                        k, 'read'):
+                    request_key += (_hash_content(k),)
                 else:
                     raise TypeError("{0} must be a dict, tuple, str, or "
                                     "list".format(k))
             self._hash = hashlib.sha224(pickle.dumps(request_key)).hexdigest()
         return self._hash
 
-    def request_file(self, cache_location):
-        fn = os.path.join(cache_location, self.hash() + ".pickle")
-        return fn
-
-    def from_cache(self, cache_location):
-        request_file = self.request_file(cache_location)
+    def hashable(self):
+        """
+        Whether the request has a cache key: it does not if it uploads file
+        objects which cannot be read without consuming them.
+        """
         try:
-            with open(request_file, "rb") as f:
-                response = pickle.load(f)
-            if not isinstance(response, requests.Response):
-                response = None
-        except IOError:  # TODO: change to FileNotFoundError once drop py2 support
-            response = None
-        if response:
-            log.debug("Retrieving data from {0}".format(request_file))
-        return response
+            self.hash()
+        except _UnhashableContent:
+            return False
+        return True
 
 
 class LoginABCMeta(abc.ABCMeta):
@@ -151,30 +467,190 @@ class BaseQuery(object):
     is implemented as an abstract class and must not be directly instantiated.
     """
 
+    #: The `~astroquery.utils.retry.RetryPolicy` of the requests sent by
+    #: `_request`, shared by all the services unless they override it.  The
+    #: ``max_retries`` and ``backoff_factor`` settings of the service (see
+    #: `_service_setting`), if set, take precedence.
+    retry_policy = retry.RetryPolicy()
+
+    #: Whether the POST requests of the service only query it, so that they
+    #: can be sent again after a failure like GET requests.
+    idempotent_post = False
+
+    # State left by the last query of the current thread, kept per thread
+    # so that the service singletons can be queried concurrently
+    table = ThreadLocalAttribute()
+    response = ThreadLocalAttribute()
+    table_parse_error = ThreadLocalAttribute()
+    _last_query = ThreadLocalAttribute()
+
+    #: Number of byte ranges `_download_file` fetches concurrently from
+    #: servers supporting range requests.  1 downloads in a single stream.
+    download_segments = 1
+
+    #: Whether identical requests sent concurrently by `_request` share a
+    #: single round trip.  Only GET and HEAD requests, and POST requests if
+    #: ``idempotent_post``, are coalesced.
+    coalesce_requests = True
+
+    #: Whether identical requests sent concurrently with ``cache=False``,
+    #: which asks for a fresh response, are coalesced as well.
+    coalesce_uncached_requests = False
+
+    #: Whether the ``query_*_aio`` coroutines send the requests of the
+    #: service with `_request_aio` in the event loop (if `aiohttp` is
+    #: installed), rather than running the synchronous query in a thread.
+    #: Only services whose queries send plain requests with `_request`,
+    #: without waiting between them (e.g. to poll a job), opt in.
+    aio_transport = False
+
+    # The responses fetched for the query_*_aio coroutine running a query in
+    # the current thread, see _query_aio
+    _aio_capture = ThreadLocalAttribute()
+
     def __init__(self):
-        S = self._session = requests.session()
+        # The session and the cache directory are only created when first
+        # needed, so that building the service singletons at import time
+        # touches neither the network stack nor the disk.
+        self.cache_location = os.path.join(
+            paths.get_cache_dir(), 'astroquery', self._service_name())
+        self._cache_active = True
+
+    @lazyproperty
+    def _session(self):
+        # The connections are pooled per host for the whole process
+        S = sessions.PooledSession()
         S.headers['User-Agent'] = (
             'astroquery/{vers} {olduseragent}'
             .format(vers=version.version,
                     olduseragent=S.headers['User-Agent']))
-
-        self.cache_location = os.path.join(
-            paths.get_cache_dir(), 'astroquery',
-            self.__class__.__name__.split("Class")[0])
-        if not os.path.exists(self.cache_location):
-            os.makedirs(self.cache_location)
-        self._cache_active = True
+        return S
 
     def __call__(self, *args, **kwargs):
         """ init a fresh copy of self """
         return self.__class__(*args, **kwargs)
 
+    @classmethod
+    def _service_conf(cls):
+        """
+        The configuration (``conf``) of the module of the service, if any
+        """
+        module = cls.__module__
+        while module:
+            conf = getattr(sys.modules.get(module), 'conf', None)
+            if isinstance(conf, ConfigNamespace):
+                return conf
+            module = module.rpartition('.')[0]
+        return None
+
+    @classmethod
+    def _service_setting(cls, name):
+        """
+        The request setting ``name`` (e.g. ``rate_limit``) of the service:
+        its entry in ``connection_conf.service_settings``, else the item of
+        the configuration of the service, else the astroquery-wide item of
+        ``connection_conf``.
+        """
+        entry = '{0}.{1}'.format(cls._service_name(), name)
+        for item in connection_conf.service_settings:
+            key, _, value = item.partition('=')
+            if key.strip() == entry:
+                value = value.strip()
+                if value.lower() in ('', 'none'):
+                    return None
+                return _SERVICE_SETTINGS[name](value)
+        value = getattr(cls._service_conf(), name, None)
+        if value is None:
+            value = getattr(connection_conf, name)
+        return value
+
+    @classmethod
+    def _service_name(cls):
+        """ Name of the service, as used for its cache directory """
+        return cls.__name__.split("Class")[0]
+
+    def _get_cache_backend(self):
+        """
+        The `~astroquery.cache.CacheBackend` managing ``cache_location``,
+        configured with the cache timeout of this service.
+        """
+        return cache.get_cache_backend(
+            self.cache_location,
+            timeout=cache.get_cache_timeout(self._service_name()))
+
+    def _parse_result_key(self):
+        """
+        The state of the service ``_parse_result`` depends on, besides the
+        response, as a string, or `None` if the parsed results must not be
+        cached.
+
+        The results of a service are only cached (see
+        ``cache_conf.cache_parsed_results``) if it overrides this method,
+        as its parser may read attributes set by the query (e.g. to return
+        the raw response), which the key must then include, or set some
+        itself, which a cached result skips.  The cached results are tables
+        and lists of tables, stored as FITS.
+        """
+        return None
+
+    def query_many(self, method_name, kwargs_list, max_workers=8,
+                   ordered=True):
+        """
+        Call a query method once per set of keyword arguments, concurrently.
+
+        The calls run in a pool of threads and go through ``_request`` as
+        usual, so cached responses are reused.  An exception raised by one
+        call does not abort the batch: it is returned in place of the
+        result of that call.
+
+        Parameters
+        ----------
+        method_name : str
+            Name of the query method, e.g. ``'query_object'``.
+        kwargs_list : iterable of dict
+            The keyword arguments of each call.
+        max_workers : int
+            Maximum number of concurrent calls.
+        ordered : bool
+            If True, return the results in the order of ``kwargs_list``.
+            Otherwise, yield ``(kwargs, result)`` pairs as the calls
+            complete.
+
+        Returns
+        -------
+        results : list or generator
+            The result, or the raised exception, of each call.
+
+        Examples
+        --------
+        >>> from astroquery.simbad import Simbad
+        >>> tables = Simbad.query_many('query_object',
+        ...                            [{'object_name': 'M1'},
+        ...                             {'object_name': 'M31'}])
+        """
+        method = getattr(self, method_name)
+        kwargs_list = list(kwargs_list)
+        if ordered:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(method, **kwargs)
+                           for kwargs in kwargs_list]
+                return [_future_result(future) for future in futures]
+        return self._query_many_unordered(method, kwargs_list, max_workers)
+
+    @staticmethod
+    def _query_many_unordered(method, kwargs_list, max_workers):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(method, **kwargs): kwargs
+                       for kwargs in kwargs_list}
+            for future in as_completed(futures):
+                yield futures[future], _future_result(future)
+
     def _request(self, method, url,
                  params=None, data=None, headers=None,
                  files=None, save=False, savedir='', timeout=None, cache=True,
                  stream=False, auth=None, continuation=True, verify=True,
                  allow_redirects=True,
-                 json=None):
+                 json=None, content_digest=None):
         """
         A generic HTTP request method, similar to `requests.Session.request`
         but with added caching-related tools
@@ -204,7 +680,13 @@ class BaseQuery(object):
             The location to save the local file if you want to save it
             somewhere other than `BaseQuery.cache_location`
         timeout : int
-        cache : bool
+        cache : bool or 'revalidate'
+            Whether to look up and store the response in the cache of the
+            service.  Entries expire after the configured cache timeout
+            (see `~astroquery.cache`).  With ``'revalidate'``, a cached
+            response is only used once the server confirmed, with its
+            ``ETag`` or ``Last-Modified`` validator, that it is still
+            current; otherwise the new response replaces it.
         verify : bool
             Verify the server's TLS certificate?
             (see http://docs.python-requests.org/en/master/_modules/requests/sessions/?highlight=verify)
@@ -213,6 +695,10 @@ class BaseQuery(object):
             parameter will try to continue the download where it left off.
             See `_download_file`.
         stream : bool
+        content_digest : str or None
+            A digest (e.g. a checksum) of the uploaded ``files``, and of
+            ``data`` unless it is a dict of form fields, to key the cache on
+            instead of their content.  By default the content is hashed.
 
         Returns
         -------
@@ -230,6 +716,20 @@ class BaseQuery(object):
             timeout=timeout,
             json=json
         )
+        capture = self._aio_capture
+        if capture is not None:
+            if save or stream or auth is not None or files is not None:
+                raise _SyncRequest(url)
+            query = AstroQuery(method, url, content_digest=content_digest,
+                               **req_kwargs)
+            if not query.hashable():
+                raise _SyncRequest(url)
+            self._last_query = query
+            return capture.response(query, dict(
+                params=params, data=data, headers=headers, timeout=timeout,
+                json=json, cache=cache, verify=verify,
+                allow_redirects=allow_redirects,
+                content_digest=content_digest))
         if save:
             local_filename = url.split('/')[-1]
             if os.name == 'nt':
@@ -244,30 +744,368 @@ class BaseQuery(object):
                                 auth=auth, **req_kwargs)
             return local_filepath
         else:
-            query = AstroQuery(method, url, **req_kwargs)
-            if ((self.cache_location is None) or (not self._cache_active) or (not cache)):
-                with suspend_cache(self):
-                    response = query.request(self._session, stream=stream,
-                                             auth=auth, verify=verify,
-                                             allow_redirects=allow_redirects,
-                                             json=json)
-            else:
-                response = query.from_cache(self.cache_location)
-                if not response:
-                    response = query.request(self._session,
-                                             self.cache_location,
-                                             stream=stream,
-                                             auth=auth,
-                                             allow_redirects=allow_redirects,
-                                             verify=verify,
-                                             json=json)
-                    to_cache(response, query.request_file(self.cache_location))
+            query = AstroQuery(method, url, content_digest=content_digest,
+                               **req_kwargs)
+            # requests without a cache key are neither looked up nor stored
+            use_cache = (self.cache_location is not None
+                         and self._cache_active and cache
+                         and query.hashable())
+            with metrics.measure(metrics.Event(
+                    'request', self._service_name(), method, url)) as event:
+                if not use_cache:
+                    def send():
+                        with suspend_cache(self):
+                            return self._send_request(
+                                query, stream=stream, auth=auth,
+                                verify=verify,
+                                allow_redirects=allow_redirects, json=json)
+                else:
+                    cache_backend = self._get_cache_backend()
+
+                    def send():
+                        return self._cached_request(
+                            query, cache_backend,
+                            revalidate=cache == 'revalidate', stream=stream,
+                            auth=auth, verify=verify,
+                            allow_redirects=allow_redirects, json=json)
+                key = None
+                if not stream and auth is None and files is None:
+                    key = self._coalescing_key(
+                        query, cache, use_cache and cache, verify,
+                        allow_redirects)
+                if key is None:
+                    response = send()
+                else:
+                    response, shared = _in_flight.do(key, send)
+                    if shared:
+                        response = _copy_response(response)
+                        event.cache = 'coalesced'
+                        event.status = getattr(response, 'status_code', None)
+                if use_cache and cache_backend.cacheable(response):
+                    # Lets the parsed result be cached as well
+                    response._cache_key = query.hash()
+                event.nbytes = _response_size(response)
             self._last_query = query
             return response
 
+    def _coalescing_key(self, query, cache, *args):
+        """
+        The key under which concurrent sends of ``query`` by this object
+        (hence with the same session), with the ``cache`` option and the same
+        further ``args``, are coalesced into one, or `None` not to coalesce
+        them.
+        """
+        if not self.coalesce_requests:
+            return None
+        if not (query.method.upper() in retry.IDEMPOTENT_METHODS
+                or (query.method.upper() == 'POST' and self.idempotent_post)):
+            # each request may change the state of the service
+            return None
+        if not cache and not self.coalesce_uncached_requests:
+            return None
+        try:
+            return (query.hash(), id(self)) + args
+        except TypeError:
+            # payload which cannot be hashed
+            return None
+
+    def _cached_request(self, query, cache_backend, revalidate=False,
+                        **kwargs):
+        """
+        Return the response to ``query`` from ``cache_backend``, sending the
+        request (with ``kwargs``) and caching its response on a miss, or to
+        revalidate the cached response if ``revalidate`` is True.
+
+        Processes (and threads) missing the same entry are serialized by the
+        lock of the entry, so that only the first one sends the request and
+        the others use the response it cached.
+        """
+        event = metrics.current()
+        key = query.hash()
+        cached = cache_backend.get(key)
+        if not cached or revalidate:
+            with cache_backend.lock(key):
+                if not cached:
+                    cached = cache_backend.get(key)
+                if not cached or revalidate:
+                    response = self._send_request(
+                        query, headers=(cache_backend.conditional_headers(
+                            cached) if cached else None), **kwargs)
+                    if cached and response.status_code == 304:
+                        event.cache = 'revalidated'
+                        return cache_backend.revalidated(key, cached,
+                                                         response)
+                    cache_backend.set(key, response)
+                    event.cache = 'miss'
+                    return response
+        event.cache = 'hit'
+        event.status = cached.status_code
+        return cached
+
+    def _send_request(self, query, **kwargs):
+        """
+        Send ``query`` with the session of the service.  See `_send`.
+        """
+        request = functools.partial(query.request, self._session, **kwargs)
+        rewind = _rewinder(_uploads(query))
+        if rewind is None:
+            # the uploads would be sent again from where the failed
+            # attempt left them
+            return self._send(query.method, query.url, request, retry=False)
+
+        def send():
+            rewind()
+            return request()
+        return self._send(query.method, query.url, send)
+
+    def _send(self, method, url, send, retry=True):
+        """
+        Call ``send`` to send a ``method`` request to ``url`` as soon as the
+        rate limit of the host allows it, and retry it according to
+        ``retry_policy`` if the method is idempotent, unless not ``retry``.
+        """
+        breaker = self._get_circuit_breaker(url)
+        policy = self._get_retry_policy()
+        retryable = retry and (
+            policy.is_retryable(method)
+            or (method.upper() == 'POST' and self.idempotent_post))
+        attempt = 0
+        while True:
+            breaker.check()
+            delay = self._rate_limit_delay(url)
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                response = send()
+            except Exception as ex:
+                wait = self._retry_delay(url, attempt, breaker, policy,
+                                         retryable, exception=ex)
+                if wait is None:
+                    raise
+            else:
+                _record_response(response)
+                wait = self._retry_delay(url, attempt, breaker, policy,
+                                         retryable, response=response)
+                if wait is None:
+                    return response
+            time.sleep(wait)
+            attempt += 1
+
+    def _get_circuit_breaker(self, url):
+        return retry.get_circuit_breaker(
+            urlparse(url).netloc,
+            failure_threshold=self.retry_policy.failure_threshold,
+            reset_timeout=self.retry_policy.reset_timeout)
+
+    def _get_retry_policy(self):
+        """
+        ``retry_policy``, with the ``max_retries`` and ``backoff_factor``
+        settings of the service (see `_service_setting`), if set.
+        """
+        settings = {name: self._service_setting(name)
+                    for name in ('max_retries', 'backoff_factor')}
+        settings = {name: value for name, value in settings.items()
+                    if value is not None}
+        if not settings:
+            return self.retry_policy
+        policy = copy.copy(self.retry_policy)
+        policy.__dict__.update(settings)
+        return policy
+
+    def _retry_delay(self, url, attempt, breaker, policy, retryable,
+                     response=None, exception=None):
+        """
+        Record the outcome of a request to ``url`` and return the time
+        (seconds) to wait before retrying it according to ``policy``, or
+        `None` not to retry it, as always if not ``retryable``.
+        """
+        if not policy.is_failure(response, exception):
+            if exception is None:
+                breaker.record_success()
+            return None
+        breaker.record_failure()
+        if not retryable:
+            return None
+        wait = policy.delay(attempt, response)
+        if wait is not None:
+            event = metrics.current()
+            if event is not None:
+                event.retries += 1
+            reason = (repr(exception) if exception is not None
+                      else 'HTTP {0}'.format(response.status_code))
+            log.warning("Request to {0} failed ({1}); retrying in {2:.1f} s "
+                        "(retry {3}/{4})".format(url, reason, wait,
+                                                 attempt + 1,
+                                                 policy.max_retries))
+            if response is not None and hasattr(response, 'close'):
+                response.close()
+        return wait
+
+    def _rate_limit_delay(self, url):
+        """
+        Reserve a request to the host of ``url`` and return the time
+        (seconds) to wait before sending it.
+
+        The rate limit is set by the ``rate_limit`` (requests per second) and
+        ``rate_burst`` settings of the service (see `_service_setting`), and
+        shared by all the instances and threads sending requests to the same
+        host.
+        """
+        rate = self._service_setting('rate_limit')
+        if not rate:
+            return 0
+        bucket = ratelimit.get_token_bucket(
+            urlparse(url).netloc, rate, self._service_setting('rate_burst') or 1)
+        return bucket.reserve()
+
+    async def _query_aio(self, method_name, *args, **kwargs):
+        """
+        Coroutine calling the query method ``method_name`` with ``args`` and
+        ``kwargs``, for the ``query_*_aio`` methods made by
+        `~astroquery.utils.async_to_sync`.
+
+        If the service opts in with ``aio_transport``, the query is run in
+        the event loop until a request whose response is not fetched yet,
+        which is then sent by `_request_aio` while other coroutines run, and
+        run again until all its requests are answered, so that its result is
+        built (and parsed) at once.  Otherwise, or for queries downloading
+        files, streaming or with uploads or credentials, the query runs in a
+        thread of the default executor of the loop.
+        """
+        import asyncio
+        method = functools.partial(getattr(self, method_name), *args,
+                                   **kwargs)
+        if self.aio_transport and HAS_AIOHTTP and sessions._cassette is None:
+            capture = _AioCapture()
+            while True:
+                capture.sent.clear()
+                self._aio_capture = capture
+                try:
+                    return method()
+                except _PendingRequest as pending:
+                    response = await self._request_aio(
+                        pending.query.method, pending.query.url,
+                        **pending.kwargs)
+                    capture.responses[pending.query.hash()].append(response)
+                except _SyncRequest:
+                    break
+                finally:
+                    self._aio_capture = None
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, method)
+
+    async def _request_aio(self, method, url,
+                           params=None, data=None, headers=None,
+                           timeout=None, cache=True, verify=True,
+                           allow_redirects=True, json=None,
+                           content_digest=None):
+        """
+        A coroutine version of `_request`, sending the request with
+        `aiohttp`, for use in `asyncio` event loops.
+
+        The responses share the cache of `_request`, under the same keys
+        (given by `AstroQuery.hash`), and the requests are throttled,
+        retried and coalesced like those of `_request`.  The connections are
+        pooled per host in a session shared by the coroutines of the loop,
+        closed when the loop shuts down its asynchronous generators (as
+        `asyncio.run` does).
+
+        Parameters
+        ----------
+        method, url, params, data, headers, timeout, cache, verify,
+        allow_redirects, json, content_digest
+            See `_request`
+
+        Returns
+        -------
+        response : `requests.Response`
+            The response from the server
+        """
+        query = AstroQuery(method, url, params=params, data=data,
+                           headers=headers, timeout=timeout, json=json,
+                           content_digest=content_digest)
+        use_cache = (self.cache_location is not None and self._cache_active
+                     and cache and query.hashable())
+        cache_backend = self._get_cache_backend() if use_cache else None
+
+        async def send(event):
+            cached = cache_backend.get(query.hash()) if use_cache else None
+            if cached and cache != 'revalidate':
+                event.cache = 'hit'
+                event.status = cached.status_code
+                return cached
+            response = await self._send_aio(
+                query, headers=(cache_backend.conditional_headers(cached)
+                                if cached else None),
+                verify=verify, allow_redirects=allow_redirects)
+            if cached and response.status_code == 304:
+                event.cache = 'revalidated'
+                return cache_backend.revalidated(query.hash(), cached,
+                                                 response)
+            if use_cache:
+                cache_backend.set(query.hash(), response)
+                event.cache = 'miss'
+            return response
+
+        with metrics.measure(metrics.Event(
+                'request', self._service_name(), method, url)) as event:
+            # coalesced apart from the requests of _request, whose thread may
+            # be the one running the loop
+            key = self._coalescing_key(query, cache, use_cache and cache,
+                                       verify, allow_redirects, 'aio')
+            if key is None:
+                response = await send(event)
+            else:
+                response, shared = await _in_flight.do_aio(
+                    key, functools.partial(send, event))
+                if shared:
+                    response = _copy_response(response)
+                    event.cache = 'coalesced'
+                    event.status = getattr(response, 'status_code', None)
+            if use_cache and cache_backend.cacheable(response):
+                response._cache_key = query.hash()
+            event.nbytes = _response_size(response)
+        self._last_query = query
+        return response
+
+    async def _send_aio(self, query, **kwargs):
+        """
+        Coroutine version of `_send`, sending ``query`` with the `aiohttp`
+        session of the event loop and ``kwargs`` (see
+        `AstroQuery.request_aio`).
+        """
+        import asyncio
+        session = await _aio_session()
+        breaker = self._get_circuit_breaker(query.url)
+        policy = self._get_retry_policy()
+        retryable = (policy.is_retryable(query.method)
+                     or (query.method.upper() == 'POST'
+                         and self.idempotent_post))
+        attempt = 0
+        while True:
+            breaker.check()
+            delay = self._rate_limit_delay(query.url)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                response = await query.request_aio(session, **kwargs)
+            except Exception as ex:
+                wait = self._retry_delay(query.url, attempt, breaker, policy,
+                                         retryable, exception=ex)
+                if wait is None:
+                    raise
+            else:
+                _record_response(response)
+                wait = self._retry_delay(query.url, attempt, breaker, policy,
+                                         retryable, response=response)
+                if wait is None:
+                    return response
+            await asyncio.sleep(wait)
+            attempt += 1
+
     def _download_file(self, url, local_filepath, timeout=None, auth=None,
                        continuation=True, cache=False, method="GET",
-                       head_safe=False, **kwargs):
+                       head_safe=False, segments=None, **kwargs):
         """
         Download a file.  Resembles `astropy.utils.data.download_file` but uses
         the local ``_session``
@@ -285,16 +1123,38 @@ class BaseQuery(object):
         cache : bool
         method : "GET" or "POST"
         head_safe : bool
+        segments : int or None
+            Number of byte ranges to fetch concurrently if the server
+            supports range requests (see `_download_segmented`).  Defaults
+            to ``download_segments``.
         """
-
+        directory = os.path.dirname(local_filepath)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        # Processes downloading the same file wait for the first one, and
+        # then find the file complete.
+        lock = _download_lock(local_filepath)
+        with metrics.measure(metrics.Event(
+                'download', self._service_name(), method, url)), lock:
+            return self._fetch_file(url, local_filepath, timeout=timeout,
+                                    auth=auth, continuation=continuation,
+                                    cache=cache, method=method,
+                                    head_safe=head_safe, segments=segments,
+                                    **kwargs)
+
+    def _fetch_file(self, url, local_filepath, timeout=None, auth=None,
+                    continuation=True, cache=False, method="GET",
+                    head_safe=False, segments=None, **kwargs):
+        """ Implementation of `_download_file` """
+        event = metrics.current()
         if head_safe:
-            response = self._session.request("HEAD", url,
-                                             timeout=timeout, stream=True,
-                                             auth=auth, **kwargs)
+            response = self._send("HEAD", url, functools.partial(
+                self._session.request, "HEAD", url, timeout=timeout,
+                stream=True, auth=auth, **kwargs))
         else:
-            response = self._session.request(method, url,
-                                             timeout=timeout, stream=True,
-                                             auth=auth, **kwargs)
+            response = self._send(method, url, functools.partial(
+                self._session.request, method, url, timeout=timeout,
+                stream=True, auth=auth, **kwargs))
 
         response.raise_for_status()
         if 'content-length' in response.headers:
@@ -304,6 +1164,48 @@ class BaseQuery(object):
         else:
             length = None
 
+        if segments is None:
+            segments = self.download_segments
+        state_path = local_filepath + '.segments'
+        part_path = local_filepath + '.part'
+        target = local_filepath
+        if ((segments > 1 and length and method == "GET"
+             and response.headers.get('Accept-Ranges') == 'bytes'
+             and not kwargs.get('data') and not kwargs.get('files'))):
+            response.close()
+            if ((os.path.exists(local_filepath)
+                 and not os.path.exists(state_path)
+                 and os.stat(local_filepath).st_size == length
+                 and (cache or continuation))):
+                log.info("Found cached file {0} with expected size {1}."
+                         .format(local_filepath, length))
+                if event is not None:
+                    event.cache = 'hit'
+                return response
+            try:
+                self._download_segmented(url, local_filepath, length,
+                                         segments, timeout=timeout,
+                                         auth=auth, resume=continuation,
+                                         **kwargs)
+                return response
+            except _RangesNotSupported:
+                log.info("{0} ignores range requests; downloading it in a "
+                         "single stream".format(url))
+                for path in (state_path, part_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                return self._fetch_file(url, local_filepath,
+                                        timeout=timeout, auth=auth,
+                                        continuation=False, cache=False,
+                                        method=method, segments=1,
+                                        **kwargs)
+        elif os.path.exists(state_path):
+            # the preallocated file of an interrupted segmented download
+            # cannot be continued as a single stream
+            for path in (state_path, part_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
         if ((os.path.exists(local_filepath)
              and ('Accept-Ranges' in response.headers)
              and continuation)):
@@ -314,6 +1216,8 @@ class BaseQuery(object):
                 # all done!
                 log.info("Found cached file {0} with expected size {1}."
                          .format(local_filepath, existing_file_length))
+                if event is not None:
+                    event.cache = 'hit'
                 return
             elif existing_file_length == 0:
                 open_mode = 'wb'
@@ -326,12 +1230,14 @@ class BaseQuery(object):
                 # bytes are indexed from 0:
                 # https://en.wikipedia.org/wiki/List_of_HTTP_header_fields#range-request-header
                 end = "{0}".format(length-1) if length is not None else ""
-                self._session.headers['Range'] = "bytes={0}-{1}".format(existing_file_length,
-                                                                        end)
-
-                response = self._session.request(method, url,
-                                                 timeout=timeout, stream=True,
-                                                 auth=auth, **kwargs)
+                # per request: the session is shared by all the threads
+                headers = dict(kwargs.pop('headers', None) or {})
+                headers['Range'] = "bytes={0}-{1}".format(existing_file_length,
+                                                          end)
+
+                response = self._send(method, url, functools.partial(
+                    self._session.request, method, url, timeout=timeout,
+                    stream=True, auth=auth, headers=headers, **kwargs))
                 response.raise_for_status()
 
         elif cache and os.path.exists(local_filepath):
@@ -348,22 +1254,50 @@ class BaseQuery(object):
                     log.info("Found cached file {0} with expected size {1}."
                              .format(local_filepath, statinfo.st_size))
                     response.close()
+                    if event is not None:
+                        event.cache = 'hit'
                     return
             else:
                 log.info("Found cached file {0}.".format(local_filepath))
                 response.close()
+                if event is not None:
+                    event.cache = 'hit'
                 return
         else:
             open_mode = 'wb'
-            if head_safe:
-                response = self._session.request(method, url,
-                                                 timeout=timeout, stream=True,
-                                                 auth=auth, **kwargs)
+            part_length = (os.path.getsize(part_path)
+                           if os.path.exists(part_path) else 0)
+            if ((continuation and length and 0 < part_length < length
+                 and 'Accept-Ranges' in response.headers)):
+                log.info("Continuing download of file {0}, with {1} bytes to "
+                         "go".format(local_filepath, length - part_length))
+                response.close()
+                headers = dict(kwargs.pop('headers', None) or {})
+                headers['Range'] = 'bytes={0}-{1}'.format(part_length,
+                                                          length - 1)
+                response = self._send(method, url, functools.partial(
+                    self._session.request, method, url, timeout=timeout,
+                    stream=True, auth=auth, headers=headers, **kwargs))
+                response.raise_for_status()
+                if response.status_code == 206:
+                    open_mode = 'ab'
+                    target = part_path
+            elif head_safe:
+                response = self._send(method, url, functools.partial(
+                    self._session.request, method, url, timeout=timeout,
+                    stream=True, auth=auth, **kwargs))
                 response.raise_for_status()
 
+        if open_mode == 'wb':
+            # Written under a temporary name and renamed once complete, so
+            # that an interrupted download is never taken for the file (and
+            # is continued where it left off)
+            target = part_path
+
         blocksize = astropy.utils.data.conf.download_block_size
 
         bytes_read = 0
+        received = 0
 
         # Only show progress bar if logging level is INFO or lower.
         if log.getEffectiveLevel() <= 20:
@@ -375,10 +1309,11 @@ class BaseQuery(object):
                 length, ('Downloading URL {0} to {1} ...'
                          .format(url, local_filepath)),
                 file=progress_stream) as pb:
-            with open(local_filepath, open_mode) as f:
+            with open(target, open_mode) as f:
                 for block in response.iter_content(blocksize):
                     f.write(block)
                     bytes_read += blocksize
+                    received += len(block)
                     if length is not None:
                         pb.update(bytes_read if bytes_read <= length else
                                   length)
@@ -386,8 +1321,137 @@ class BaseQuery(object):
                         pb.update(bytes_read)
 
         response.close()
+        if target != local_filepath:
+            os.replace(target, local_filepath)
+        if event is not None:
+            event.nbytes = received
         return response
 
+    def _download_segmented(self, url, local_filepath, length, segments,
+                            timeout=None, auth=None, resume=True, **kwargs):
+        """
+        Download the ``length`` bytes of ``url`` to ``local_filepath`` as
+        ``segments`` byte ranges fetched concurrently into a preallocated
+        ``local_filepath + '.part'`` file, renamed once complete so that an
+        interrupted download is never taken for the file.
+
+        The progress of each range is recorded in ``local_filepath +
+        '.segments'`` until the download completes, so that an interrupted
+        download resumes (if ``resume`` is True) where each range left off.
+        Ranges interrupted by connection errors are resumed according to
+        ``retry_policy``.  Raises ``_RangesNotSupported`` if the server
+        answers a range request with the whole file.
+        """
+        state_path = local_filepath + '.segments'
+        part_path = local_filepath + '.part'
+        ranges = None
+        if resume and os.path.exists(part_path):
+            ranges = _load_segments(state_path, url, length)
+        if ranges is None:
+            step = -(-length // segments)
+            ranges = [[start, min(start + step, length) - 1, start]
+                      for start in range(0, length, step)]
+            with open(part_path, 'wb') as f:
+                f.truncate(length)
+        else:
+            log.info("Continuing segmented download of file {0}"
+                     .format(local_filepath))
+
+        def save_state():
+            with open(state_path, 'w') as f:
+                json.dump({'url': url, 'length': length,
+                           'segments': ranges}, f)
+
+        blocksize = astropy.utils.data.conf.download_block_size
+        headers = kwargs.pop('headers', None) or {}
+        stop = threading.Event()
+
+        policy = self._get_retry_policy()
+
+        def fetch(segment):
+            attempt = 0
+            with open(part_path, 'r+b') as f:
+                while segment[2] <= segment[1] and not stop.is_set():
+                    start = segment[2]
+                    range_headers = dict(headers, Range='bytes={0}-{1}'
+                                         .format(start, segment[1]))
+                    response = self._send("GET", url, functools.partial(
+                        self._session.request, "GET", url, timeout=timeout,
+                        stream=True, auth=auth, headers=range_headers,
+                        **kwargs))
+                    try:
+                        response.raise_for_status()
+                        if response.status_code != 206:
+                            raise _RangesNotSupported()
+                        f.seek(start)
+                        for block in response.iter_content(blocksize):
+                            block = block[:segment[1] + 1 - segment[2]]
+                            f.write(block)
+                            segment[2] += len(block)
+                            if stop.is_set():
+                                return
+                    except _STREAM_ERRORS as ex:
+                        wait = policy.delay(attempt)
+                        if wait is None:
+                            raise
+                        event = metrics.current()
+                        if event is not None:
+                            event.retries += 1
+                        log.warning("Download of bytes {0}-{1} of {2} "
+                                    "interrupted ({3!r}); resuming in "
+                                    "{4:.1f} s".format(segment[2], segment[1],
+                                                       url, ex, wait))
+                        time.sleep(wait)
+                        attempt += 1
+                        continue
+                    finally:
+                        response.close()
+                    if segment[2] == start:
+                        raise IOError("Incomplete download of bytes {0}-{1} "
+                                      "of {2}".format(start, segment[1], url))
+
+        if log.getEffectiveLevel() <= 20:
+            progress_stream = None
+        else:
+            progress_stream = io.StringIO()
+
+        pending = [segment for segment in ranges if segment[2] <= segment[1]]
+        resumed_from = sum(segment[2] - segment[0] for segment in ranges)
+        with ProgressBarOrSpinner(
+                length, ('Downloading URL {0} to {1} in {2} segments ...'
+                         .format(url, local_filepath, len(ranges))),
+                file=progress_stream) as pb:
+            try:
+                with ThreadPoolExecutor(max_workers=max(len(pending), 1)
+                                        ) as executor:
+                    # the workers contribute to the current metrics event
+                    futures = [executor.submit(metrics.propagate(fetch),
+                                               segment)
+                               for segment in pending]
+                    try:
+                        while futures:
+                            done, futures = wait(futures, timeout=0.5,
+                                                 return_when=FIRST_EXCEPTION)
+                            pb.update(min(length, sum(
+                                segment[2] - segment[0] for segment in ranges)))
+                            save_state()
+                            for future in done:
+                                future.result()
+                    finally:
+                        stop.set()
+            except _RangesNotSupported:
+                raise
+            except BaseException:
+                save_state()
+                raise
+            finally:
+                event = metrics.current()
+                if event is not None:
+                    event.nbytes = sum(segment[2] - segment[0]
+                                       for segment in ranges) - resumed_from
+        os.replace(part_path, local_filepath)
+        os.remove(state_path)
+
 
 class suspend_cache:
     """
@@ -421,6 +1485,8 @@ class QueryWithLogin(BaseQuery):
 
     def _get_password(self, service_name, username, reenter=False):
         """Get password from keyring or prompt."""
+        import getpass
+        import keyring
 
         password_from_keyring = None
         if reenter is False:
@@ -0,0 +1,153 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+``astroquery-cache``: list, prune and warm the caches of the services.
+
+Examples::
+
+    $ astroquery-cache list --service Simbad --service Vizier
+    $ astroquery-cache prune --older-than 30d --max-size 5G
+    $ astroquery-cache warm queries.json --workers 16
+
+The queries given to ``warm`` are a JSON list of objects, or one object per
+line, with the ``service`` and ``method`` to call and optional ``args`` and
+``kwargs``, e.g.::
+
+    {"service": "vizier.Vizier", "method": "query_object",
+     "args": ["M31"], "kwargs": {"catalog": "II/246"}}
+
+See `astroquery.cache.list_entries`, `astroquery.cache.prune` and
+`astroquery.cache.warm`.
+"""
+import argparse
+import datetime
+import re
+import sys
+import time
+
+from .. import cache
+
+__all__ = ['main']
+
+_SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024**2, 'g': 1024**3, 't': 1024**4}
+_AGE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def _parse_size(value):
+    """ Parse a size in bytes such as ``'500M'`` or ``'2G'`` """
+    match = re.match(r'^\s*([\d.]+)\s*([kmgt]?)i?b?\s*$', value, re.I)
+    if not match:
+        raise argparse.ArgumentTypeError("invalid size: {0!r}".format(value))
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()])
+
+
+def _parse_age(value):
+    """ Parse an age in seconds such as ``'12h'`` or ``'30d'`` """
+    match = re.match(r'^\s*([\d.]+)\s*([smhdw]?)\s*$', value, re.I)
+    if not match:
+        raise argparse.ArgumentTypeError("invalid age: {0!r}".format(value))
+    return float(match.group(1)) * _AGE_UNITS[match.group(2).lower() or 's']
+
+
+def _format_size(size):
+    if size < 1024:
+        return '{0} B'.format(size)
+    for unit in ('kB', 'MB', 'GB', 'TB'):
+        size /= 1024.
+        if size < 1024 or unit == 'TB':
+            return '{0:.1f} {1}'.format(size, unit)
+
+
+def _format_age(created, now):
+    return str(datetime.timedelta(seconds=int(now - created)))
+
+
+def _print_entries(entries, out):
+    now = time.time()
+    for entry in entries:
+        out.write('{0:<20} {1:>10} {2:>18}  {3}\n'.format(
+            entry.service, _format_size(entry.size),
+            _format_age(entry.created, now), entry.url or entry.key))
+
+
+def _list(args, out):
+    entries = cache.list_entries(args.service, root=args.root)
+    key = {'age': lambda entry: -entry.created,
+           'size': lambda entry: entry.size,
+           'service': lambda entry: (entry.service, -entry.created)}
+    entries.sort(key=key[args.sort])
+    _print_entries(entries, out)
+    out.write('{0} entries, {1}\n'.format(
+        len(entries), _format_size(sum(entry.size for entry in entries))))
+    return 0
+
+
+def _prune(args, out):
+    removed = cache.prune(args.service, older_than=args.older_than,
+                          max_size=args.max_size, root=args.root,
+                          dry_run=args.dry_run)
+    if args.verbose or args.dry_run:
+        _print_entries(removed, out)
+    out.write('{0} {1} entries, {2}\n'.format(
+        'Would remove' if args.dry_run else 'Removed', len(removed),
+        _format_size(sum(entry.size for entry in removed))))
+    return 0
+
+
+def _warm(args, out):
+    results = cache.warm(args.specs, max_workers=args.workers,
+                         root=args.root)
+    failed = [result for result in results if isinstance(result, Exception)]
+    out.write('{0} queries, {1} failed\n'.format(len(results), len(failed)))
+    return 1 if failed else 0
+
+
+def main(args=None, out=None):
+    """ Run ``astroquery-cache`` with the command-line arguments ``args`` """
+    parser = argparse.ArgumentParser(
+        prog='astroquery-cache',
+        description='Inspect, prune and warm the astroquery caches.')
+    parser.add_argument('--root', default=None,
+                        help='directory of the service caches (default: '
+                        '{0})'.format(cache.get_cache_root()))
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    list_parser = commands.add_parser('list', help='list the cache entries')
+    list_parser.add_argument('--sort', choices=['age', 'size', 'service'],
+                             default='service')
+    list_parser.set_defaults(run=_list)
+
+    prune_parser = commands.add_parser(
+        'prune', help='remove cache entries, by default all of them')
+    prune_parser.add_argument('--older-than', type=_parse_age,
+                              metavar='AGE',
+                              help='remove entries older than AGE, e.g. '
+                              '3600, 12h or 30d')
+    prune_parser.add_argument('--max-size', type=_parse_size,
+                              metavar='SIZE',
+                              help='then remove the least recently used '
+                              'entries beyond SIZE in total, e.g. 500M')
+    prune_parser.add_argument('--dry-run', action='store_true',
+                              help='only list the entries to remove')
+    prune_parser.add_argument('-v', '--verbose', action='store_true')
+    prune_parser.set_defaults(run=_prune)
+
+    warm_parser = commands.add_parser(
+        'warm', help='run the queries of a file to fill the caches')
+    warm_parser.add_argument('specs', metavar='FILE',
+                             help='JSON file of query specifications')
+    warm_parser.add_argument('--workers', type=int, default=8,
+                             help='number of concurrent queries')
+    warm_parser.set_defaults(run=_warm)
+
+    for subparser in (list_parser, prune_parser):
+        subparser.add_argument('-s', '--service', action='append',
+                               help='only the entries of this service '
+                               '(cache directory name); repeatable')
+
+    args = parser.parse_args(args)
+    return args.run(args, out or sys.stdout)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
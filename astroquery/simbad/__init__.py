@@ -28,6 +28,27 @@ class Conf(_config.ConfigNamespace):
         0,
         'Maximum number of rows that will be fetched from the result.')
 
+    rate_limit = _config.ConfigItem(
+        5.0,
+        'Maximum number of queries per second sent to the SIMBAD server, '
+        'which blacklists clients sending more than 6 per second.  0 '
+        'disables the limit.')
+
+    rate_burst = _config.ConfigItem(
+        1,
+        'Number of queries that can be sent at once before rate_limit '
+        'applies.')
+
+    max_retries = _config.ConfigItem(
+        3,
+        'Number of times a query which failed, with a connection error or '
+        'an HTTP 429, 502, 503 or 504 response, is sent again.')
+
+    backoff_factor = _config.ConfigItem(
+        1.0,
+        'Time (seconds) waited before retrying a failed query, doubled '
+        'after each retry.')
+
 
 conf = Conf()
 
@@ -19,6 +19,7 @@ from six import BytesIO
 
 from ..query import BaseQuery
 from ..utils import commons
+from ..utils.threadlocal import ThreadLocalAttribute
 from ..exceptions import TableParseError, LargeQueryWarning
 from . import conf
 from ..utils.process_asyncs import async_to_sync
@@ -273,6 +274,9 @@ class SimbadClass(SimbadBaseQuery):
     """
     SIMBAD_URL = 'http://' + conf.server + '/simbad/sim-script'
     TIMEOUT = conf.timeout
+    # the scripts POSTed to SIMBAD only query it
+    idempotent_post = True
+    aio_transport = True
     WILDCARDS = {
         '*': 'Any string of characters (including an empty one)',
         '?': 'Any character (exactly one character)',
@@ -301,6 +305,12 @@ class SimbadClass(SimbadBaseQuery):
     # <http://nbviewer.ipython.org/5851110>
     _VOTABLE_FIELDS = ['main_id', 'coordinates']
 
+    # intermediate results of the last query of the current thread, for
+    # debugging
+    last_response = ThreadLocalAttribute()
+    last_parsed_result = ThreadLocalAttribute()
+    last_table_parse_error = ThreadLocalAttribute()
+
     def __init__(self):
         super(SimbadClass, self).__init__()
         self._VOTABLE_FIELDS = copy.copy(self._VOTABLE_FIELDS)
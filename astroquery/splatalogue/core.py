@@ -467,6 +467,10 @@ class SplatalogueClass(BaseQuery):
 
         return response
 
+    def _parse_result_key(self):
+        # the parsed tables only depend on the responses
+        return ''
+
     def _parse_result(self, response, verbose=False):
         """
         Parse a response into an `~astropy.table.Table`
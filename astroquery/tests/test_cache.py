@@ -0,0 +1,475 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import hashlib
+import io
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+import pytest
+import requests
+from astropy.table import MaskedColumn, Table
+from astropy.time import Time
+
+from .. import cache, cache_conf
+from ..query import BaseQuery
+from ..scripts.cache import main
+from ..utils import TableList
+from ..utils.testing_tools import DummyClass, make_response
+
+URL = 'http://example.com/query'
+KEYS = {name: hashlib.sha224(name.encode()).hexdigest() for name in 'abc'}
+
+
+class TableDummyClass(DummyClass):
+
+    def _parse_result_key(self):
+        return ''
+
+    def _parse_result(self, response, verbose=False):
+        text = super(TableDummyClass, self)._parse_result(response)
+        return Table({'content': [text]})
+
+
+class PagedDummyClass(TableDummyClass):
+    """ A service returning the responses of all its pages, as MAST does """
+
+    def query_object_async(self, name, cache=True):
+        return [self._request('GET', URL, params={'name': name, 'page': page},
+                              cache=cache)
+                for page in (1, 2)]
+
+    def _parse_result(self, responses, verbose=False):
+        self.parsed += 1
+        return Table({'content': [response.text for response in responses]})
+
+
+@pytest.fixture(params=['filesystem', 'sqlite'])
+def backend(request, tmpdir):
+    return cache.CACHE_BACKENDS[request.param](tmpdir.strpath)
+
+
+@pytest.fixture
+def query(monkeypatch, tmpdir):
+    requests_sent = []
+
+    def request(session, method, url, params=None, **kwargs):
+        requests_sent.append((method, url, params))
+        return make_response(str(params).encode() * 100)
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    qu = BaseQuery()
+    qu.cache_location = tmpdir.strpath
+    qu.requests_sent = requests_sent
+    return qu
+
+
+def test_abstract_backend(tmpdir):
+    with pytest.raises(TypeError):
+        cache.CacheBackend(tmpdir.strpath)
+
+
+def test_get_set_remove(backend):
+    assert backend.get(KEYS['a']) is None
+    backend.set(KEYS['a'], make_response(b'table data'))
+    assert backend.get(KEYS['a']).content == b'table data'
+    assert [entry.key for entry in backend.entries()] == [KEYS['a']]
+    backend.remove(KEYS['a'])
+    assert backend.get(KEYS['a']) is None
+    assert backend.entries() == []
+
+
+def test_entry_files(backend):
+    # a response and a parsed result under the same key are one entry
+    backend.set(KEYS['a'], make_response(b'table data'))
+    backend.set_result(KEYS['a'], Table({'a': [1]}))
+    size = sum(os.path.getsize(path) for path in (
+        backend.meta_path(KEYS['a']), backend.path(KEYS['a']),
+        backend.result_path(KEYS['a'])))
+    assert [(entry.key, entry.size) for entry in backend.entries()] == [
+        (KEYS['a'], size)]
+    assert backend.total_size() == size
+    backend.remove(KEYS['a'])
+    assert backend.entries() == []
+
+
+def test_cached_response(backend):
+    backend.set(KEYS['a'], make_response(b'<?xml?>', headers={
+        'Content-Type': 'text/xml'}))
+    response = backend.get(KEYS['a'])
+    assert isinstance(response, cache.CachedResponse)
+    assert response.status_code == 200
+    assert response.url == URL
+    assert response.headers['content-type'] == 'text/xml'
+    # the body is only read when needed
+    assert response._body is False
+    with response.open() as f:
+        assert f.read() == b'<?xml?>'
+    assert response.mmap()[:] == b'<?xml?>'
+    assert response._body is False
+    assert response.text == '<?xml?>'
+    assert list(response.iter_content(3)) == [b'<?x', b'ml?', b'>']
+
+
+def test_legacy_pickle(backend):
+    with open(backend.legacy_path(KEYS['a']), 'wb') as f:
+        pickle.dump(make_response(b'old'), f)
+    assert backend.get(KEYS['a']).content == b'old'
+    backend.set(KEYS['a'], make_response(b'new'))
+    assert not os.path.exists(backend.legacy_path(KEYS['a']))
+    assert backend.get(KEYS['a']).content == b'new'
+
+
+def test_error_responses_not_cached(backend):
+    backend.set(KEYS['a'], make_response(status_code=500))
+    assert backend.get(KEYS['a']) is None
+
+
+def test_timeout(backend):
+    backend.timeout = 60
+    backend.set(KEYS['a'], make_response(b'table data'))
+    assert backend.get(KEYS['a']) is not None
+    backend.timeout = 0
+    time.sleep(0.01)
+    assert backend.get(KEYS['a']) is None
+    assert not os.path.exists(backend.path(KEYS['a']))
+
+
+def test_lru_eviction(backend):
+    for key in sorted(KEYS):
+        backend.set(KEYS[key], make_response(b'x' * 1000))
+        time.sleep(0.01)
+    size = backend.total_size()
+    # make 'a' the most recently used entry
+    backend.get(KEYS['a'])
+    backend.max_size = size - 1
+    backend.evict()
+    assert (sorted(entry.key for entry in backend.entries())
+            == sorted([KEYS['a'], KEYS['c']]))
+
+
+def test_request_uses_cache(query):
+    response1 = query._request('GET', URL, params={'id': 1})
+    response2 = query._request('GET', URL, params={'id': 1})
+    assert response1.content == response2.content
+    assert len(query.requests_sent) == 1
+
+    query._request('GET', URL, params={'id': 2})
+    assert len(query.requests_sent) == 2
+
+    query._request('GET', URL, params={'id': 1}, cache=False)
+    assert len(query.requests_sent) == 3
+
+
+def test_single_flight(monkeypatch, tmpdir):
+    requests_sent = []
+
+    def request(session, method, url, params=None, **kwargs):
+        requests_sent.append(params)
+        time.sleep(0.2)
+        return make_response(b'table data')
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    qu = BaseQuery()
+    qu.cache_location = tmpdir.strpath
+    # concurrent misses of the same entry wait for the first request
+    responses = qu.query_many('_request',
+                              [{'method': 'GET', 'url': URL}] * 4)
+    assert [response.content for response in responses] == [b'table data'] * 4
+    assert len(requests_sent) == 1
+    assert not tmpdir.listdir(lambda path: path.ext in ('.lock', '.tmp'))
+
+
+def test_interrupted_write(backend, monkeypatch):
+    backend.set(KEYS['a'], make_response(b'old data'))
+
+    def write(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr('astropy.io.fits.HDUList.writeto', write)
+    with pytest.raises(KeyboardInterrupt):
+        backend.set_result(KEYS['a'], Table({'a': [1]}))
+    assert backend.get(KEYS['a']).content == b'old data'
+    assert not [name for name in os.listdir(backend.location)
+                if name.endswith('.tmp')]
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'bz2', 'lzma'])
+def test_compression(backend, compression):
+    votable = b'<?xml?><TABLEDATA>' + b'<TR><TD>1.5</TD></TR>' * 1000
+    fits = b'SIMPLE  =                    T' + b' ' * 10000
+    with cache_conf.set_temp('cache_compression', compression):
+        backend.set(KEYS['a'], make_response(votable, headers={
+            'Content-Type': 'application/x-votable+xml; charset=utf-8'}))
+        backend.set(KEYS['b'], make_response(fits, headers={
+            'Content-Type': 'text/plain'}))
+        backend.set(KEYS['c'], make_response(b' ' * 10000, headers={
+            'Content-Type': 'application/fits'}))
+    assert os.path.getsize(backend.path(KEYS['a'])) < len(votable) / 10
+    assert os.path.getsize(backend.path(KEYS['b'])) == len(fits)
+    assert os.path.getsize(backend.path(KEYS['c'])) == 10000
+    # entries are decompressed whatever the current setting
+    response = backend.get(KEYS['a'])
+    assert response.compression == compression
+    assert response.content == votable
+    with response.open() as f:
+        assert f.read() == votable
+    assert response.mmap()[:] == votable
+    assert backend.get(KEYS['b']).compression is None
+    assert backend.get(KEYS['b']).content == fits
+    # the codec survives revalidation
+    backend.revalidated(KEYS['a'], response, make_response(status_code=304))
+    assert backend.get(KEYS['a']).content == votable
+
+
+def test_service_timeout(query):
+    with cache_conf.set_temp('cache_service_timeouts', ['BaseQuery = 0']):
+        assert cache.get_cache_timeout('BaseQuery') == 0
+        assert cache.get_cache_timeout('Simbad') == cache_conf.cache_timeout
+        query._request('GET', URL, params={'id': 1})
+        time.sleep(0.01)
+        query._request('GET', URL, params={'id': 1})
+    assert len(query.requests_sent) == 2
+
+
+def test_max_size(query):
+    with cache_conf.set_temp('cache_max_size', 1000):
+        for i in range(5):
+            query._request('GET', URL, params={'id': i})
+        assert query._get_cache_backend().total_size() <= 1000
+
+
+def test_parsed_results(query, tmpdir):
+    dummy = TableDummyClass()
+    dummy.cache_location = tmpdir.strpath
+    with cache_conf.set_temp('cache_parsed_results', True):
+        table1 = dummy.query_object(1)
+        table2 = dummy.query_object(1)
+        assert dummy.parsed == 1
+        assert table1['content'][0] == table2['content'][0]
+
+        dummy.query_object(1, cache=False)
+        assert dummy.parsed == 2
+
+        # the results are tables stored as FITS, the other ones are not
+        paths = tmpdir.listdir(lambda path: path.ext == '.result')
+        assert len(paths) == 1
+        assert paths[0].read_binary().startswith(b'SIMPLE  =')
+        backend = dummy._get_cache_backend()
+        backend.set_result(KEYS['a'], 'text')
+        assert backend.get_result(KEYS['a']) is None
+
+        # services which do not opt in are not cached
+        other = DummyClass()
+        other.cache_location = tmpdir.strpath
+        other.query_object(1)
+        other.query_object(1)
+        assert other.parsed == 2
+
+    dummy.query_object(1)
+    assert dummy.parsed == 3
+    assert len(query.requests_sent) == 2
+
+
+def test_parsed_pages(query, tmpdir):
+    dummy = PagedDummyClass()
+    dummy.cache_location = tmpdir.strpath
+    with cache_conf.set_temp('cache_parsed_results', True):
+        table = dummy.query_object(1)
+        assert list(dummy.query_object(1)['content']) == list(table['content'])
+        assert dummy.parsed == 1
+        dummy.query_object(2)
+        assert dummy.parsed == 2
+    assert len(query.requests_sent) == 4
+
+
+def test_result_round_trip(backend):
+    table = Table({'id': np.array([1, -2, 3], dtype='i1'),
+                   'name': MaskedColumn(['M 1 ', 'Mélotte', ''],
+                                        mask=[False, True, False]),
+                   'flux': MaskedColumn([1.5, np.nan, 2.],
+                                        mask=[False, False, True]),
+                   'pos': [[1., 2.], [3., 4.], [5., 6.]],
+                   'code': [b'a ', b'b', b'']},
+                  meta={'description': 'x' * 100, 'links': {'a': [1, 2]}})
+    table['flux'].unit = 'mJy'
+    table['flux'].format = '.3f'
+    table['flux'].description = 'Flux density'
+    table['flux'].meta = {'ucd': 'phot.flux'}
+    backend.set_result(KEYS['a'], table)
+    result = backend.get_result(KEYS['a'])
+    assert result.meta == table.meta
+    for name in table.colnames:
+        assert type(result[name]) is type(table[name])
+        assert result[name].dtype == table[name].dtype
+        np.testing.assert_array_equal(result[name], table[name])
+        for attribute in ('unit', 'format', 'description', 'meta'):
+            assert (getattr(result[name].info, attribute)
+                    == getattr(table[name].info, attribute))
+    assert list(result['name'].mask) == [False, True, False]
+    assert np.isnan(result['flux'][1])
+
+    tables = TableList([('first', table), ('empty', table[:0])])
+    backend.set_result(KEYS['b'], tables)
+    result = backend.get_result(KEYS['b'])
+    assert isinstance(result, TableList)
+    assert result.keys() == ['first', 'empty']
+    assert list(result['first']['name']) == list(table['name'])
+    assert result['empty'].colnames == table.colnames
+    assert result['empty']['pos'].shape == (0, 2)
+
+    # tables of mixin columns are not stored
+    backend.set_result(KEYS['c'], Table({'time': Time([1, 2], format='mjd')}))
+    assert backend.get_result(KEYS['c']) is None
+
+
+@pytest.fixture
+def etag_server(monkeypatch):
+    server = {'etag': '"v1"', 'content': b'catalog list', 'requests': []}
+
+    def request(session, method, url, headers=None, **kwargs):
+        headers = headers or {}
+        server['requests'].append(headers)
+        if headers.get('If-None-Match') == server['etag']:
+            return make_response(b'', status_code=304,
+                                 headers={'ETag': server['etag'],
+                                          'Date': 'Mon, 19 Oct 2020'})
+        return make_response(server['content'],
+                             headers={'ETag': server['etag'],
+                                      'Content-Type': 'text/plain'})
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    return server
+
+
+def test_conditional_headers():
+    response = make_response(headers={
+        'ETag': '"abc"', 'Last-Modified': 'Mon, 19 Oct 2020 10:00:00 GMT'})
+    assert cache.CacheBackend.conditional_headers(response) == {
+        'If-None-Match': '"abc"',
+        'If-Modified-Since': 'Mon, 19 Oct 2020 10:00:00 GMT'}
+    assert cache.CacheBackend.conditional_headers(make_response(b'table data')) == {}
+
+
+def test_not_modified_not_cached(backend):
+    backend.set(KEYS['a'], make_response(status_code=304))
+    assert backend.get(KEYS['a']) is None
+
+
+def test_revalidate(etag_server, tmpdir):
+    qu = BaseQuery()
+    qu.cache_location = tmpdir.strpath
+    response = qu._request('GET', URL)
+    assert response.content == b'catalog list'
+    assert 'If-None-Match' not in etag_server['requests'][-1]
+
+    # not modified: the cached body is reused and refreshed
+    response = qu._request('GET', URL, cache='revalidate')
+    assert etag_server['requests'][-1]['If-None-Match'] == '"v1"'
+    assert response.status_code == 200
+    assert response.content == b'catalog list'
+    assert response.headers['Content-Type'] == 'text/plain'
+    assert response.headers['Date'] == 'Mon, 19 Oct 2020'
+    assert (qu._get_cache_backend().get(
+        qu._last_query.hash()).headers['Date'] == 'Mon, 19 Oct 2020')
+
+    # modified: the new response replaces the cached one
+    etag_server.update(etag='"v2"', content=b'new catalog list')
+    response = qu._request('GET', URL, cache='revalidate')
+    assert response.content == b'new catalog list'
+    assert qu._request('GET', URL).content == b'new catalog list'
+    assert len(etag_server['requests']) == 3
+
+
+def test_revalidate_parsed_results(etag_server, tmpdir):
+    dummy = TableDummyClass()
+    dummy.cache_location = tmpdir.strpath
+    with cache_conf.set_temp('cache_parsed_results', True):
+        dummy.query_object(1)
+        assert dummy.query_object(1, cache='revalidate')['content'][0] == 'catalog list'
+        assert dummy.parsed == 1
+        etag_server.update(etag='"v2"', content=b'new catalog list')
+        table = dummy.query_object(1, cache='revalidate')
+        assert table['content'][0] == 'new catalog list'
+        assert dummy.parsed == 2
+
+
+@pytest.fixture
+def caches(tmpdir):
+    root = tmpdir.strpath
+    now = time.time()
+    for service, key, age in [('A', 'a', 1000), ('B', 'b', 100),
+                              ('B', 'c', 10)]:
+        backend = cache.FileSystemCache(os.path.join(root, service))
+        backend.set(KEYS[key], make_response(b'x' * 1000,
+                                             url=URL + '?' + key))
+        os.utime(backend.meta_path(KEYS[key]), (now - age, now - age))
+    return root
+
+
+def test_list_entries(caches):
+    entries = cache.list_entries(root=caches)
+    assert (sorted((entry.service, entry.url) for entry in entries)
+            == [('A', URL + '?a'), ('B', URL + '?b'), ('B', URL + '?c')])
+    assert all(entry.size > 1000 for entry in entries)
+    assert [entry.url for entry in cache.list_entries(['A'], caches)] == [
+        URL + '?a']
+
+    out = io.StringIO()
+    assert main(['--root', caches, 'list', '--sort', 'age'], out=out) == 0
+    lines = out.getvalue().splitlines()
+    assert lines[0].split()[0] == 'B' and lines[0].endswith(URL + '?c')
+    assert lines[-1].startswith('3 entries')
+
+
+def test_lock_dir(caches, monkeypatch):
+    monkeypatch.setattr(cache, 'get_cache_root', lambda: caches)
+    os.makedirs(cache.get_lock_dir())
+    open(os.path.join(cache.get_lock_dir(), KEYS['a'] + '.lock'), 'w').close()
+    # the locks of the downloads are not the cache of a service
+    assert len(cache.list_entries()) == 3
+    with cache_conf.set_temp('cache_backend', 'sqlite'):
+        assert [service for service, backend
+                in cache._service_backends()] == ['A', 'B']
+    assert os.listdir(cache.get_lock_dir()) == [KEYS['a'] + '.lock']
+
+
+def test_prune(caches):
+    removed = cache.prune(['B'], root=caches, dry_run=True)
+    assert sorted(entry.url for entry in removed) == [URL + '?b', URL + '?c']
+    assert len(cache.list_entries(root=caches)) == 3
+
+    removed = cache.prune(older_than=500, root=caches)
+    assert [entry.url for entry in removed] == [URL + '?a']
+    # the least recently used entries go first
+    size = sum(entry.size for entry in cache.list_entries(root=caches))
+    removed = cache.prune(max_size=size - 1, root=caches)
+    assert [entry.url for entry in removed] == [URL + '?b']
+
+    out = io.StringIO()
+    assert main(['--root', caches, 'prune', '--service', 'B'], out=out) == 0
+    assert out.getvalue().startswith('Removed 1 entries')
+    assert cache.list_entries(root=caches) == []
+
+
+def test_warm(query, tmpdir):
+    root = tmpdir.join('root').strpath
+    specs = [{'service': 'astroquery.tests.test_cache.TableDummyClass',
+              'method': 'query_object', 'kwargs': {'name': i}}
+             for i in range(3)]
+    specs.append({'service': 'nosuchservice.NoSuchService', 'method': 'query'})
+    results = cache.warm(specs, root=root)
+    assert [len(result) for result in results[:3]] == [1, 1, 1]
+    assert isinstance(results[3], ValueError)
+    assert len(query.requests_sent) == 3
+    assert [entry.service for entry in cache.list_entries(root=root)] == [
+        'TableDummy'] * 3
+
+    # from a file of specifications, one per line, answered by the cache
+    spec_file = tmpdir.join('specs.json')
+    spec_file.write('\n'.join(json.dumps(spec) for spec in specs[:3]))
+    out = io.StringIO()
+    assert main(['--root', root, 'warm', spec_file.strpath], out=out) == 0
+    assert out.getvalue() == '3 queries, 0 failed\n'
+    assert len(query.requests_sent) == 3
@@ -0,0 +1,219 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import io
+import json
+import os
+import re
+
+import pytest
+import requests
+import astropy.utils.data
+
+from ..query import BaseQuery
+from ..utils.retry import RetryPolicy
+
+URL = 'http://example.com/data.fits'
+CONTENT = bytes(bytearray(range(256))) * 40
+
+
+class FlakyStream(io.BytesIO):
+    """ A response body breaking after ``fail_after`` bytes """
+
+    def __init__(self, content, fail_after):
+        super(FlakyStream, self).__init__(content)
+        self.fail_after = fail_after
+
+    def read(self, size=-1):
+        if self.tell() >= self.fail_after:
+            raise requests.exceptions.ConnectionError('connection reset')
+        return super(FlakyStream, self).read(size)
+
+
+class RangeServer(object):
+    """
+    Serve ``CONTENT``, honouring range requests unless ``ranges`` is False.
+    """
+
+    def __init__(self, ranges=True):
+        self.ranges = ranges
+        self.requests = []
+        self.fail_after = {}
+        self.fail_full = None
+
+    def __call__(self, session, method, url, headers=None, **kwargs):
+        headers = headers or {}
+        self.requests.append((method, headers.get('Range')))
+        response = requests.Response()
+        response.url = url
+        response.headers['Content-Length'] = str(len(CONTENT))
+        response.headers['Accept-Ranges'] = 'bytes'
+        body = CONTENT
+        match = re.match(r'bytes=(\d+)-(\d+)', headers.get('Range', ''))
+        if match and self.ranges:
+            start, end = int(match.group(1)), int(match.group(2))
+            body = CONTENT[start:end + 1]
+            response.status_code = 206
+        else:
+            start = 0
+            response.status_code = 200
+        if method == 'HEAD':
+            body = b''
+        if match:
+            fail_after = self.fail_after.pop(start, None)
+        elif method == 'GET':
+            fail_after, self.fail_full = self.fail_full, None
+        else:
+            fail_after = None
+        if fail_after is None:
+            response.raw = io.BytesIO(body)
+        else:
+            response.raw = FlakyStream(body, fail_after)
+        return response
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = RangeServer()
+
+    def request(session, method, url, **kwargs):
+        return server(session, method, url, **kwargs)
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    with astropy.utils.data.conf.set_temp('download_block_size', 1000):
+        yield server
+
+
+@pytest.fixture
+def query():
+    qu = BaseQuery()
+    qu.retry_policy = RetryPolicy(backoff_factor=0.01)
+    return qu
+
+
+def ranges(server):
+    return sorted(r for method, r in server.requests[1:])
+
+
+def test_segmented_download(server, query, tmpdir):
+    path = tmpdir.join('data.fits').strpath
+    query._download_file(URL, path, segments=4)
+    with open(path, 'rb') as f:
+        assert f.read() == CONTENT
+    assert ranges(server) == ['bytes=0-2559', 'bytes=2560-5119',
+                              'bytes=5120-7679', 'bytes=7680-10239']
+    assert not os.path.exists(path + '.segments')
+
+    # a complete file is not downloaded again
+    del server.requests[:]
+    query._download_file(URL, path, segments=4)
+    assert len(server.requests) == 1
+
+
+def test_segments_default(server, query, tmpdir):
+    query.download_segments = 2
+    path = tmpdir.join('data.fits').strpath
+    query._download_file(URL, path)
+    assert len(ranges(server)) == 2
+    query._download_file(URL, tmpdir.join('single.fits').strpath, segments=1)
+    assert server.requests[-1] == ('GET', None)
+
+
+def test_ranges_not_supported(server, query, tmpdir):
+    server.ranges = False
+    path = tmpdir.join('data.fits').strpath
+    query._download_file(URL, path, segments=4)
+    with open(path, 'rb') as f:
+        assert f.read() == CONTENT
+    assert not os.path.exists(path + '.segments')
+
+
+def test_resume_segments(server, query, tmpdir):
+    path = tmpdir.join('data.fits').strpath
+    # an interrupted download, with the first segment complete
+    with open(path + '.part', 'wb') as f:
+        f.write(CONTENT[:5120] + b'\0' * (len(CONTENT) - 5120))
+    with open(path + '.segments', 'w') as f:
+        json.dump({'url': URL, 'length': len(CONTENT),
+                   'segments': [[0, 5119, 5120], [5120, 10239, 5120]]}, f)
+    query._download_file(URL, path, segments=2)
+    assert ranges(server) == ['bytes=5120-10239']
+    with open(path, 'rb') as f:
+        assert f.read() == CONTENT
+    assert not os.path.exists(path + '.segments')
+    assert not os.path.exists(path + '.part')
+
+
+def test_interrupted_segment(server, query, tmpdir):
+    server.fail_after[2560] = 1500
+    path = tmpdir.join('data.fits').strpath
+    query._download_file(URL, path, segments=4)
+    with open(path, 'rb') as f:
+        assert f.read() == CONTENT
+    assert ranges(server) == ['bytes=0-2559', 'bytes=2560-5119',
+                              'bytes=4560-5119', 'bytes=5120-7679',
+                              'bytes=7680-10239']
+
+
+def test_failed_segment_saves_progress(server, query, tmpdir):
+    query.retry_policy = RetryPolicy(max_retries=0)
+    server.fail_after[0] = 1000
+    path = tmpdir.join('data.fits').strpath
+    with pytest.raises(requests.exceptions.ConnectionError):
+        query._download_file(URL, path, segments=2)
+    # the incomplete file is not taken for the download
+    assert not os.path.exists(path)
+    assert os.path.getsize(path + '.part') == len(CONTENT)
+    with open(path + '.segments') as f:
+        segments = json.load(f)['segments']
+    assert segments[0] == [0, 5119, 1000]
+
+    del server.requests[:]
+    query._download_file(URL, path, segments=2)
+    assert 'bytes=1000-5119' in ranges(server)
+    with open(path, 'rb') as f:
+        assert f.read() == CONTENT
+
+
+def test_download_lock(server, query, tmpdir, monkeypatch):
+    fetch_file = query._fetch_file
+    listed = []
+
+    def fetch(url, local_filepath, **kwargs):
+        listed.extend(os.listdir(tmpdir.strpath))
+        return fetch_file(url, local_filepath, **kwargs)
+
+    monkeypatch.setattr(query, '_fetch_file', fetch)
+    query._download_file(URL, tmpdir.join('data.fits').strpath)
+    # the lock held during the download is not in the download directory
+    assert listed == []
+    assert os.listdir(tmpdir.strpath) == ['data.fits']
+
+
+def test_continued_download(server, query, tmpdir):
+    path = tmpdir.join('data.fits').strpath
+    with open(path, 'wb') as f:
+        f.write(CONTENT[:3000])
+    query._download_file(URL, path)
+    assert server.requests[-1] == ('GET', 'bytes=3000-10239')
+    with open(path, 'rb') as f:
+        assert f.read() == CONTENT
+    # the range is not left in the session, shared by the threads
+    assert 'Range' not in query._session.headers
+
+
+def test_interrupted_download(server, query, tmpdir):
+    server.fail_full = 1500
+    path = tmpdir.join('data.fits').strpath
+    with pytest.raises(requests.exceptions.ConnectionError):
+        query._download_file(URL, path)
+    # the partial download is not taken for the file...
+    assert not os.path.exists(path)
+    assert os.path.getsize(path + '.part') == 2000
+
+    # ...and is continued
+    del server.requests[:]
+    query._download_file(URL, path)
+    assert server.requests[-1] == ('GET', 'bytes=2000-10239')
+    with open(path, 'rb') as f:
+        assert f.read() == CONTENT
+    assert not os.path.exists(path + '.part')
+    assert not os.path.exists(path + '.lock')
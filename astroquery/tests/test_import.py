@@ -0,0 +1,74 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Guard the import time of the service subpackages: importing them must not
+create sessions or cache directories, nor import the heavy optional
+dependencies only needed when querying.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import astroquery
+
+# Generous budget (seconds) for the import of a single subpackage, to catch
+# large regressions rather than to benchmark
+IMPORT_BUDGET = 5.
+
+# Dependencies imported by the functions using them
+LAZY_MODULES = ('aiohttp', 'keyring')
+
+# MAST shares one session between its API objects, created with the service
+SESSION_EXCEPTIONS = ('mast',)
+
+SCRIPT = """
+import importlib, json, pkgutil, sys, time
+import requests
+from astropy.config import paths
+
+sessions = []
+_init = requests.Session.__init__
+
+def init(self, *args, **kwargs):
+    sessions.append(self)
+    _init(self, *args, **kwargs)
+
+requests.Session.__init__ = init
+
+results = {}
+with paths.set_temp_cache(sys.argv[1]):
+    import astroquery
+    for module in pkgutil.iter_modules(astroquery.__path__):
+        if not module.ispkg or module.name in ('utils', 'tests', 'extern'):
+            continue
+        nsessions = len(sessions)
+        start = time.perf_counter()
+        try:
+            importlib.import_module('astroquery.' + module.name)
+        except ImportError:
+            continue
+        results[module.name] = (time.perf_counter() - start,
+                                len(sessions) - nsessions)
+print(json.dumps({'imports': results, 'modules': sorted(sys.modules)}))
+"""
+
+
+def test_import_services(tmpdir):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(astroquery.__file__))]
+        + [p for p in [env.get('PYTHONPATH')] if p])
+    cache_dir = tmpdir.mkdir('cache').strpath
+    output = subprocess.check_output(
+        [sys.executable, '-c', SCRIPT, cache_dir], env=env)
+    result = json.loads(output.decode().splitlines()[-1])
+
+    assert 'simbad' in result['imports']
+    for name, (duration, nsessions) in result['imports'].items():
+        assert duration < IMPORT_BUDGET, name
+        if name not in SESSION_EXCEPTIONS:
+            assert nsessions == 0, name
+    for name in LAZY_MODULES:
+        assert name not in result['modules']
+    assert not os.path.exists(os.path.join(cache_dir, 'astropy',
+                                           'astroquery'))
@@ -0,0 +1,641 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import asyncio
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from ..exceptions import CircuitOpenError
+from .. import query
+from ..query import AstroQuery, BaseQuery, HAS_AIOHTTP
+from ..utils.class_or_instance import class_or_instance
+from ..utils.process_asyncs import async_to_sync
+from ..utils.retry import RetryPolicy
+from ..utils.testing_tools import DummyClass, make_response
+
+URL = 'http://example.com/query'
+
+
+@pytest.fixture
+def dummy(monkeypatch, tmpdir):
+    lock = threading.Lock()
+    active = {'now': 0, 'max': 0}
+
+    def request(session, method, url, params=None, **kwargs):
+        with lock:
+            active['now'] += 1
+            active['max'] = max(active['max'], active['now'])
+        time.sleep(0.05)
+        with lock:
+            active['now'] -= 1
+        return make_response(params['name'].encode())
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    dummy = DummyClass()
+    dummy.cache_location = tmpdir.strpath
+    dummy.active = active
+    return dummy
+
+
+def test_query_many(dummy):
+    names = ['M{0}'.format(i) for i in range(20)]
+    results = dummy.query_many('query_object',
+                               [{'name': name} for name in names],
+                               max_workers=5)
+    assert results == names
+    assert 1 < dummy.active['max'] <= 5
+
+
+def test_query_many_errors(dummy):
+    results = dummy.query_many('query_object',
+                               [{'name': 'M1'}, {'name': 'error'},
+                                {'name': 'M2'}])
+    assert results[0] == 'M1'
+    assert isinstance(results[1], ValueError)
+    assert results[2] == 'M2'
+
+
+def test_query_many_unordered(dummy):
+    kwargs_list = [{'name': 'M{0}'.format(i)} for i in range(5)]
+    results = list(dummy.query_many('query_object', kwargs_list,
+                                    ordered=False))
+    assert len(results) == 5
+    for kwargs, result in results:
+        assert result == kwargs['name']
+
+
+def test_concurrent_state(dummy):
+    # the state left on the shared instance by a query is per thread
+    def query(name):
+        result = dummy.query_object(name)
+        return (result, dummy.table, dummy._last_query.params['name'])
+
+    names = ['M{0}'.format(i) for i in range(200)]
+    with ThreadPoolExecutor(16) as executor:
+        results = list(executor.map(query, names))
+    assert results == [(name, name, name) for name in names]
+    assert dummy.table is None
+
+
+@pytest.fixture
+def slow(monkeypatch):
+    release = threading.Event()
+    requests_sent = []
+
+    def request(session, method, url, params=None, **kwargs):
+        requests_sent.append(params)
+        release.wait(5)
+        if params['name'] == 'down':
+            raise requests.exceptions.ConnectionError('unreachable')
+        return make_response(params['name'].encode())
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    return release, requests_sent
+
+
+@async_to_sync
+class ClassQuery(BaseQuery):
+
+    @class_or_instance
+    def query_async(self, name):
+        """
+        Returns
+        -------
+        response : `requests.Response`
+        """
+        return make_response(name.encode())
+
+    @class_or_instance
+    def _parse_result(self, response, verbose=False):
+        return response.text
+
+
+def test_class_query_state():
+    # queries on the class do not shadow the state of the instances
+    assert ClassQuery.query('M1') == 'M1'
+    assert 'table' not in ClassQuery.__dict__
+    instance = ClassQuery()
+    assert instance.query('M2') == 'M2'
+    assert instance.table == 'M2'
+
+
+def test_coalesce_requests(slow):
+    release, requests_sent = slow
+    dummy = DummyClass()
+    dummy.retry_policy = RetryPolicy(max_retries=0)
+    dummy.coalesce_uncached_requests = True
+
+    def query_object(name):
+        try:
+            return dummy.query_object(name, cache=False)
+        except requests.exceptions.ConnectionError as ex:
+            return ex
+
+    with ThreadPoolExecutor(12) as executor:
+        futures = [executor.submit(query_object, name)
+                   for name in ['M1'] * 6 + ['down'] * 6]
+        time.sleep(0.2)
+        release.set()
+        results = [future.result() for future in futures]
+    # identical requests in flight share one round trip, and its outcome
+    assert results[:6] == ['M1'] * 6
+    assert all(isinstance(result, requests.exceptions.ConnectionError)
+               for result in results[6:])
+    assert sorted(params['name'] for params in requests_sent) == [
+        'M1', 'down']
+    assert len(query._in_flight) == 0
+
+    # once done, the requests are sent again
+    assert dummy.query_object('M1', cache=False) == 'M1'
+    assert len(requests_sent) == 3
+
+
+def test_coalesce_requests_disabled(slow):
+    release, requests_sent = slow
+    dummy = DummyClass()
+    dummy.coalesce_uncached_requests = True
+    dummy.coalesce_requests = False
+    with ThreadPoolExecutor(4) as executor:
+        futures = [executor.submit(dummy.query_object, 'M1', cache=False)
+                   for i in range(4)]
+        time.sleep(0.2)
+        release.set()
+        assert [future.result() for future in futures] == ['M1'] * 4
+    assert len(requests_sent) == 4
+
+
+@pytest.mark.parametrize(('method', 'uncached', 'idempotent_post', 'sent'),
+                         [('GET', False, False, 4), ('GET', True, False, 1),
+                          ('POST', True, False, 4), ('POST', True, True, 1)])
+def test_coalesce_requests_opt_in(slow, method, uncached, idempotent_post,
+                                  sent):
+    release, requests_sent = slow
+    dummy = DummyClass()
+    dummy.coalesce_uncached_requests = uncached
+    dummy.idempotent_post = idempotent_post
+    with ThreadPoolExecutor(4) as executor:
+        futures = [executor.submit(dummy._request, method, URL,
+                                   params={'name': 'M1'}, cache=False)
+                   for i in range(4)]
+        time.sleep(0.2)
+        release.set()
+        assert [future.result().text for future in futures] == ['M1'] * 4
+    assert len(requests_sent) == sent
+
+
+def run_aio(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+def test_query_aio(dummy):
+    async def gather():
+        return await asyncio.gather(*[dummy.query_object_aio('M{0}'.format(i))
+                                      for i in range(5)])
+
+    assert run_aio(gather()) == ['M{0}'.format(i) for i in range(5)]
+    assert 'coroutine' in DummyClass.query_object_aio.__doc__
+
+
+@async_to_sync
+class AioDummyClass(DummyClass):
+    """
+    A dummy service opting in to the aiohttp transport, querying ``url``.
+    """
+
+    aio_transport = True
+
+    def __init__(self, url):
+        super(AioDummyClass, self).__init__()
+        self.url = url
+
+    def query_object_async(self, name, cache=True):
+        """
+        Query the dummy service.
+        """
+        return self._request('GET', self.url, params={'name': name},
+                             cache=cache)
+
+    def query_objects_async(self, names):
+        """
+        Query the dummy service for each of ``names`` in turn.
+        """
+        return [self._request('GET', self.url, params={'name': name})
+                for name in names]
+
+    def query_stream_async(self, name):
+        """
+        Query the dummy service, streaming the response.
+        """
+        return self._request('GET', self.url, params={'name': name},
+                             stream=True)
+
+    def _parse_result(self, response, verbose=False):
+        self.parsed += 1
+        if isinstance(response, list):
+            return [item.text for item in response]
+        return response.text
+
+
+@pytest.fixture
+def aio_server():
+    """
+    Run an aiohttp server answering ``/query?name=<name>`` with ``<name>``,
+    after 0.1 s, in a loop of its own thread, and yield its URL and the
+    requests it received.
+    """
+    from aiohttp import web
+
+    requests_received = []
+
+    async def handler(request):
+        requests_received.append(request)
+        await asyncio.sleep(0.1)
+        if request.headers.get('If-None-Match') == '"v1"':
+            return web.Response(status=304, headers={'ETag': '"v1"'})
+        return web.Response(text=request.query['name'],
+                            content_type='text/plain',
+                            headers={'ETag': '"v1"'})
+
+    loop = asyncio.new_event_loop()
+    app = web.Application()
+    app.router.add_get('/query', handler)
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    yield 'http://127.0.0.1:{0}/query'.format(port), requests_received
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.run_until_complete(runner.cleanup())
+    loop.close()
+
+
+@pytest.mark.skipif('not HAS_AIOHTTP')
+def test_query_aio_transport(aio_server, tmpdir, monkeypatch):
+    url, requests_received = aio_server
+    dummy = AioDummyClass(url)
+    dummy.cache_location = tmpdir.strpath
+
+    def run_in_executor(*args):
+        raise AssertionError('the query should run in the loop')
+
+    async def gather():
+        monkeypatch.setattr(asyncio.get_event_loop(), 'run_in_executor',
+                            run_in_executor)
+        return await asyncio.gather(*[dummy.query_object_aio('M{0}'.format(i))
+                                      for i in range(100)])
+
+    start = time.perf_counter()
+    assert run_aio(gather()) == ['M{0}'.format(i) for i in range(100)]
+    # the requests were sent concurrently
+    assert time.perf_counter() - start < 5
+    assert len(requests_received) == 100
+    assert requests_received[0].headers['User-Agent'].startswith(
+        'astroquery/')
+    assert dummy._aio_capture is None
+    # the synchronous queries use the responses cached by the coroutines,
+    # under the same keys
+    monkeypatch.setattr(requests.Session, 'request', None)
+    assert dummy.query_object('M1') == 'M1'
+    assert dummy.query_objects(['M1', 'M2']) == ['M1', 'M2']
+
+
+@pytest.mark.skipif('not HAS_AIOHTTP')
+def test_query_aio_transport_requests(aio_server, tmpdir):
+    url, requests_received = aio_server
+    dummy = AioDummyClass(url)
+    dummy.cache_location = tmpdir.strpath
+    # the query runs until each of its requests is answered in turn
+    assert run_aio(dummy.query_objects_aio(['M1', 'M2', 'M1'])) == [
+        'M1', 'M2', 'M1']
+    assert [request.query['name'] for request in requests_received] == [
+        'M1', 'M2']
+    # and is parsed once
+    assert dummy.parsed == 1
+
+
+@pytest.mark.skipif('not HAS_AIOHTTP')
+def test_query_aio_transport_fallback(aio_server, monkeypatch):
+    url, requests_received = aio_server
+    dummy = AioDummyClass(url)
+    threads = []
+
+    def request(session, method, url, params=None, **kwargs):
+        threads.append(threading.current_thread())
+        return make_response(params['name'].encode())
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    # streamed requests are sent by _request, in a thread
+    assert run_aio(dummy.query_stream_aio('M1')) == 'M1'
+    assert threads and threads[0] is not threading.current_thread()
+    assert not requests_received
+
+
+@pytest.mark.skipif('not HAS_AIOHTTP')
+def test_request_aio(aio_server, tmpdir):
+    url, requests_received = aio_server
+
+    async def run():
+        responses = []
+        for cache in (True, True, 'revalidate'):
+            responses.append(await dummy._request_aio(
+                'GET', url, params={'name': 'M1', 'radius': None},
+                cache=cache))
+        return responses
+
+    dummy = DummyClass()
+    dummy.cache_location = tmpdir.strpath
+    response1, response2, response3 = run_aio(run())
+    assert response1.text == response2.text == response3.text == 'M1'
+    assert response1.headers['Content-Type'].startswith('text/plain')
+    assert response1._cache_key == AstroQuery(
+        'GET', url, params={'name': 'M1', 'radius': None}).hash()
+    # the second response comes from the cache
+    assert len(requests_received) == 2
+    assert 'radius' not in requests_received[0].query
+    # the third one is revalidated
+    assert requests_received[1].headers['If-None-Match'] == '"v1"'
+    assert response3.status_code == 200
+
+
+@pytest.mark.skipif('not HAS_AIOHTTP')
+def test_coalesce_requests_aio(aio_server):
+    url, requests_received = aio_server
+
+    async def run():
+        return await asyncio.gather(*[
+            dummy._request_aio('GET', url, params={'name': name},
+                               cache=False)
+            for name in ['M1', 'M1', 'M1', 'M2']])
+
+    dummy = DummyClass()
+    dummy.coalesce_uncached_requests = True
+    responses = run_aio(run())
+    assert [response.text for response in responses] == ['M1'] * 3 + ['M2']
+    assert len(requests_received) == 2
+    assert len(query._in_flight) == 0
+
+
+def test_rate_limit(monkeypatch, tmpdir):
+    from ..simbad import SimbadClass, conf
+
+    def request(session, method, url, **kwargs):
+        return make_response(b'')
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    simbad = SimbadClass()
+    simbad.cache_location = tmpdir.strpath
+    assert simbad._service_conf() is conf
+    with conf.set_temp('rate_limit', 20):
+        start = time.monotonic()
+        for i in range(5):
+            simbad._request('GET', 'http://rate.limit.test/', params={'i': i},
+                            cache=False)
+        assert time.monotonic() - start >= 4 / 20. - 0.01
+    assert DummyClass._service_conf() is None
+
+
+def test_service_settings():
+    from .. import connection_conf
+    from ..simbad import SimbadClass
+
+    assert DummyClass._service_setting('rate_limit') == 0
+    assert SimbadClass._service_setting('rate_limit') == 5
+    with connection_conf.set_temp('rate_limit', 2):
+        # the configuration of the service takes precedence
+        assert DummyClass._service_setting('rate_limit') == 2
+        assert SimbadClass._service_setting('rate_limit') == 5
+    with connection_conf.set_temp('service_settings', [
+            'Dummy.rate_limit = 20', 'Simbad.rate_limit = 1',
+            'Simbad.rate_burst = 4']):
+        assert DummyClass._service_setting('rate_limit') == 20.
+        assert SimbadClass._service_setting('rate_limit') == 1.
+        assert SimbadClass._service_setting('rate_burst') == 4
+
+
+def test_rate_limit_settings(monkeypatch, tmpdir):
+    from .. import connection_conf
+
+    def request(session, method, url, **kwargs):
+        return make_response(b'')
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    dummy = DummyClass()
+    dummy.cache_location = tmpdir.strpath
+    with connection_conf.set_temp('service_settings',
+                                  ['Dummy.rate_limit = 20']):
+        start = time.monotonic()
+        for i in range(5):
+            dummy._request('GET', 'http://rate.settings.test/',
+                           params={'i': i}, cache=False)
+        assert time.monotonic() - start >= 4 / 20. - 0.01
+
+
+@pytest.fixture
+def flaky(monkeypatch, tmpdir):
+    responses = []
+    requests_sent = []
+
+    def request(session, method, url, **kwargs):
+        requests_sent.append(url)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    dummy = DummyClass()
+    dummy.cache_location = tmpdir.strpath
+    dummy.retry_policy = RetryPolicy(max_retries=2, backoff_factor=0.01,
+                                     failure_threshold=4, reset_timeout=60)
+    dummy.responses = responses
+    dummy.requests_sent = requests_sent
+    return dummy
+
+
+def test_retry(flaky):
+    url = 'http://retry.test/'
+    flaky.responses.extend([requests.exceptions.ConnectionError(),
+                            make_response(status_code=503),
+                            make_response(b'ok')])
+    response = flaky._request('GET', url, cache=False)
+    assert response.content == b'ok'
+    assert len(flaky.requests_sent) == 3
+
+    # out of retries
+    flaky.responses.extend([make_response(status_code=503)] * 3)
+    response = flaky._request('GET', url, cache=False)
+    assert response.status_code == 503
+    assert len(flaky.requests_sent) == 6
+
+    # not retried
+    flaky.responses.append(make_response(status_code=404))
+    response = flaky._request('GET', url, cache=False)
+    assert response.status_code == 404
+    assert len(flaky.requests_sent) == 7
+
+    # the server may have run the request
+    flaky.responses.append(requests.exceptions.ReadTimeout())
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        flaky._request('GET', url, cache=False)
+    assert len(flaky.requests_sent) == 8
+
+
+def test_retry_methods(flaky):
+    url = 'http://retry.test/'
+    flaky.responses.append(make_response(status_code=503))
+    response = flaky._request('POST', url, data={'a': 1}, cache=False)
+    assert response.status_code == 503
+    assert len(flaky.requests_sent) == 1
+
+    flaky.idempotent_post = True
+    flaky.responses.extend([make_response(status_code=503),
+                            make_response(b'ok')])
+    response = flaky._request('POST', url, data={'a': 1}, cache=False)
+    assert response.content == b'ok'
+    assert len(flaky.requests_sent) == 3
+
+
+class _Stream(io.RawIOBase):
+    def __init__(self, content):
+        self.content = io.BytesIO(content)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self.content.readinto(buffer)
+
+
+def test_retry_uploads(flaky, monkeypatch):
+    uploaded = []
+
+    def request(session, method, url, **kwargs):
+        uploaded.append(kwargs['files']['cat'][1].read())
+        return flaky.responses.pop(0)
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    flaky.idempotent_post = True
+    upload = io.BytesIO(b'header\n1,2\n')
+    upload.read(7)
+    flaky.responses.extend([make_response(status_code=503),
+                            make_response(b'ok')])
+    response = flaky._request('POST', 'http://retry.test/',
+                              files={'cat': ('cat.csv', upload)}, cache=False)
+    assert response.content == b'ok'
+    # sent again from the same position
+    assert uploaded == [b'1,2\n', b'1,2\n']
+
+    # not retried if the upload cannot be rewound
+    flaky.responses.extend([make_response(status_code=503),
+                            make_response(b'ok')])
+    response = flaky._request('POST', 'http://retry.test/',
+                              files={'cat': ('cat.csv', _Stream(b'1,2\n'))},
+                              cache=False)
+    assert response.status_code == 503
+    assert uploaded[2:] == [b'1,2\n']
+
+
+def test_retry_conf(monkeypatch, tmpdir):
+    from ..simbad import SimbadClass, conf
+    requests_sent = []
+
+    def request(session, method, url, **kwargs):
+        requests_sent.append(url)
+        return make_response(status_code=503)
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    simbad = SimbadClass()
+    simbad.cache_location = tmpdir.strpath
+    with conf.set_temp('max_retries', 1), \
+            conf.set_temp('backoff_factor', 0.01):
+        with pytest.raises(requests.exceptions.HTTPError):
+            simbad._request('GET', 'http://retry.conf.test/', cache=False)
+    assert len(requests_sent) == 2
+
+
+def test_retry_settings(flaky):
+    from .. import connection_conf
+    url = 'http://retry.test/'
+    flaky.responses.extend([make_response(status_code=503)] * 3)
+    with connection_conf.set_temp('service_settings',
+                                  ['Dummy.max_retries = 0']):
+        assert flaky._request('GET', url, cache=False).status_code == 503
+    assert len(flaky.requests_sent) == 1
+    with connection_conf.set_temp('max_retries', 1):
+        assert flaky._request('GET', url, cache=False).status_code == 503
+    assert len(flaky.requests_sent) == 3
+
+
+def test_circuit_breaker(flaky):
+    url = 'http://circuit.test/'
+    flaky.responses.extend([requests.exceptions.ConnectionError()] * 4)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        flaky._request('GET', url, cache=False)
+    with pytest.raises(CircuitOpenError):
+        flaky._request('GET', url, cache=False)
+    assert len(flaky.requests_sent) == 4
+    # other hosts are unaffected
+    flaky.responses.append(make_response(b'ok'))
+    assert flaky._request('GET', URL, cache=False).content == b'ok'
+
+
+def test_hash_uploads(monkeypatch):
+    monkeypatch.setattr(query, '_HASH_CHUNK_SIZE', 10)
+
+    def key(**kwargs):
+        return AstroQuery('POST', URL, **kwargs).hash()
+
+    upload = io.BytesIO(b'header\n' + b'1,2\n' * 100)
+    upload.read(7)
+    # file objects are hashed from their position, to which they are rewound
+    assert (key(files={'cat': ('cat.csv', upload)})
+            == key(files={'cat': ('cat.csv', b'1,2\n' * 100)}))
+    assert upload.tell() == 7
+    assert (key(files={'cat': ('cat.csv', upload)})
+            != key(files={'cat': ('cat.csv', b'1,2\n' * 99)}))
+    assert key(data=io.StringIO('x' * 100)) == key(data='x' * 100)
+    # small payloads are keyed as they are
+    assert key(data={'a': 'b'}) != key(data={'a': 'c'})
+
+
+def test_unhashable_uploads(monkeypatch, tmpdir):
+    def request(session, method, url, files=None, **kwargs):
+        return make_response(b'echo:' + files['cat'][1].read())
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    dummy = DummyClass()
+    dummy.cache_location = tmpdir.strpath
+    assert not AstroQuery('POST', URL, files={
+        'cat': ('cat.csv', _Stream(b'1,2'))}).hashable()
+    # uploads which cannot be hashed skip the cache
+    for content in (b'upload-A', b'upload-C'):
+        response = dummy._request('POST', URL, files={
+            'cat': ('cat.csv', _Stream(content))})
+        assert response.content == b'echo:' + content
+    assert tmpdir.listdir() == []
+
+
+def test_content_digest():
+    def key(data, files, content_digest):
+        return AstroQuery('POST', URL, data=data, files=files,
+                          content_digest=content_digest).hash()
+
+    assert (key({'a': 1}, {'cat': io.BytesIO(b'abc')}, 'md5:1234')
+            == key({'a': 1}, {'cat': io.BytesIO(b'def')}, 'md5:1234'))
+    assert (key({'a': 1}, {'cat': io.BytesIO(b'abc')}, 'md5:1234')
+            != key({'a': 1}, {'cat': io.BytesIO(b'abc')}, 'md5:5678'))
+    # form fields are still part of the key
+    assert (key({'a': 1}, {'cat': io.BytesIO(b'abc')}, 'md5:1234')
+            != key({'a': 2}, {'cat': io.BytesIO(b'abc')}, 'md5:1234'))
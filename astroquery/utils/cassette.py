@@ -0,0 +1,283 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Record and replay the HTTP traffic of the query classes.
+
+Within a `Cassette` used in ``'record'`` mode, the requests sent by the query
+classes (through ``BaseQuery._request``, ``_download_file`` and the like) and
+their responses are saved to a zip archive.  The same archive used in
+``'replay'`` mode answers the requests without any network access, with
+the recorded responses, optionally delayed and throttled to reproduce the
+latency and bandwidth of a given network::
+
+    >>> from astroquery.query import suspend_cache
+    >>> from astroquery.simbad import Simbad
+    >>> from astroquery.utils.cassette import Cassette
+    >>> with suspend_cache(Simbad), Cassette('simbad.zip', mode='record'):
+    ...     result = Simbad.query_object('M1')
+    >>> with suspend_cache(Simbad), Cassette('simbad.zip', mode='replay',
+    ...                                      latency=0.2, bandwidth=1e6):
+    ...     result = Simbad.query_object('M1')
+
+The cassette replaces the connection pools of the whole process while it is
+used, so that it sees the requests of all the query classes and threads.
+Responses found in the cache of a service are not requested at all, hence
+not recorded: suspend the cache when recording traffic to benchmark.
+"""
+import hashlib
+import io
+import json
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from . import sessions
+from ..exceptions import CassetteError
+
+__all__ = ['Cassette']
+__doctest_skip__ = ['*']
+
+# Headers describing the encoded body sent by the server, while the body
+# recorded is decoded
+_ENCODING_HEADERS = ('content-encoding', 'content-length',
+                     'transfer-encoding')
+
+_BOUNDARY_PATTERN = re.compile(r'boundary=("?)([^";]+)\1')
+
+# Size (bytes) above which the bodies being recorded are spooled to disk
+_SPOOL_SIZE = 2 ** 20
+
+
+def _request_key(request):
+    """ Identify ``request`` (a `requests.PreparedRequest`) in the cassette """
+    body = request.body
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if body is None or isinstance(body, bytes):
+        boundary = _BOUNDARY_PATTERN.search(
+            request.headers.get('Content-Type', ''))
+        if body and boundary is not None:
+            # multipart boundaries are drawn at random for each request
+            body = body.replace(boundary.group(2).encode('ascii'),
+                                b'boundary')
+        digest = hashlib.sha224(body or b'').hexdigest()
+    else:
+        # streamed upload, which cannot be read without consuming it
+        digest = None
+    return '{0} {1} {2}'.format(request.method, request.url, digest)
+
+
+class _TeeStream(object):
+    """
+    The ``raw`` body of a response being recorded, whose decoded content is
+    spooled as the caller reads it and passed to ``save`` once read in full
+    """
+
+    def __init__(self, raw, save):
+        self._raw = raw
+        self._save = save
+        self._spool = tempfile.SpooledTemporaryFile(_SPOOL_SIZE)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def read(self, amt=None, decode_content=None, **kwargs):
+        if decode_content is False:
+            # not the recorded body (e.g. drained after a redirection)
+            return self._raw.read(amt, decode_content=False, **kwargs)
+        block = self._raw.read(amt, decode_content=True, **kwargs)
+        if self._spool is not None:
+            self._spool.write(block)
+            if not block or amt is None:
+                self._finish()
+        return block
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        block = self.read(amt)
+        while block:
+            yield block
+            block = self.read(amt)
+
+    def close(self):
+        if self._spool is not None:
+            # the rest of the body, left unread, is recorded as well
+            for block in self.stream():
+                pass
+        self._raw.close()
+
+    def _finish(self):
+        spool, self._spool = self._spool, None
+        spool.seek(0)
+        with spool:
+            self._save(self, spool)
+
+
+class _ThrottledStream(io.BytesIO):
+    """ A response body read at ``bandwidth`` bytes per second at most """
+
+    def __init__(self, content, bandwidth=None):
+        super(_ThrottledStream, self).__init__(content)
+        self.bandwidth = bandwidth
+
+    def read(self, size=-1):
+        block = super(_ThrottledStream, self).read(size)
+        if self.bandwidth:
+            time.sleep(len(block) / self.bandwidth)
+        return block
+
+
+class Cassette(BaseAdapter):
+    """
+    Record the requests and responses of the query classes to, or replay
+    them from, the zip archive ``path``.
+
+    Use it as a context manager, or call `start` and `stop`.  One cassette
+    is used at a time.
+
+    Parameters
+    ----------
+    path : str
+        The archive.
+    mode : ``'record'`` or ``'replay'``
+        In ``'record'`` mode, requests are sent as usual and the archive is
+        (over)written with them when the cassette is stopped.  In
+        ``'replay'`` mode, requests are answered from the archive, and
+        `~astroquery.exceptions.CassetteError` is raised for requests which
+        were not recorded.
+    latency : float
+        Time (seconds) to wait before replaying a response.
+    bandwidth : float or None
+        Rate (bytes per second) at which replayed bodies are read.  `None`
+        for no limit.
+
+    Notes
+    -----
+    Requests are matched on their method, URL and body, the random
+    boundaries of multipart uploads aside.  Identical requests recorded
+    several times are replayed in the order they were recorded, the last
+    one being repeated.  Response bodies are recorded as they are read, and
+    the bodies left unread when the response is closed or the cassette
+    stopped are read to the end.
+    """
+
+    def __init__(self, path, mode='replay', latency=0., bandwidth=None):
+        super(Cassette, self).__init__()
+        if mode not in ('record', 'replay'):
+            raise ValueError("mode must be 'record' or 'replay'")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._lock = threading.Lock()
+        self._archive = None
+        self._interactions = {}
+        self._played = {}
+        self._pending = set()
+        self._count = 0
+
+    def start(self):
+        """ Route the requests of all the query classes through the cassette """
+        if sessions._cassette is not None:
+            raise CassetteError("A cassette is already in use")
+        if self.mode == 'record':
+            self._archive = zipfile.ZipFile(self.path, 'w',
+                                            zipfile.ZIP_DEFLATED)
+            self._interactions = {}
+        else:
+            self._archive = zipfile.ZipFile(self.path, 'r')
+            self._interactions = json.loads(
+                self._archive.read('index.json').decode('utf-8'))
+        self._played = {}
+        self._count = 0
+        sessions._cassette = self
+
+    def stop(self):
+        """ Stop using the cassette, and write the archive if recording """
+        sessions._cassette = None
+        for body in list(self._pending):
+            body.close()
+        if self.mode == 'record':
+            self._archive.writestr('index.json',
+                                   json.dumps(self._interactions, indent=1))
+        self._archive.close()
+        self._archive = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def __len__(self):
+        return sum(len(records) for records in self._interactions.values())
+
+    def send(self, request, stream=False, timeout=None, verify=True,
+             cert=None, proxies=None):
+        if self.mode == 'record':
+            return self._record(request, stream=stream, timeout=timeout,
+                                verify=verify, cert=cert, proxies=proxies)
+        return self._replay(request)
+
+    def close(self):
+        pass
+
+    def _record(self, request, **kwargs):
+        adapter = sessions.get_adapter(request.url)
+        response = adapter.send(request, **kwargs)
+        key = _request_key(request)
+        record = {'status_code': response.status_code,
+                  'reason': response.reason,
+                  'headers': {name: value
+                              for name, value in response.headers.items()
+                              if name.lower() not in _ENCODING_HEADERS}}
+
+        def save(body, content):
+            with self._lock:
+                self._pending.discard(body)
+                record['body'] = 'bodies/{0}'.format(self._count)
+                self._count += 1
+                with self._archive.open(record['body'], 'w') as f:
+                    shutil.copyfileobj(content, f)
+                self._interactions.setdefault(key, []).append(record)
+
+        # the body is recorded while the caller reads it, so that streamed
+        # downloads are not held in memory
+        response.raw = _TeeStream(response.raw, save)
+        with self._lock:
+            self._pending.add(response.raw)
+        return response
+
+    def _replay(self, request):
+        key = _request_key(request)
+        with self._lock:
+            records = self._interactions.get(key)
+            if not records:
+                raise CassetteError("{0} {1} is not recorded in {2}"
+                                    .format(request.method, request.url,
+                                            self.path))
+            index = self._played.get(key, 0)
+            self._played[key] = index + 1
+            record = records[min(index, len(records) - 1)]
+            content = self._archive.read(record['body'])
+        if self.latency:
+            time.sleep(self.latency)
+
+        response = requests.Response()
+        response.status_code = record['status_code']
+        response.reason = record['reason']
+        response.headers = CaseInsensitiveDict(record['headers'])
+        response.headers['Content-Length'] = str(len(content))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = _ThrottledStream(content, self.bandwidth)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
@@ -0,0 +1,141 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Inter-process file locks and atomic file writes, so that several processes
+can share the astroquery cache and download directories.
+"""
+import contextlib
+import os
+import tempfile
+import time
+
+from ..exceptions import TimeoutError
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+__all__ = ['FileLock', 'atomic_write']
+
+# Files created by atomic_write get the permissions open() would give them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _try_lock(fd):
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class FileLock(object):
+    """
+    An advisory lock, held by a single process and thread at a time, backed
+    by the file ``path``.
+
+    The lock file is created when the lock is acquired and removed when it
+    is released.  The operating system releases the locks of processes that
+    die, so that an interrupted process never blocks the others.
+
+    Parameters
+    ----------
+    path : str
+        The lock file.
+    timeout : float or None
+        Maximum time (seconds) to wait for the lock, after which
+        `~astroquery.exceptions.TimeoutError` is raised.  `None` to wait as
+        long as needed.
+    """
+
+    def __init__(self, path, timeout=None):
+        self.path = path
+        self.timeout = timeout
+        self._fd = None
+
+    @property
+    def locked(self):
+        """ Whether the lock is held by this object """
+        return self._fd is not None
+
+    def acquire(self):
+        start = time.monotonic()
+        delay = 0.01
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+            if _try_lock(fd):
+                # The previous holder may have removed the file while it was
+                # being opened: the lock only counts on the current file.
+                try:
+                    current = os.path.samestat(os.fstat(fd),
+                                               os.stat(self.path))
+                except OSError:
+                    current = False
+                if current:
+                    self._fd = fd
+                    return
+                _unlock(fd)
+                os.close(fd)
+                continue
+            os.close(fd)
+            if ((self.timeout is not None
+                 and time.monotonic() - start >= self.timeout)):
+                raise TimeoutError("Timed out waiting for the lock {0}"
+                                   .format(self.path))
+            time.sleep(delay)
+            delay = min(2 * delay, 0.5)
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        if fd is None:
+            return
+        try:
+            os.remove(self.path)
+        except OSError:
+            # Windows does not remove open files; the file is reused
+            pass
+        _unlock(fd)
+        os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='wb'):
+    """
+    Open a temporary file next to ``path`` for writing, and rename it to
+    ``path`` once it is closed without error.  Readers of ``path`` then see
+    either its previous or its new content, never a partially written file.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + name + '.',
+                                    suffix='.tmp')
+    try:
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
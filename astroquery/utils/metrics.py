@@ -0,0 +1,265 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Instrumentation of the requests, downloads and parsing done by the query
+classes.
+
+Every request sent by ``BaseQuery._request`` (or ``_request_aio``), every
+file fetched by ``BaseQuery._download_file`` and every response parsed by a
+synchronous ``query_*`` method is described by an `Event`, which is handed
+to the callbacks of the `registry` and aggregated per service, endpoint and
+kind of operation::
+
+    >>> from astroquery.simbad import Simbad
+    >>> from astroquery.utils import metrics
+    >>> metrics.registry.add_callback(print)
+    >>> result = Simbad.query_object('M1')
+    <Event request Simbad http://simbad.u-strasbg.fr/simbad/sim-script ...>
+    <Event parse Simbad http://simbad.u-strasbg.fr/simbad/sim-script ...>
+    >>> metrics.registry.summary()
+    <Table length=2>
+    ...
+"""
+import contextlib
+import functools
+import threading
+import time
+
+try:
+    import contextvars
+except ImportError:  # Python 3.6
+    contextvars = None
+
+from astropy.logger import log
+from six.moves.urllib_parse import urlparse
+
+__all__ = ['Event', 'MetricsRegistry', 'registry', 'measure', 'current',
+           'propagate']
+__doctest_skip__ = ['*']
+
+
+class Event(object):
+    """
+    A request, download or parsing operation.
+
+    Attributes
+    ----------
+    kind : str
+        ``'request'``, ``'download'`` or ``'parse'``.
+    service : str
+        Name of the query class, e.g. ``'Simbad'``.
+    method : str or None
+        The HTTP method.
+    url : str or None
+        The URL requested, or whose response is parsed.
+    duration : float
+        Total time (seconds) of the operation.
+    wait : float or None
+        Time (seconds) between sending the request and receiving the
+        response headers (connection, server processing and latency).  The
+        rest of ``duration`` is spent transferring and handling the body.
+    nbytes : int or None
+        Size of the body received.
+    status : int or None
+        The HTTP status of the (last) response.
+    cache : str or None
+        ``'hit'``, ``'miss'`` or ``'revalidated'`` when the cache was used.
+    retries : int
+        Number of requests retried according to the retry policy.
+    error : Exception or None
+        The exception raised by the operation, if any.
+    """
+
+    __slots__ = ('kind', 'service', 'method', 'url', 'duration', 'wait',
+                 'nbytes', 'status', 'cache', 'retries', 'error')
+
+    def __init__(self, kind, service, method=None, url=None):
+        self.kind = kind
+        self.service = service
+        self.method = method
+        self.url = url
+        self.duration = 0.
+        self.wait = None
+        self.nbytes = None
+        self.status = None
+        self.cache = None
+        self.retries = 0
+        self.error = None
+
+    @property
+    def endpoint(self):
+        """ The URL without its query string """
+        if not isinstance(self.url, str):
+            return None
+        url = urlparse(self.url)
+        return '{0}://{1}{2}'.format(url.scheme, url.netloc, url.path)
+
+    def __repr__(self):
+        return ('<Event {0} {1} {2} status={3} cache={4} duration={5:.3f}s '
+                'bytes={6} retries={7}>'
+                .format(self.kind, self.service, self.endpoint, self.status,
+                        self.cache, self.duration, self.nbytes, self.retries))
+
+
+class _Stats(object):
+
+    __slots__ = ('count', 'errors', 'hits', 'misses', 'retries', 'duration',
+                 'max_duration', 'wait', 'nbytes')
+
+    def __init__(self):
+        self.count = self.errors = self.hits = self.misses = 0
+        self.retries = self.nbytes = 0
+        self.duration = self.max_duration = self.wait = 0.
+
+    def add(self, event):
+        self.count += 1
+        self.errors += event.error is not None
+        self.hits += event.cache in ('hit', 'revalidated')
+        self.misses += event.cache == 'miss'
+        self.retries += event.retries
+        self.duration += event.duration
+        self.max_duration = max(self.max_duration, event.duration)
+        self.wait += event.wait or 0.
+        self.nbytes += event.nbytes or 0
+
+
+class MetricsRegistry(object):
+    """
+    Collect the `Event` of the operations of the query classes.
+
+    Events are passed to the callbacks registered with `add_callback`, e.g.
+    to export them to a monitoring system, and aggregated per service,
+    endpoint and kind, see `summary`.
+    """
+
+    def __init__(self):
+        self._callbacks = []
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def add_callback(self, callback):
+        """ Call ``callback(event)`` for every `Event` recorded """
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        self._callbacks.remove(callback)
+
+    def record(self, event):
+        """ Aggregate ``event`` and pass it to the callbacks """
+        key = (event.service, event.endpoint, event.kind)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _Stats()
+            stats.add(event)
+        for callback in list(self._callbacks):
+            try:
+                callback(event)
+            except Exception as ex:
+                log.warning("Metrics callback {0!r} failed: {1!r}"
+                            .format(callback, ex))
+
+    def reset(self):
+        """ Forget the aggregated statistics """
+        with self._lock:
+            self._stats.clear()
+
+    def summary(self):
+        """
+        Return the aggregated statistics as a `~astropy.table.Table` with
+        one row per service, endpoint and kind of operation.  Times are in
+        seconds, sizes in bytes.
+        """
+        from astropy.table import Table
+        names = ('service', 'endpoint', 'kind', 'count', 'errors',
+                 'cache_hits', 'cache_misses', 'retries', 'total_time',
+                 'mean_time', 'max_time', 'wait_time', 'bytes')
+        with self._lock:
+            rows = [(service, endpoint or '', kind, stats.count,
+                     stats.errors, stats.hits, stats.misses, stats.retries,
+                     stats.duration, stats.duration / stats.count,
+                     stats.max_duration, stats.wait, stats.nbytes)
+                    for (service, endpoint, kind), stats
+                    in sorted(self._stats.items(),
+                              key=lambda item: tuple(map(str, item[0])))]
+        if not rows:
+            return Table(names=names,
+                         dtype=['U1'] * 3 + [int] * 5 + [float] * 4 + [int])
+        return Table(rows=rows, names=names)
+
+
+#: The registry of all the events of the process
+registry = MetricsRegistry()
+
+class _ThreadLocalVar(threading.local):
+    """
+    The subset of `contextvars.ContextVar` used here, holding a value per
+    thread, for Python 3.6
+    """
+
+    def __init__(self, name, default=None):
+        self.name = name
+        self.value = default
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        token, self.value = self.value, value
+        return token
+
+    def reset(self, token):
+        self.value = token
+
+
+if contextvars is not None:
+    _current = contextvars.ContextVar('astroquery_metrics_event',
+                                      default=None)
+else:
+    _current = _ThreadLocalVar('astroquery_metrics_event')
+
+
+def current():
+    """
+    Return the `Event` being measured in the current thread or `asyncio`
+    task, or `None`.  The code doing the operation fills it in.
+    """
+    return _current.get()
+
+
+def propagate(function):
+    """
+    Return ``function`` wrapped so that the `current` event of the caller
+    is current while it runs, e.g. in the worker threads of an operation.
+    """
+    if contextvars is not None:
+        return functools.partial(contextvars.copy_context().run, function)
+    event = current()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        token = _current.set(event)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return wrapper
+
+
+@contextlib.contextmanager
+def measure(event):
+    """
+    Time the operation described by ``event`` and record it in `registry`
+    when it completes, successfully or not.  ``event`` is the `current`
+    event meanwhile.
+    """
+    token = _current.set(event)
+    start = time.perf_counter()
+    try:
+        yield event
+    except BaseException as ex:
+        event.error = ex
+        raise
+    finally:
+        event.duration = time.perf_counter() - start
+        _current.reset(token)
+        registry.record(event)
@@ -2,6 +2,8 @@
 
 import json
 
+import requests
+
 # The MockResponse class is currently relied upon in code and thus
 # temporarily got moved out of testing_tools to avoid adding pytest as a
 # mandatory dependency
@@ -42,3 +44,23 @@ class MockResponse(object):
     @property
     def text(self):
         return self.content.decode(errors='replace')
+
+
+def make_response(content=b'', status_code=200, url='http://example.com/query',
+                  headers=None, body=None, encoding=None):
+    """
+    A genuine `requests.Response` of ``content``, for the code relying on
+    more than what `MockResponse` mimics, such as the cache.  ``body``, if
+    provided, is the data of the POST request it answers.
+    """
+    response = requests.Response()
+    response._content = content
+    response._content_consumed = True
+    response.status_code = status_code
+    response.url = url
+    response.encoding = encoding
+    response.headers.update(headers or {})
+    if body is not None:
+        response.request = requests.Request('POST', url,
+                                            data=body).prepare()
+    return response
@@ -4,13 +4,24 @@ Process all "async" methods into direct methods.
 """
 import textwrap
 import functools
+import hashlib
+
+import astropy
+
 from .class_or_instance import class_or_instance
 from .docstr_chompers import remove_sections
+from . import metrics
+from .. import cache_conf, version
 
 
 def async_to_sync(cls):
     """
-    Convert all query_x_async methods to query_x methods
+    Convert all query_x_async methods to query_x methods, and add query_x_aio
+    coroutines returning the same result as query_x, to be awaited in an
+    `asyncio` event loop.  The coroutines send the requests of the services
+    opting in with ``aio_transport`` in the loop, and otherwise run query_x
+    in a thread of the default executor of the loop (see
+    ``BaseQuery._query_aio``).
 
     (see
     http://stackoverflow.com/questions/18048341/add-methods-to-a-class-generated-from-other-methods
@@ -26,12 +37,32 @@ def async_to_sync(cls):
             response = getattr(self, async_method_name)(*args, **kwargs)
             if kwargs.get('get_query_payload') or kwargs.get('field_help'):
                 return response
-            result = self._parse_result(response, verbose=verbose)
-            self.table = result
+            with metrics.measure(metrics.Event(
+                    'parse', _service_name(self),
+                    url=getattr(response, 'url', None))):
+                result = parse_result(self, response, verbose=verbose)
+            if not isinstance(self, type):
+                # called on the class, it would shadow the thread-local
+                # attribute of all the instances
+                self.table = result
             return result
 
         return newmethod
 
+    def create_aio_method(sync_method_name):
+
+        async def newmethod(self, *args, **kwargs):
+            if hasattr(self, '_query_aio'):
+                return await self._query_aio(sync_method_name, *args,
+                                             **kwargs)
+            import asyncio
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(
+                None, functools.partial(getattr(self, sync_method_name),
+                                        *args, **kwargs))
+
+        return newmethod
+
     methods = list(cls.__dict__.keys())
 
     for k in list(methods):
@@ -50,10 +81,76 @@ def async_to_sync(cls):
 
             setattr(cls, newmethodname, newmethod)
 
+    for k in list(methods):
+        aiomethodname = k[:-len("_async")] + "_aio"
+        if k.endswith('_async') and aiomethodname not in methods:
+
+            newmethod = create_aio_method(k[:-len("_async")])
+
+            newmethod.__doc__ = async_to_sync_docstr(
+                getattr(cls, k).__doc__,
+                firstline=("Queries the service and returns a {rt} object, "
+                           "as a coroutine.\n"))
+            newmethod.__name__ = aiomethodname
+
+            setattr(cls, aiomethodname, newmethod)
+
     return cls
 
 
-def async_to_sync_docstr(doc, returntype='table'):
+def _service_name(self):
+    if hasattr(self, '_service_name'):
+        return self._service_name()
+    cls = self if isinstance(self, type) else type(self)
+    return cls.__name__.split("Class")[0]
+
+
+def parse_result(self, response, verbose=False):
+    """
+    Parse ``response`` with ``self._parse_result``.
+
+    If ``cache_conf.cache_parsed_results`` is set, ``response`` (or each of
+    the responses of a list, as returned by MAST) is cached and the service
+    opts in with ``self._parse_result_key()``, the result is looked up in
+    (and stored to) the cache of the service, keyed on the requests, on the
+    state of the service returned by ``_parse_result_key`` and on the
+    identity and version of the parser, so that cache hits skip parsing
+    entirely.  The key also includes the validator (or date) of the
+    responses, so that results parsed from a response since replaced, e.g.
+    by a revalidation, are not reused.
+    """
+    responses = response if isinstance(response, list) else [response]
+    request_keys = [getattr(item, '_cache_key', None) for item in responses]
+    if (not responses or None in request_keys
+            or not cache_conf.cache_parsed_results
+            or not hasattr(self, '_get_cache_backend')):
+        return self._parse_result(response, verbose=verbose)
+    state_key = self._parse_result_key()
+    if state_key is None:
+        return self._parse_result(response, verbose=verbose)
+
+    parser = self._parse_result
+    body_ids = [(item.headers.get('ETag')
+                 or item.headers.get('Last-Modified')
+                 or item.headers.get('Date', '')) for item in responses]
+    result_key = hashlib.sha224("{0} {1} {2}.{3} {4} {5} {6} {7}".format(
+        request_keys, state_key, parser.__module__, parser.__qualname__,
+        version.version, astropy.__version__, verbose,
+        body_ids).encode()).hexdigest()
+    cache_backend = self._get_cache_backend()
+    result = cache_backend.get_result(result_key)
+    event = metrics.current()
+    if result is None:
+        result = parser(response, verbose=verbose)
+        cache_backend.set_result(result_key, result)
+        if event is not None:
+            event.cache = 'miss'
+    elif event is not None:
+        event.cache = 'hit'
+    return result
+
+
+def async_to_sync_docstr(doc, returntype='table', firstline=None):
     """
     Strip of the "Returns" component of a docstr and replace it with "Returns a
     table" code
@@ -63,8 +160,9 @@ def async_to_sync_docstr(doc, returntype='table'):
                    'fits': '~astropy.io.fits.PrimaryHDU',
                    'dict': 'dict'}
 
-    firstline = ("Queries the service and returns a {rt} object.\n"
-                 .format(rt=returntype))
+    if firstline is None:
+        firstline = "Queries the service and returns a {rt} object.\n"
+    firstline = firstline.format(rt=returntype)
 
     vowels = 'aeiou'
     vowels += vowels.upper()
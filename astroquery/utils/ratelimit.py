@@ -0,0 +1,71 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Process-wide rate limiting of the requests sent to each host.
+"""
+import threading
+import time
+
+__all__ = ['TokenBucket', 'get_token_bucket']
+
+
+class TokenBucket(object):
+    """
+    A thread-safe token bucket allowing ``rate`` events per second on
+    average, in bursts of at most ``burst`` events.
+
+    Parameters
+    ----------
+    rate : float
+        Number of tokens added to the bucket per second.
+    burst : int
+        Capacity of the bucket.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token and return the time (seconds) to wait until it is due.
+
+        Tokens taken from an empty bucket are borrowed from the future, so
+        that concurrent callers are queued one ``1 / rate`` apart.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """ Take a token, sleeping until it is due """
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_token_bucket(host, rate, burst=1):
+    """
+    Return the `TokenBucket` shared by all the requests sent to ``host``,
+    updated to allow ``rate`` requests per second in bursts of ``burst``.
+    """
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = _buckets[host] = TokenBucket(rate, burst)
+    if (bucket.rate, bucket.burst) != (rate, burst):
+        with bucket._lock:
+            bucket.rate, bucket.burst = rate, burst
+    return bucket
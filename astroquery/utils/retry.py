@@ -0,0 +1,209 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Retry policies and per-host circuit breakers for the requests sent by
+`~astroquery.query.BaseQuery`.
+"""
+import email.utils
+import random
+import sys
+import threading
+import time
+
+import requests
+
+from ..exceptions import CircuitOpenError
+
+__all__ = ['RetryPolicy', 'CircuitBreaker', 'get_circuit_breaker']
+
+# Failures to reach the server: the request was not processed.  Read
+# timeouts are not retried, the server may be busy processing the request.
+RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError,)
+# Connection errors which would fail again
+NO_RETRY_EXCEPTIONS = (requests.exceptions.SSLError,
+                       requests.exceptions.ProxyError)
+
+# Methods which can be sent again without side effects
+IDEMPOTENT_METHODS = ('GET', 'HEAD')
+
+
+def _retry_exceptions():
+    """
+    `RETRY_EXCEPTIONS` and `NO_RETRY_EXCEPTIONS`, with the matching
+    exceptions of `aiohttp` if it is in use (it is not imported for that
+    alone).
+    """
+    aiohttp = sys.modules.get('aiohttp')
+    if aiohttp is None:
+        return RETRY_EXCEPTIONS, NO_RETRY_EXCEPTIONS
+    return (RETRY_EXCEPTIONS + (aiohttp.ClientConnectionError,),
+            NO_RETRY_EXCEPTIONS + (aiohttp.ClientSSLError,
+                                   aiohttp.ClientProxyConnectionError,
+                                   aiohttp.ServerTimeoutError))
+
+
+class RetryPolicy(object):
+    """
+    When and how long to wait before retrying a failed request.
+
+    Requests failing to connect to the server, or answered with one of the
+    ``statuses``, are retried up to ``max_retries`` times, after an
+    exponential backoff with jitter, or after the delay given by the
+    ``Retry-After`` header of the response.  Only the requests of the
+    ``methods`` are retried, as they can be sent again without side
+    effects.
+
+    Parameters
+    ----------
+    max_retries : int
+        Maximum number of retries of a request.  0 disables retries.
+    backoff_factor : float
+        The n-th retry waits between 0.5 and 1 times
+        ``backoff_factor * 2 ** n`` seconds.
+    max_backoff : float
+        Maximum wait (seconds) before a retry.  Responses asking, with
+        ``Retry-After``, to wait longer than that are not retried.
+    statuses : tuple of int
+        The HTTP status codes to retry: the server is overloaded or
+        unavailable, or asks to slow down.
+    methods : tuple of str
+        The HTTP methods whose requests are retried.  Services whose POST
+        requests only query them set ``BaseQuery.idempotent_post`` to retry
+        them too.
+    failure_threshold : int
+        Number of consecutive failures of a host opening its circuit
+        breaker.  See `CircuitBreaker`.
+    reset_timeout : float
+        Time (seconds) after which an open circuit breaker lets a trial
+        request through.
+    """
+
+    def __init__(self, max_retries=3, backoff_factor=1., max_backoff=120.,
+                 statuses=(429, 502, 503, 504), methods=IDEMPOTENT_METHODS,
+                 failure_threshold=10, reset_timeout=60.):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.statuses = statuses
+        self.methods = methods
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+    def __repr__(self):
+        return ('RetryPolicy(max_retries={0}, backoff_factor={1}, '
+                'max_backoff={2}, statuses={3}, methods={4})'
+                .format(self.max_retries, self.backoff_factor,
+                        self.max_backoff, self.statuses, self.methods))
+
+    def is_failure(self, response=None, exception=None):
+        """
+        Whether a request ending with ``response`` or raising ``exception``
+        failed in a way worth retrying.
+        """
+        if exception is not None:
+            retry_exceptions, no_retry_exceptions = _retry_exceptions()
+            return (isinstance(exception, retry_exceptions)
+                    and not isinstance(exception, no_retry_exceptions))
+        return getattr(response, 'status_code', None) in self.statuses
+
+    def is_retryable(self, method):
+        """
+        Whether the requests of the HTTP ``method`` can be retried.
+        """
+        return method.upper() in self.methods
+
+    def delay(self, attempt, response=None):
+        """
+        Return the time (seconds) to wait before the retry number
+        ``attempt`` (starting at 0) of a failed request, or `None` not to
+        retry.
+        """
+        if attempt >= self.max_retries:
+            return None
+        retry_after = _parse_retry_after(
+            getattr(response, 'headers', {}).get('Retry-After'))
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_backoff else None
+        backoff = min(self.max_backoff, self.backoff_factor * 2 ** attempt)
+        return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+def _parse_retry_after(value):
+    """
+    Parse a ``Retry-After`` header, given in seconds or as an HTTP date
+    """
+    if value is None:
+        return None
+    try:
+        return max(0., float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0., date.timestamp() - time.time())
+
+
+class CircuitBreaker(object):
+    """
+    Stop sending requests to a host failing repeatedly.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    `check` raises `~astroquery.exceptions.CircuitOpenError` immediately.
+    Once ``reset_timeout`` seconds have passed, one trial request is let
+    through: the breaker closes again if it succeeds.
+    """
+
+    def __init__(self, host, failure_threshold=10, reset_timeout=60.):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def check(self):
+        """ Raise if no request should be sent to the host now """
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # half-open: let a single trial request through
+                self.opened_at = time.monotonic()
+                return
+        raise CircuitOpenError(
+            "{0} failed {1} times in a row; not sending requests to it "
+            "for {2} s".format(self.host, self.failures,
+                               self.reset_timeout))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(host, failure_threshold=10, reset_timeout=60.):
+    """
+    Return the `CircuitBreaker` shared by all the requests sent to ``host``
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(host)
+    breaker.failure_threshold = failure_threshold
+    breaker.reset_timeout = reset_timeout
+    return breaker
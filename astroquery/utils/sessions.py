@@ -0,0 +1,152 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Connection pools shared by the HTTP sessions of all the query classes.
+
+Every query class (and every copy of it) has its own `requests.Session`,
+holding its cookies, headers and credentials, but the connections are taken
+from a process-wide pool per host.  Queries to a host then reuse the
+connections (and TLS sessions) opened by earlier queries, whichever class
+or thread sent them.  The size of the pools, and how long an idle connection
+is kept, are set by ``astroquery.connection_conf``.  The TAP connections
+(`~astroquery.utils.tap.conn.tapconn.TapConn`) use the same pools.
+"""
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from six.moves.urllib_parse import urlparse
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .. import connection_conf
+
+__all__ = ['PooledAdapter', 'PooledSession', 'get_adapter', 'close_pools']
+
+
+class _IdleTimeoutMixin(object):
+    """
+    Close, rather than reuse, the connections of a pool left idle for more
+    than ``connection_conf.connection_idle_timeout`` seconds (if positive),
+    which the server or a firewall may have dropped already.  A closed
+    connection is reopened by its next request.
+    """
+
+    def _get_conn(self, timeout=None):
+        conn = super(_IdleTimeoutMixin, self)._get_conn(timeout=timeout)
+        released = getattr(conn, '_astroquery_released', None)
+        idle_timeout = connection_conf.connection_idle_timeout
+        if ((released is not None and idle_timeout > 0
+             and time.monotonic() - released > idle_timeout)):
+            conn.close()
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn._astroquery_released = time.monotonic()
+        super(_IdleTimeoutMixin, self)._put_conn(conn)
+
+
+class _HTTPConnectionPool(_IdleTimeoutMixin, HTTPConnectionPool):
+    pass
+
+
+class _HTTPSConnectionPool(_IdleTimeoutMixin, HTTPSConnectionPool):
+    pass
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    The `~requests.adapters.HTTPAdapter` holding the connection pool of a
+    host, shared by all the `PooledSession`.
+
+    Closing the sessions does not close the pool, see `close_pools`.
+    """
+
+    def __init__(self):
+        super(PooledAdapter, self).__init__(
+            pool_connections=1,
+            pool_maxsize=connection_conf.connection_pool_size,
+            pool_block=connection_conf.connection_pool_block)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if connection_conf.connection_keep_alive:
+            kwargs.setdefault('socket_options',
+                              HTTPConnection.default_socket_options
+                              + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)])
+        super(PooledAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _HTTPConnectionPool, 'https': _HTTPSConnectionPool}
+
+    def get_pool(self, url):
+        """
+        Return the urllib3 connection pool of ``url`` used by the sessions,
+        with TLS certificates verified.
+        """
+        if hasattr(self, 'get_connection_with_tls_context'):
+            request = requests.Request('GET', url).prepare()
+            return self.get_connection_with_tls_context(request, verify=True)
+        pool = self.get_connection(url)
+        self.cert_verify(pool, url, True, None)
+        return pool
+
+    def close(self):
+        pass
+
+
+_adapters = {}
+_adapters_lock = threading.Lock()
+
+# The adapter replacing the pools while a cassette is in use, see
+# astroquery.utils.cassette
+_cassette = None
+
+
+def get_adapter(url):
+    """
+    Return the `PooledAdapter` of the host of ``url``, shared by the whole
+    process.
+    """
+    url = urlparse(url)
+    key = (url.scheme.lower(), url.netloc.lower())
+    with _adapters_lock:
+        adapter = _adapters.get(key)
+        if adapter is None:
+            adapter = _adapters[key] = PooledAdapter()
+    return adapter
+
+
+def close_pools():
+    """
+    Close the connections of all the pools.  New pools are created as
+    needed by the next requests.
+    """
+    with _adapters_lock:
+        adapters = list(_adapters.values())
+        _adapters.clear()
+    for adapter in adapters:
+        HTTPAdapter.close(adapter)
+
+
+class PooledSession(requests.Session):
+    """
+    A `requests.Session` sending its HTTP(S) requests through the shared
+    connection pools of their hosts.  Adapters mounted explicitly on the
+    session for a more specific prefix than the scheme take precedence.
+
+    While a `~astroquery.utils.cassette.Cassette` is in use, all the HTTP(S)
+    requests go through it instead.
+    """
+
+    def get_adapter(self, url):
+        cassette = _cassette
+        if cassette is not None:
+            return cassette
+        for prefix, adapter in self.adapters.items():
+            if ((prefix not in ('http://', 'https://')
+                 and url.lower().startswith(prefix.lower()))):
+                return adapter
+        if url.lower().startswith(('http://', 'https://')):
+            return get_adapter(url)
+        return super(PooledSession, self).get_adapter(url)
@@ -0,0 +1,89 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Coalescing of identical calls in flight at the same time.
+
+Threads (or coroutines) asking at once for the same thing, e.g. the same
+request of `~astroquery.query.BaseQuery._request`, share a single call made
+by the first of them: the others wait for it and receive its result, or
+its exception.
+"""
+import threading
+from concurrent.futures import Future
+
+__all__ = ['SingleFlight']
+
+
+class SingleFlight(object):
+    """
+    A thread-safe registry of the calls in flight, by key.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def _join(self, key):
+        """
+        Return ``(future, leader)``: the future of the call ``key``, and
+        whether the caller has to make the call.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _done(self, key, future, result=None, exception=None):
+        with self._lock:
+            del self._calls[key]
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def do(self, key, function):
+        """
+        Call ``function``, unless a call with the same ``key`` is already in
+        flight, in which case wait for its outcome instead.
+
+        Returns
+        -------
+        result : object
+            The value returned by the call.
+        shared : bool
+            True if the result comes from the call of another caller.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(), True
+        try:
+            result = function()
+        except BaseException as ex:
+            self._done(key, future, exception=ex)
+            raise
+        self._done(key, future, result=result)
+        return result, False
+
+    async def do_aio(self, key, function):
+        """
+        Coroutine version of `do`, awaiting the coroutine function
+        ``function``.  Calls in flight with the same key in other threads or
+        event loops are waited for as well.
+        """
+        import asyncio
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future), True
+        try:
+            result = await function()
+        except BaseException as ex:
+            self._done(key, future, exception=ex)
+            raise
+        self._done(key, future, result=result)
+        return result, False
+
+    def __len__(self):
+        """ Number of calls in flight """
+        with self._lock:
+            return len(self._calls)
@@ -15,12 +15,6 @@ Created on 30 jun. 2016
 
 """
 
-try:
-    # python 3
-    import http.client as httplib
-except ImportError:
-    # python 2
-    import httplib
 import mimetypes
 import time
 
@@ -28,12 +22,15 @@ from six.moves.urllib.parse import urlencode
 
 from astroquery.utils.tap.xmlparser import utils
 from astroquery.utils.tap import taputils
+from astroquery.utils import sessions
 
 import requests
+from requests.structures import CaseInsensitiveDict
 
 __all__ = ['TapConn']
 
 CONTENT_TYPE_POST_DEFAULT = "application/x-www-form-urlencoded"
+ACCEPT_ENCODING_DEFAULT = "gzip, deflate"
 
 
 class TapConn(object):
@@ -124,9 +121,12 @@ class TapConn(object):
         self.__tapContext = None
         self.__postHeaders = {
             "Content-type": CONTENT_TYPE_POST_DEFAULT,
-            "Accept": "text/plain"
+            "Accept": "text/plain",
+            "Accept-Encoding": ACCEPT_ENCODING_DEFAULT
+            }
+        self.__getHeaders = {
+            "Accept-Encoding": ACCEPT_ENCODING_DEFAULT
             }
-        self.__getHeaders = {}
         self.__cookie = None
         self.__currentStatus = 0
         self.__currentReason = ""
@@ -478,6 +478,8 @@ class TapConn(object):
 
     def dump_to_file(self, output, response):
         """Writes the connection response into the specified output
+        The response is decoded from its Content-Encoding, but gzip responses
+        are written as received to '.gz' files
 
         Parameters
         ----------
@@ -486,9 +488,14 @@ class TapConn(object):
         response : HTTP(s) response object, mandatory
             HTTP(s) response object
         """
+        kwargs = {}
+        encoding = self.find_header(response.getheaders(), 'Content-Encoding')
+        if encoding is not None and encoding.lower() == "gzip" \
+                and str(output).lower().endswith(".gz"):
+            kwargs['decode_content'] = False
         with open(output, "wb") as f:
             while True:
-                data = response.read(4096)
+                data = response.read(65536, **kwargs)
                 if len(data) < 1:
                     break
                 f.write(data)
@@ -720,6 +727,116 @@ class TapConn(object):
             + str(self.__connPortSsl)
 
 
+class PooledResponse(object):
+    """
+    A response read from a `PooledConnection`, with the interface of
+    `http.client.HTTPResponse` used by the TAP classes.
+
+    The body is decoded from its gzip or deflate Content-Encoding as it is
+    read, unless ``decode_content`` is `False`.  The connection goes back
+    to the pool once the body is read to the end, and is discarded if the
+    response is closed before.
+    """
+
+    def __init__(self, response):
+        self._response = response
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = self.msg = response.headers
+
+    def read(self, amt=None, decode_content=True):
+        return self._response.read(amt, decode_content=decode_content)
+
+    def getheaders(self):
+        return list(self.headers.items())
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+    def close(self):
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _CassetteResponse(PooledResponse):
+    """
+    A `PooledResponse` recorded or replayed by the
+    `~astroquery.utils.cassette.Cassette` in use, from its
+    `requests.Response`.
+
+    The cassette records decoded bodies, so the body is always read decoded
+    and the Content-Encoding header is dropped, whether the response is
+    being recorded or replayed.
+    """
+
+    def __init__(self, response):
+        self._response = response.raw
+        self.status = response.status_code
+        self.reason = response.reason
+        self.headers = self.msg = CaseInsensitiveDict(
+            (name, value) for name, value in response.headers.items()
+            if name.lower() != 'content-encoding')
+
+    def read(self, amt=None, decode_content=True):
+        return self._response.read(amt)
+
+
+class PooledConnection(object):
+    """
+    A connection to ``host``, with the interface of
+    `http.client.HTTPConnection` used by the TAP classes, sending its
+    requests through the keep-alive connection pool of the host shared by
+    the whole process (see `astroquery.utils.sessions`).  While a
+    `~astroquery.utils.cassette.Cassette` is in use, the requests go through
+    it instead, like those of the query classes.
+    """
+
+    def __init__(self, host, port, secure=False):
+        self.host = host
+        self.port = port
+        self.scheme = 'https' if secure else 'http'
+        self.__response = None
+
+    def get_url(self):
+        """
+        Return the base URL of the host, without the port if it is the
+        default one of the scheme, as the query classes write it.
+        """
+        if (self.scheme, int(self.port)) in (('http', 80), ('https', 443)):
+            return "{0}://{1}".format(self.scheme, self.host)
+        return "{0}://{1}:{2}".format(self.scheme, self.host, self.port)
+
+    def request(self, method, url, body=None, headers=None):
+        base = self.get_url()
+        cassette = sessions._cassette
+        if cassette is not None:
+            # Recorded or replayed along with the requests of BaseQuery
+            request = requests.Request(method, base + url, data=body,
+                                       headers=headers).prepare()
+            self.__response = _CassetteResponse(
+                cassette.send(request, stream=True))
+            return
+        pool = sessions.get_adapter(base).get_pool(base)
+        # Redirections and retries are left to the TAP classes
+        self.__response = PooledResponse(pool.urlopen(
+            method, url, body=body, headers=headers or {}, retries=False,
+            redirect=False, preload_content=False, release_conn=False))
+
+    def getresponse(self):
+        response, self.__response = self.__response, None
+        return response
+
+    def close(self):
+        if self.__response is not None:
+            self.__response.close()
+            self.__response = None
+
+
 class ConnectionHandler(object):
     def __init__(self, host, port, sslport):
         self.__connHost = host
@@ -734,7 +851,8 @@ class ConnectionHandler(object):
         else:
             if verbose:
                 print("------>http")
-            return httplib.HTTPConnection(self.__connHost, self.__connPort)
+            return PooledConnection(self.__connHost, self.__connPort)
 
     def get_connection_secure(self, verbose):
-        return httplib.HTTPSConnection(self.__connHost, self.__connPortSsl)
+        return PooledConnection(self.__connHost, self.__connPortSsl,
+                                secure=True)
@@ -14,9 +14,14 @@ Created on 30 jun. 2016
 
 
 """
+import gzip
 import unittest
 import os
+import threading
+import zlib
+from six.moves import BaseHTTPServer, socketserver
 
+from astroquery import connection_conf
 from astroquery.utils.tap.conn.tapconn import TapConn
 from astroquery.utils.tap.conn.tests.DummyConn import DummyConn
 
@@ -155,3 +160,102 @@ class ConnTest(unittest.TestCase):
         assert r.get_body() == data, \
             "Request body. Expected %s, found %s" % (data,
                                                      str(r.get_body()))
+
+
+class KeepAliveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.clients.append(self.client_address)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Set-Cookie', 'a=1')
+        self.send_header('Set-Cookie', 'b=2')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        body = b'<VOTABLE>' + b'<TR><TD>1</TD></TR>' * 1000 + b'</VOTABLE>'
+        encoding = self.path.rsplit('/', 1)[-1]
+        if encoding not in self.headers.get('Accept-Encoding', ''):
+            encoding = 'identity'
+        elif encoding == 'gzip':
+            body = gzip.compress(body)
+        else:
+            body = zlib.compress(body)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-votable+xml')
+        self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                          BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def test_pooled_connection():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    server.clients = []
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        tap = TapConn(ishttps=False, host='127.0.0.1', server_context='tap',
+                      port=server.server_port)
+        for i in range(3):
+            response = tap.execute_tappost(subcontext='sync',
+                                           data='query={0}'.format(i))
+            assert response.status == 200
+            assert response.read(4) == b'quer'
+            assert response.read() == 'y={0}'.format(i).encode()
+        assert tap.find_header(response.getheaders(), 'Set-Cookie') == 'a=1'
+        assert [value for name, value in response.getheaders()
+                if name == 'Set-Cookie'] == ['a=1', 'b=2']
+        # the connection is kept open and reused by the requests
+        assert len(set(server.clients)) == 1
+
+        with connection_conf.set_temp('connection_idle_timeout', 1e-6):
+            response = tap.execute_tappost(subcontext='sync', data='query')
+            assert response.read() == b'query'
+        assert len(set(server.clients)) == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_content_encoding(tmpdir):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    body = b'<VOTABLE>' + b'<TR><TD>1</TD></TR>' * 1000 + b'</VOTABLE>'
+    try:
+        tap = TapConn(ishttps=False, host='127.0.0.1', server_context='tap',
+                      tap_context='tap', port=server.server_port)
+        for encoding in ('gzip', 'deflate', 'identity'):
+            response = tap.execute_tapget(encoding)
+            assert tap.find_header(response.getheaders(),
+                                   'Content-Encoding') == encoding
+            assert response.read() == body
+
+            # decoded to files, unless they are gzip files
+            response = tap.execute_tapget(encoding)
+            output = tmpdir.join('result.vot').strpath
+            tap.dump_to_file(output, response)
+            with open(output, 'rb') as f:
+                assert f.read() == body
+        response = tap.execute_tapget('gzip')
+        output = tmpdir.join('result.vot.gz').strpath
+        tap.dump_to_file(output, response)
+        with gzip.open(output, 'rb') as f:
+            assert f.read() == body
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -17,7 +17,7 @@ Created on 30 jun. 2016
 from astroquery.utils.tap import taputils
 from astroquery.utils.tap.conn.tapconn import TapConn
 from astroquery.utils.tap.xmlparser.tableSaxParser import TableSaxParser
-from astroquery.utils.tap.model.job import Job
+from astroquery.utils.tap.model.job import Job, ACTIVE_PHASES
 from astroquery.utils.tap.gui.login import LoginDialog
 from astroquery.utils.tap.xmlparser.jobSaxParser import JobSaxParser
 from astroquery.utils.tap.xmlparser.jobListSaxParser import JobListSaxParser
@@ -29,9 +29,14 @@ import six
 import requests
 from astropy.logger import log
 import getpass
+import json
 import os
 from astropy.table.table import Table
+from astropy.table import vstack
+from astroquery.exceptions import RemoteServiceError
+from collections import deque
 import tempfile
+import time
 
 
 __all__ = ['Tap', 'TapPlus']
@@ -354,7 +359,7 @@ class Tap(object):
                          output_format="votable", verbose=False,
                          dump_to_file=False, background=False,
                          upload_resource=None, upload_table_name=None,
-                         autorun=True):
+                         autorun=True, partition=None):
         """Launches an asynchronous job
 
         Parameters
@@ -381,11 +386,31 @@ class Tap(object):
         autorun : boolean, optional, default True
             if 'True', sets 'phase' parameter to 'RUN',
             so the framework can start the job.
+        partition : Partition, optional, default None
+            if provided, the query is split into one job per partition of
+            the values of a column (see Partition), run concurrently, and
+            their results are merged, in memory or into the output file.
+            Partitions which fail are run again, and if dump_to_file is
+            True, the results of the partitions already run are kept until
+            the merge, so that a failed query launched again only runs the
+            partitions missing.  The method returns once all the partitions
+            are merged.  Results merged into a file must be in 'csv' format,
+            the only one which can be appended without loading the results.
 
         Returns
         -------
         A Job object
         """
+        if partition is not None:
+            if upload_resource is not None or background or not autorun:
+                raise ValueError("Partitioned queries cannot upload "
+                                 "resources, nor run in background")
+            if dump_to_file and output_format != 'csv':
+                raise ValueError("Results of partitioned queries can only "
+                                 "be saved in 'csv' format")
+            return self.__launch_partitioned_job(query, partition,
+                                                 output_file, output_format,
+                                                 verbose, dump_to_file)
         if verbose:
             print("Launched query: '"+str(query)+"'")
         if upload_resource is not None:
@@ -455,6 +480,193 @@ class Tap(object):
                         log.info("Query finished.")
         return job
 
+    def launch_jobs_async(self, queries, max_jobs=5,
+                          output_format="votable", verbose=False,
+                          dump_to_file=False, output_files=None,
+                          phase_callback=None):
+        """Launches asynchronous jobs for several queries, and yields them as
+        they finish
+        At most max_jobs jobs run at once, the other queries being launched
+        as the running jobs finish.  The phases of all the running jobs are
+        polled in a single loop, at intervals growing from Job.poll_interval
+        to Job.max_poll_interval, and the results of a job are loaded (or
+        saved to a file named after the job id) as soon as it completes.
+        A query which fails, or whose job ends in an ERROR or ABORTED
+        phase, does not stop the others: the exception raised is yielded in
+        place of its job.
+
+        Parameters
+        ----------
+        queries : iterable of str, mandatory
+            queries to be executed
+        max_jobs : int, optional, default 5
+            maximum number of jobs running at once, such as the number of
+            jobs the server lets a user run at once
+        output_format : str, optional, default 'votable'
+            results format
+        verbose : bool, optional, default 'False'
+            flag to display information about the process
+        dump_to_file : bool, optional, default 'False'
+            if True, the results are saved in files instead of using memory
+        output_files : list of str, optional, default None
+            file names where the results of the queries are saved if
+            dump_to_file is True, in the order of the queries.  If this
+            parameter is not provided, the job ids are used instead
+        phase_callback : callable, optional, default None
+            function called with a job and its new phase each time the
+            phase of a running job changes
+
+        Returns
+        -------
+        A generator of (query, Job or exception) pairs, in the order the
+        jobs finish
+        """
+        queries = list(queries)
+        for index, job in self.__run_jobs_async(queries, max_jobs,
+                                                output_format, verbose,
+                                                dump_to_file, output_files,
+                                                phase_callback):
+            yield queries[index], job
+
+    def __run_jobs_async(self, queries, max_jobs, output_format, verbose,
+                         dump_to_file, output_files, phase_callback):
+        # yields (index of the query, Job or exception) pairs, as identical
+        # queries cannot be told apart by their text
+        if output_files is None:
+            output_files = [None] * len(queries)
+        pending = deque(enumerate(output_files))
+        running = []
+        interval = Job.poll_interval
+        while pending or running:
+            while pending and len(running) < max_jobs:
+                index, output_file = pending.popleft()
+                try:
+                    job = self.launch_job_async(queries[index],
+                                                output_file=output_file,
+                                                output_format=output_format,
+                                                verbose=verbose,
+                                                dump_to_file=dump_to_file,
+                                                background=True)
+                except Exception as ex:
+                    yield index, ex
+                    continue
+                if dump_to_file and job.outputFileUser is None:
+                    # names from the current time would collide
+                    job.outputFileUser = str(job.jobid) + \
+                        self.__connHandler.get_suitable_extension_by_format(
+                            output_format)
+                    job.outputFile = job.outputFileUser
+                running.append((index, job))
+            if not running:
+                continue
+
+            start = time.monotonic()
+            changed = False
+            for entry in list(running):
+                index, job = entry
+                try:
+                    previous = job.get_phase()
+                    phase = job.get_phase(update=True).upper().strip()
+                    if phase != previous:
+                        changed = True
+                        if verbose:
+                            print("Job " + str(job.jobid) + " status: " +
+                                  phase)
+                        if phase_callback is not None:
+                            phase_callback(job, phase)
+                    if phase in ACTIVE_PHASES:
+                        continue
+                    running.remove(entry)
+                    if phase != 'COMPLETED':
+                        raise RemoteServiceError(
+                            "Job " + str(job.jobid) + " ended in phase " +
+                            phase)
+                    if dump_to_file:
+                        job.save_results(verbose)
+                    else:
+                        job.get_results()
+                except Exception as ex:
+                    if entry in running:
+                        running.remove(entry)
+                    yield index, ex
+                else:
+                    yield index, job
+            if changed:
+                interval = Job.poll_interval
+            if running:
+                time.sleep(max(0., interval - (time.monotonic() - start)))
+                interval = min(2 * interval, Job.max_poll_interval)
+
+    def __launch_partitioned_job(self, query, partition, output_file,
+                                 output_format, verbose, dump_to_file):
+        queries = partition.get_queries(query)
+        astropyFormat = utils.get_suitable_astropy_format(output_format)
+        if dump_to_file:
+            if output_file is None:
+                output_file = taputils.get_suitable_output_file(
+                    self.__connHandler, True, None, [], False, output_format)
+            parts = [output_file + ".part" + str(i)
+                     for i in range(len(queries))]
+            # partitions saved by a previous launch of the same queries
+            manifest = output_file + ".partition"
+            previous = None
+            if os.path.exists(manifest):
+                with open(manifest) as f:
+                    previous = json.load(f)
+            if previous == queries:
+                todo = [i for i in range(len(queries))
+                        if not os.path.exists(parts[i])]
+            else:
+                todo = list(range(len(queries)))
+                with open(manifest, "w") as f:
+                    json.dump(queries, f)
+        else:
+            todo = list(range(len(queries)))
+        results = {}
+        errors = {}
+        for attempt in range(partition.max_retries + 1):
+            if not todo:
+                break
+            if attempt > 0 and verbose:
+                print("Running again " + str(len(todo)) + " partitions")
+            errors = {}
+            output_files = None
+            if dump_to_file:
+                output_files = [parts[i] + ".tmp" for i in todo]
+            for index, chunk_job in self.__run_jobs_async(
+                    [queries[i] for i in todo], partition.max_jobs,
+                    output_format, verbose, dump_to_file, output_files, None):
+                i = todo[index]
+                if isinstance(chunk_job, Exception):
+                    errors[i] = chunk_job
+                elif dump_to_file:
+                    os.replace(chunk_job.outputFileUser, parts[i])
+                else:
+                    results[i] = chunk_job.get_results()
+            todo = sorted(errors)
+        if errors:
+            raise RemoteServiceError(
+                str(len(errors)) + " of " + str(len(queries)) +
+                " partitions failed, the first one with: " +
+                str(errors[min(errors)]))
+
+        job = Job(async_job=False, query=query, connhandler=self.__connHandler)
+        job.parameters['format'] = output_format
+        job.outputFileUser = output_file
+        if dump_to_file:
+            if verbose:
+                print("Merging results to: %s" % output_file)
+            taputils.merge_result_files(parts, output_file, astropyFormat)
+            for part in parts:
+                os.remove(part)
+            os.remove(manifest)
+            job.outputFile = output_file
+        else:
+            job.set_results(vstack([results[i] for i in range(len(queries))],
+                                   metadata_conflicts='silent'))
+        job._phase = 'COMPLETED'
+        return job
+
     def load_async_job(self, jobid=None, name=None, verbose=False,
                        load_results=True):
         """Loads an asynchronous job
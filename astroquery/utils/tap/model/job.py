@@ -16,6 +16,7 @@ Created on 30 jun. 2016
 """
 
 import time
+from xml.etree import ElementTree
 
 from astroquery.utils.tap.model import modelutils
 from astroquery.utils.tap.xmlparser import utils
@@ -25,11 +26,36 @@ import sys
 
 __all__ = ['Job']
 
+# Phases of a job which is not finished yet
+ACTIVE_PHASES = ('PENDING', 'QUEUED', 'EXECUTING')
+
+
+def _parse_uws_job(data):
+    """Returns the phase and the UWS version of a UWS job document, or
+    (None, None) if the document cannot be parsed"""
+    try:
+        root = ElementTree.fromstring(data)
+    except ElementTree.ParseError:
+        return None, None
+    for element in root.iter():
+        if element.tag.rsplit('}', 1)[-1].lower() == 'phase':
+            return (element.text or '').strip(), root.get('version')
+    return None, root.get('version')
+
 
 class Job(object):
     """Job class
     """
 
+    #: Time (seconds) the server is asked to wait for a phase change before
+    #: replying (UWS 1.1 blocking requests), 0 to poll the phase instead.
+    uws_wait = 30
+    #: Initial time (seconds) between two phase requests, doubled after each
+    #: request until it reaches max_poll_interval.
+    poll_interval = 0.5
+    #: Maximum time (seconds) between two phase requests.
+    max_poll_interval = 30.
+
     def __init__(self, async_job, query=None, connhandler=None):
         """Constructor
 
@@ -304,17 +330,26 @@ class Job(object):
                 print("Saving results to: %s" % output)
                 self.connHandler.dump_to_file(output, response)
 
-    def wait_for_job_end(self, verbose=False):
+    def wait_for_job_end(self, verbose=False, phase_callback=None):
         """Waits until a job is finished
+        Servers supporting UWS 1.1 are asked to reply when the phase changes
+        (blocking requests of uws_wait seconds), other servers are polled
+        at intervals growing from poll_interval to max_poll_interval
 
         Parameters
         ----------
         verbose : bool, optional, default 'False'
             flag to display information about the process
+        phase_callback : callable, optional, default None
+            function called with the job and its new phase each time the
+            phase of the job changes
+
+        Returns
+        -------
+        The status of the last phase response and the final phase
         """
         currentResponse = None
         responseData = None
-        lphase = None
         # execute job if not running
         if self._phase == 'PENDING':
             print("Job in PENDING phase, sending phase=RUN request.")
@@ -324,21 +359,56 @@ class Job(object):
                 # ignore
                 if verbose:
                     print("Exception when trying to start job", ex)
+        lphase = None if self._phase is None else self._phase.upper().strip()
+        interval = self.poll_interval
+        # blocking requests are sent once the phase is known
+        blocking = None
         while True:
-            responseData = self.get_phase(update=True)
+            start = time.monotonic()
+            responseData = None
+            if blocking:
+                responseData, version = self.__wait_phase_change(lphase)
+                # servers before UWS 1.1 ignore the WAIT parameter
+                blocking = version == '1.1'
+            if responseData is None:
+                responseData = self.get_phase(update=True)
             currentResponse = self.__last_phase_response_status
 
-            lphase = responseData.upper().strip()
+            previous, lphase = lphase, responseData.upper().strip()
             if verbose:
                 print("Job " + self.jobid + " status: " + lphase)
-            if ("PENDING" != lphase and "QUEUED" != lphase and
-                    "EXECUTING" != lphase):
+            if lphase != previous:
+                interval = self.poll_interval
+                if phase_callback is not None:
+                    phase_callback(self, lphase)
+            if lphase not in ACTIVE_PHASES:
                 break
             # PENDING, QUEUED, EXECUTING, COMPLETED, ERROR, ABORTED, UNKNOWN,
             # HELD, SUSPENDED, ARCHIVED:
-            time.sleep(0.5)
+            if blocking is None:
+                blocking = self.uws_wait > 0
+            time.sleep(max(0., interval - (time.monotonic() - start)))
+            interval = min(2 * interval, self.max_poll_interval)
         return currentResponse, lphase
 
+    def __wait_phase_change(self, phase):
+        # UWS 1.1: the job document is returned once the job leaves 'phase',
+        # or after 'WAIT' seconds
+        args = {"WAIT": str(int(self.uws_wait)), "PHASE": phase}
+        context = "async/" + str(self.jobid) + "?" + \
+            self.connHandler.url_encode(args)
+        response = self.connHandler.execute_tapget(context)
+        self.__last_phase_response_status = response.status
+        if response.status != 200:
+            errMsg = taputils.get_http_response_error(response)
+            print(response.status, errMsg)
+            raise requests.exceptions.HTTPError(errMsg)
+        phase, version = _parse_uws_job(response.read())
+        if phase:
+            self._phase = phase
+            return phase, version
+        return None, version
+
     def __load_async_job_results(self, debug=False):
         wjResponse, phase = self.wait_for_job_end()
         subContext = "async/" + str(self.jobid) + "/results/result"
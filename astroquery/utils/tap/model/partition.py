@@ -0,0 +1,167 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+=============
+TAP plus
+=============
+
+Partitioning of the queries too large to be run as a single job.
+
+"""
+import re
+
+from astroquery.utils.tap import taputils
+
+__all__ = ['Partition']
+
+# Highest HEALPix level of from_healpix partitions (49152 partitions)
+HEALPIX_MAX_LEVEL = 6
+
+# Clauses whose results are not the union of the results of the partitions
+PARTITION_UNSUPPORTED_CLAUSE_PATTERN = re.compile(
+    r"\b(TOP|DISTINCT|GROUP\s+BY|HAVING|ORDER\s+BY|OFFSET)\b", re.IGNORECASE)
+PARTITION_AGGREGATE_PATTERN = re.compile(r"\b(COUNT|SUM|AVG|MIN|MAX)\b",
+                                         re.IGNORECASE)
+
+
+def _to_adql(value):
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return str(value)
+
+
+def _check_query(query):
+    # the nested queries and the strings are masked, they do not matter
+    masked = taputils.mask_nested_in_query(query)
+    clause = PARTITION_UNSUPPORTED_CLAUSE_PATTERN.search(masked)
+    if clause is not None:
+        name = " ".join(clause.group(1).upper().split())
+        raise ValueError("Queries with a " + name + " clause cannot be "
+                         "partitioned")
+    for function in PARTITION_AGGREGATE_PATTERN.finditer(masked):
+        # the parentheses are masked too, but left at their position
+        if query[function.end():].lstrip().startswith('('):
+            raise ValueError("Queries with aggregate functions (" +
+                             function.group(1).upper() + ") cannot be "
+                             "partitioned")
+
+
+class Partition(object):
+    """Partition of a query into queries on ranges of values of a column,
+    run as concurrent asynchronous jobs by launch_job_async
+    """
+
+    def __init__(self, column, ranges, max_jobs=5, max_retries=2):
+        """Constructor
+
+        Parameters
+        ----------
+        column : str, mandatory
+            column whose values are partitioned, as named in the queries
+        ranges : list of (lower, upper) pairs, mandatory
+            values of the column in each partition, from lower (included)
+            to upper (excluded), None for no bound
+        max_jobs : int, optional, default 5
+            maximum number of partitions run at once
+        max_retries : int, optional, default 2
+            number of times the partitions which failed are run again
+        """
+        self.column = column
+        self.ranges = list(ranges)
+        self.max_jobs = max_jobs
+        self.max_retries = max_retries
+
+    @classmethod
+    def from_edges(cls, column, edges, **kwargs):
+        """Returns the partition of the values of the column between each
+        pair of consecutive edges
+
+        Parameters
+        ----------
+        column : str, mandatory
+            column whose values are partitioned
+        edges : list, mandatory
+            increasing limits of the ranges of values
+        **kwargs
+            other arguments of Partition
+        """
+        edges = list(edges)
+        return cls(column, zip(edges[:-1], edges[1:]), **kwargs)
+
+    @classmethod
+    def from_healpix(cls, level, column='source_id', index_level=12,
+                     index_factor=2 ** 35, **kwargs):
+        """Returns the partition of the sky in the 12 * 4**level HEALPix
+        pixels of the level
+        The column must hold the nested HEALPix index of the sources at
+        index_level, times index_factor, plus a number below index_factor,
+        as the source_id of the Gaia catalogues does (the defaults)
+
+        Parameters
+        ----------
+        level : int, mandatory
+            HEALPix level of the partitions, at most index_level and
+            HEALPIX_MAX_LEVEL
+        column : str, optional, default 'source_id'
+            column holding the HEALPix index of the sources
+        index_level : int, optional, default 12
+            HEALPix level of the index held by the column
+        index_factor : int, optional, default 2**35
+            factor of the index in the values of the column
+        **kwargs
+            other arguments of Partition
+        """
+        if not 0 <= level <= index_level:
+            raise ValueError("HEALPix level must be between 0 and the level "
+                             "of the index, " + str(index_level))
+        if level > HEALPIX_MAX_LEVEL:
+            raise ValueError("HEALPix level must be at most " +
+                             str(HEALPIX_MAX_LEVEL) + ", as each partition "
+                             "is run as a job")
+        factor = 4 ** (index_level - level) * index_factor
+        return cls(column, [(pixel * factor, (pixel + 1) * factor)
+                            for pixel in range(12 * 4 ** level)], **kwargs)
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def get_condition(self, index):
+        """Returns the ADQL condition selecting the rows of a partition
+
+        Parameters
+        ----------
+        index : int, mandatory
+            partition index
+        """
+        lower, upper = self.ranges[index]
+        conditions = []
+        if lower is not None:
+            conditions.append(self.column + " >= " + _to_adql(lower))
+        if upper is not None:
+            conditions.append(self.column + " < " + _to_adql(upper))
+        if not conditions:
+            return "1 = 1"
+        return " AND ".join(conditions)
+
+    def get_queries(self, query):
+        """Returns the queries of the partitions
+        Queries with TOP, DISTINCT, GROUP BY, HAVING, ORDER BY or OFFSET
+        clauses, or aggregate functions, in their outer query are refused,
+        as their results would be computed per partition.
+
+        Parameters
+        ----------
+        query : str, mandatory
+            ADQL query
+
+        Returns
+        -------
+        A list of queries, one per partition
+        """
+        _check_query(query)
+        return [taputils.add_condition_in_query(query,
+                                                self.get_condition(index))
+                for index in range(len(self))]
+
+    def __str__(self):
+        return "Partition of " + str(self.column) + " in " + \
+            str(len(self)) + " ranges"
@@ -17,6 +17,8 @@ Created on 30 jun. 2016
 import unittest
 import os
 import pytest
+from six.moves.urllib.parse import urlencode
+from unittest import mock
 
 from astroquery.utils.tap.model.job import Job
 from astroquery.utils.tap.conn.tests.DummyConnHandler import DummyConnHandler
@@ -29,6 +31,33 @@ def data_path(filename):
     return os.path.join(data_dir, filename)
 
 
+UWS_JOB = """<?xml version="1.0" encoding="UTF-8"?>
+<uws:job xmlns:uws="http://www.ivoa.net/xml/UWS/v1.0" %s>
+  <uws:jobId>12345</uws:jobId>
+  <uws:phase>%s</uws:phase>
+</uws:job>"""
+
+
+class ScriptedConnHandler(object):
+    """Replies to the GET requests with the given bodies, in order"""
+
+    def __init__(self, bodies):
+        self.bodies = list(bodies)
+        self.requests = []
+
+    def url_encode(self, data):
+        return urlencode(data)
+
+    def execute_tapget(self, subcontext, verbose=False):
+        self.requests.append(subcontext)
+        response = DummyResponse()
+        response.set_status_code(200)
+        response.set_message("OK")
+        response.set_data(method='GET', context=subcontext,
+                          body=self.bodies.pop(0), headers=None)
+        return response
+
+
 class TestJob(unittest.TestCase):
 
     def test_job_basic(self):
@@ -115,6 +144,65 @@ class TestJob(unittest.TestCase):
             # ok
             pass
 
+    def test_job_wait_blocking(self):
+        job = Job(async_job=True)
+        job.jobid = "12345"
+        job.connHandler = ScriptedConnHandler(
+            ['QUEUED',
+             UWS_JOB % ('version="1.1"', 'EXECUTING'),
+             UWS_JOB % ('version="1.1"', 'EXECUTING'),
+             UWS_JOB % ('version="1.1"', 'COMPLETED')])
+        phases = []
+        with mock.patch('time.sleep') as sleep:
+            status, phase = job.wait_for_job_end(
+                phase_callback=lambda job, phase: phases.append(phase))
+        assert (status, phase) == (200, 'COMPLETED')
+        assert phases == ['QUEUED', 'EXECUTING', 'COMPLETED']
+        # the server is asked to reply when the phase changes
+        assert job.connHandler.requests == [
+            'async/12345/phase',
+            'async/12345?WAIT=30&PHASE=QUEUED',
+            'async/12345?WAIT=30&PHASE=EXECUTING',
+            'async/12345?WAIT=30&PHASE=EXECUTING']
+        assert sleep.call_count == 3
+
+    def test_job_wait_polling(self):
+        job = Job(async_job=True)
+        job.jobid = "12345"
+        job.max_poll_interval = 3.
+        job.connHandler = ScriptedConnHandler(
+            ['EXECUTING', UWS_JOB % ('', 'EXECUTING')] +
+            ['EXECUTING'] * 4 + ['COMPLETED'])
+        with mock.patch('time.sleep') as sleep:
+            assert job.wait_for_job_end()[1] == 'COMPLETED'
+        # servers before UWS 1.1 are polled, with growing intervals
+        assert job.connHandler.requests == [
+            'async/12345/phase', 'async/12345?WAIT=30&PHASE=EXECUTING'] + \
+            ['async/12345/phase'] * 5
+        intervals = [args[0] for args, kwargs in sleep.call_args_list]
+        assert intervals == pytest.approx([0.5, 1., 2., 3., 3., 3.],
+                                          abs=0.1)
+
+        # or always, without uws_wait
+        job.uws_wait = 0
+        job._phase = 'QUEUED'
+        job.connHandler = ScriptedConnHandler(['EXECUTING', 'COMPLETED'])
+        with mock.patch('time.sleep'):
+            assert job.wait_for_job_end()[1] == 'COMPLETED'
+        assert job.connHandler.requests == ['async/12345/phase'] * 2
+
+        # or when the job document cannot be parsed
+        job.uws_wait = 30
+        job._phase = 'QUEUED'
+        job.connHandler = ScriptedConnHandler(
+            ['EXECUTING', '<html>Service unavailable', 'EXECUTING',
+             'COMPLETED'])
+        with mock.patch('time.sleep'):
+            assert job.wait_for_job_end()[1] == 'COMPLETED'
+        assert job.connHandler.requests == [
+            'async/12345/phase', 'async/12345?WAIT=30&PHASE=EXECUTING',
+            'async/12345/phase', 'async/12345/phase']
+
 
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
@@ -16,12 +16,19 @@ Created on 30 jun. 2016
 """
 
 import re
+import shutil
 from datetime import datetime
 
 TAP_UTILS_QUERY_TOP_PATTERN = re.compile(
     r"\s*SELECT\s+(ALL\s+|DISTINCT\s+)?TOP\s+\d+\s+", re.IGNORECASE)
 TAP_UTILS_QUERY_ALL_DISTINCT_PATTERN = re.compile(
     r"\s*SELECT\s+(ALL\s+|DISTINCT\s+)", re.IGNORECASE)
+TAP_UTILS_QUERY_WHERE_PATTERN = re.compile(r"\bWHERE\b", re.IGNORECASE)
+# Keywords ending the WHERE clause of a query
+TAP_UTILS_QUERY_WHERE_END_PATTERN = re.compile(
+    r"\b(GROUP\s+BY|HAVING|ORDER\s+BY|OFFSET)\b", re.IGNORECASE)
+TAP_UTILS_QUERY_SET_OPERATOR_PATTERN = re.compile(
+    r"\b(UNION|INTERSECT|EXCEPT)\b", re.IGNORECASE)
 
 TAP_UTILS_HTTP_ERROR_MSG_START = "<li><b>Message: </b>"
 TAP_UTILS_HTTP_VOTABLE_ERROR = '<INFO name="QUERY_STATUS" value="ERROR">'
@@ -105,6 +112,82 @@ def set_top_in_query(query, top):
         return nq
 
 
+def mask_nested_in_query(query):
+    """Blanks out the strings, delimited identifiers, comments and
+    parenthesized expressions of a query.
+
+    Parameters
+    ----------
+    query : str, mandatory
+        ADQL query
+
+    Returns
+    -------
+    The query with only the keywords of the outer query left, at their
+    positions.
+    """
+    chars = list(query)
+    depth = 0
+    quote = None
+    i = 0
+    while i < len(query):
+        c = query[i]
+        if quote is not None:
+            if c == quote:
+                quote = None
+            chars[i] = ' '
+        elif c in ("'", '"'):
+            quote = c
+            chars[i] = ' '
+        elif query.startswith('--', i):
+            end = query.find('\n', i)
+            end = len(query) if end < 0 else end
+            chars[i:end] = ' ' * (end - i)
+            i = end
+            continue
+        elif c == '(':
+            depth += 1
+            chars[i] = ' '
+        elif c == ')':
+            depth -= 1
+            chars[i] = ' '
+        elif depth > 0:
+            chars[i] = ' '
+        i += 1
+    return ''.join(chars)
+
+
+def add_condition_in_query(query, condition):
+    """Returns the ADQL query with the condition added to its WHERE clause
+
+    Parameters
+    ----------
+    query : str, mandatory
+        ADQL query
+    condition : str, mandatory
+        ADQL condition
+
+    Returns
+    -------
+    The query selecting the rows matching the condition only
+    """
+    masked = mask_nested_in_query(query)
+    if TAP_UTILS_QUERY_SET_OPERATOR_PATTERN.search(masked):
+        raise ValueError("Queries combining several SELECT cannot be "
+                         "partitioned")
+    where = TAP_UTILS_QUERY_WHERE_PATTERN.search(masked)
+    start = where.end() if where is not None else 0
+    end = TAP_UTILS_QUERY_WHERE_END_PATTERN.search(masked, start)
+    end = end.start() if end is not None else len(query.rstrip())
+    if where is not None:
+        query = query[:start] + " (" + query[start:end].strip() + \
+            ") AND (" + condition + ") " + query[end:].lstrip()
+    else:
+        query = query[:end].rstrip() + "\nWHERE " + condition + " " + \
+            query[end:].lstrip()
+    return query.rstrip()
+
+
 def get_http_response_error(response):
     """Extracts an HTTP error message from an HTML response.
 
@@ -240,3 +323,29 @@ def get_suitable_output_file(conn_handler, async_job, outputFile, headers,
     if isError:
         fileName += ".error"
     return fileName
+
+
+def merge_result_files(input_files, output_file, output_format):
+    """Merges the results of several queries into one file.
+    The results are concatenated as they are read, with a single header, so
+    that they are never loaded in memory: only CSV results can be merged.
+
+    Parameters
+    ----------
+    input_files : list of str, mandatory
+        files holding the results, in the order of their rows in the output
+    output_file : str, mandatory
+        file where the results are merged
+    output_format : str, mandatory
+        astropy format of the results
+    """
+    if output_format != 'ascii.csv':
+        raise ValueError("Results in format '" + str(output_format) +
+                         "' cannot be merged, only CSV results can")
+    with open(output_file, 'wb') as output:
+        for i, input_file in enumerate(input_files):
+            with open(input_file, 'rb') as f:
+                header = f.readline()
+                if i == 0:
+                    output.write(header)
+                shutil.copyfileobj(f, output)
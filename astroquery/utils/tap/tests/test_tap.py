@@ -18,11 +18,15 @@ import unittest
 import os
 import numpy as np
 import pytest
+import requests
+from six.moves.urllib.parse import quote_plus
+from astroquery.exceptions import RemoteServiceError
 from astroquery.utils.tap.model.tapcolumn import TapColumn
 
 from astroquery.utils.tap.conn.tests.DummyConnHandler import DummyConnHandler
 from astroquery.utils.tap.conn.tests.DummyResponse import DummyResponse
 from astroquery.utils.tap.core import TapPlus, TAP_CLIENT_ID
+from astroquery.utils.tap.model.partition import Partition
 from astroquery.utils.tap.xmlparser import utils
 from astroquery.utils.tap import taputils
 
@@ -32,6 +36,34 @@ def data_path(filename):
     return os.path.join(data_dir, filename)
 
 
+def set_async_job_responses(connHandler, query, jobid, status, phase,
+                            results, output_format="votable"):
+    """Sets the responses to the launch of an asynchronous job, to the
+    requests of its phase and to the request of its results"""
+    responseLaunchJob = DummyResponse()
+    responseLaunchJob.set_status_code(status)
+    responseLaunchJob.set_message("OK")
+    responseLaunchJob.set_data(
+        method='POST', context=None, body=None,
+        headers=[['location', 'http://test:1111/tap/async/' + jobid]])
+    dictTmp = {
+        "REQUEST": "doQuery",
+        "LANG": "ADQL",
+        "FORMAT": output_format,
+        "tapclient": str(TAP_CLIENT_ID),
+        "PHASE": "RUN",
+        "QUERY": quote_plus(query)}
+    sortedKey = taputils.taputil_create_sorted_dict_key(dictTmp)
+    connHandler.set_response("async?" + sortedKey, responseLaunchJob)
+    for context, body in (("phase", phase), ("results/result", results)):
+        response = DummyResponse()
+        response.set_status_code(200)
+        response.set_message("OK")
+        response.set_data(method='GET', context=None, body=body,
+                          headers=None)
+        connHandler.set_response("async/" + jobid + "/" + context, response)
+
+
 class TestTap(unittest.TestCase):
 
     def test_load_tables(self):
@@ -457,6 +489,31 @@ class TestTap(unittest.TestCase):
                                     None,
                                     np.int32)
 
+    def test_launch_jobs_async(self):
+        connHandler = DummyConnHandler()
+        tap = TapPlus("http://test:1111/tap", connhandler=connHandler)
+        jobData = utils.read_file_content(data_path('job_1.vot'))
+        # query1 completes, query2 fails and query3 cannot be launched
+        set_async_job_responses(connHandler, 'query1', '1', 303, 'COMPLETED',
+                                jobData)
+        set_async_job_responses(connHandler, 'query2', '2', 303, 'ERROR',
+                                jobData)
+        set_async_job_responses(connHandler, 'query3', '3', 500, None, None)
+
+        phases = []
+        results = list(tap.launch_jobs_async(
+            ['query1', 'query2', 'query3'], max_jobs=2,
+            phase_callback=lambda job, phase: phases.append((job.jobid,
+                                                             phase))))
+        assert [query for query, result in results] == ['query1', 'query2',
+                                                        'query3']
+        job = results[0][1]
+        assert job.jobid == '1'
+        assert len(job.get_results()) == 3
+        assert isinstance(results[1][1], RemoteServiceError)
+        assert isinstance(results[2][1], requests.exceptions.HTTPError)
+        assert phases == [('1', 'COMPLETED'), ('2', 'ERROR')]
+
     def test_start_job(self):
         connHandler = DummyConnHandler()
         tap = TapPlus("http://test:1111/tap", connhandler=connHandler)
@@ -1049,6 +1106,123 @@ class TestTap(unittest.TestCase):
             (columnName, dataType, c.dtype)
 
 
+def test_add_condition_in_query():
+    query = ("SELECT TOP 10 * FROM t WHERE (ra > 1) OR name = 'a where b' "
+             "ORDER BY ra")
+    assert taputils.add_condition_in_query(query, "x < 1") == (
+        "SELECT TOP 10 * FROM t WHERE ((ra > 1) OR name = 'a where b') "
+        "AND (x < 1) ORDER BY ra")
+    # conditions of subqueries are left alone
+    query = ("SELECT a FROM t JOIN (SELECT b FROM u WHERE c = 1) AS s "
+             "ON s.b = t.a GROUP BY a")
+    assert taputils.add_condition_in_query(query, "x < 1") == (
+        "SELECT a FROM t JOIN (SELECT b FROM u WHERE c = 1) AS s "
+        "ON s.b = t.a\nWHERE x < 1 GROUP BY a")
+    with pytest.raises(ValueError):
+        taputils.add_condition_in_query("SELECT a FROM t UNION "
+                                        "SELECT a FROM u", "x < 1")
+
+
+def test_partition():
+    partition = Partition.from_edges('source_id', [None, 10, 'b'])
+    assert partition.get_queries("SELECT * FROM t") == [
+        "SELECT * FROM t\nWHERE source_id < 10",
+        "SELECT * FROM t\nWHERE source_id >= 10 AND source_id < 'b'"]
+    # Gaia source_id hold the HEALPix index of level 12 times 2**35
+    partition = Partition.from_healpix(1)
+    assert len(partition) == 48
+    assert partition.ranges[1] == (4 ** 11 * 2 ** 35, 2 * 4 ** 11 * 2 ** 35)
+    with pytest.raises(ValueError):
+        Partition.from_healpix(13)
+    with pytest.raises(ValueError):
+        Partition.from_healpix(7)
+    with pytest.raises(ValueError):
+        Partition.from_healpix(4, index_level=3)
+    # clauses of the outer query which apply to the whole results
+    for query in ["SELECT TOP 10 * FROM t",
+                  "SELECT DISTINCT a FROM t",
+                  "SELECT a, b FROM t GROUP BY a, b",
+                  "SELECT * FROM t ORDER  BY a",
+                  "SELECT * FROM t OFFSET 10",
+                  "SELECT count (*) FROM t",
+                  "SELECT a, MAX(b) AS m FROM t"]:
+        with pytest.raises(ValueError):
+            partition.get_queries(query)
+    # but not those of nested queries, strings, nor names
+    assert len(partition.get_queries(
+        "SELECT a, 'top' AS \"count\" FROM t WHERE a IN "
+        "(SELECT TOP 5 MAX(b) FROM u GROUP BY c) AND sum = 1")) == 48
+
+
+class FileConnHandler(DummyConnHandler):
+    """Saves the responses dumped to files"""
+
+    def dump_to_file(self, fileOutput, response):
+        with open(fileOutput, "wb") as f:
+            f.write(response.read())
+
+
+def test_launch_partitioned_job(tmpdir):
+    connHandler = FileConnHandler()
+    tap = TapPlus("http://test:1111/tap", connhandler=connHandler)
+    partition = Partition.from_edges('id', [0, 10, 20], max_retries=1)
+    query1, query2 = partition.get_queries("SELECT * FROM t")
+    jobData = utils.read_file_content(data_path('job_1.vot'))
+    set_async_job_responses(connHandler, query1, '1', 303, 'COMPLETED',
+                            jobData)
+    set_async_job_responses(connHandler, query2, '2', 303, 'COMPLETED',
+                            jobData)
+    job = tap.launch_job_async("SELECT * FROM t", partition=partition)
+    assert job.get_phase() == 'COMPLETED'
+    assert len(job.get_results()) == 6
+    # partitions with identical queries are all kept
+    job = tap.launch_job_async("SELECT * FROM t", partition=Partition(
+        'id', [(0, 10), (0, 10), (10, 20)]))
+    assert len(job.get_results()) == 9
+    # the results saved to files are appended as they are read
+    with pytest.raises(ValueError):
+        tap.launch_job_async("SELECT * FROM t", partition=partition,
+                             dump_to_file=True)
+    with pytest.raises(ValueError):
+        taputils.merge_result_files([data_path('job_1.vot')] * 2,
+                                    tmpdir.join('merged.vot').strpath,
+                                    'votable')
+
+    # results merged to a file; the partitions saved are not run again
+    output = tmpdir.join('results.csv').strpath
+    set_async_job_responses(connHandler, query1, '1', 303, 'COMPLETED',
+                            "id,a\n1,x\n2,y\n", output_format='csv')
+    set_async_job_responses(connHandler, query2, '2', 303, 'ERROR', None,
+                            output_format='csv')
+    with pytest.raises(RemoteServiceError):
+        tap.launch_job_async("SELECT * FROM t", partition=partition,
+                             output_format='csv', output_file=output,
+                             dump_to_file=True)
+    assert os.path.exists(output + '.part0')
+    assert not os.path.exists(output + '.part1')
+    # a different query does not reuse them
+    with pytest.raises(RemoteServiceError):
+        tap.launch_job_async("SELECT * FROM u", partition=partition,
+                             output_format='csv', output_file=output,
+                             dump_to_file=True)
+    with pytest.raises(RemoteServiceError):
+        tap.launch_job_async("SELECT * FROM t", partition=partition,
+                             output_format='csv', output_file=output,
+                             dump_to_file=True)
+    assert os.path.exists(output + '.part0')
+    set_async_job_responses(connHandler, query1, '1', 500, None, None,
+                            output_format='csv')
+    set_async_job_responses(connHandler, query2, '2', 303, 'COMPLETED',
+                            "id,a\n11,z\n", output_format='csv')
+    job = tap.launch_job_async("SELECT * FROM t", partition=partition,
+                               output_format='csv', output_file=output,
+                               dump_to_file=True)
+    with open(output) as f:
+        assert f.read() == "id,a\n1,x\n2,y\n11,z\n"
+    assert os.listdir(tmpdir.strpath) == ['results.csv']
+    assert list(job.get_results()['id']) == [1, 2, 11]
+
+
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
@@ -6,7 +6,11 @@ import pytest
 
 # Import MockResponse to keep the API while it's temporarily factored out to
 # a separate file to avoid requiring pytest as a dependency in non-test code
-from .mocks import MockResponse
+from .mocks import MockResponse, make_response
+from .process_asyncs import async_to_sync
+from ..query import BaseQuery
+
+MOCK_URL = 'http://example.com/query'
 
 # save original socket method for restoration
 socket_original = socket.socket
@@ -30,3 +34,28 @@ def turn_on_internet(verbose=False):
         print("Internet access enabled")
     setattr(socket, 'socket', socket_original)
     return socket
+
+
+@async_to_sync
+class DummyClass(BaseQuery):
+    """
+    A service querying ``MOCK_URL``, whose results are the text of the
+    responses, counting the responses it parsed.
+    """
+
+    def __init__(self):
+        super(DummyClass, self).__init__()
+        self.parsed = 0
+
+    def query_object_async(self, name, cache=True):
+        """
+        Query the dummy service.
+        """
+        if name == 'error':
+            raise ValueError('invalid name')
+        return self._request('GET', MOCK_URL, params={'name': name},
+                             cache=cache)
+
+    def _parse_result(self, response, verbose=False):
+        self.parsed += 1
+        return response.text
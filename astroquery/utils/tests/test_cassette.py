@@ -0,0 +1,158 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import gzip
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from ...exceptions import CassetteError
+from ...query import BaseQuery
+from ..cassette import Cassette
+from ..tap.conn.tapconn import TapConn
+
+BODY = b'0123456789' * 200
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/data')
+            self.end_headers()
+            return
+        content = gzip.compress(BODY)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        content = self.rfile.read(length)[::-1]
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def serving():
+    httpd = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.start()
+    try:
+        yield httpd.server_port
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        thread.join()
+
+
+@pytest.fixture
+def recording(tmpdir):
+    path = tmpdir.join('cassette.zip').strpath
+    query = BaseQuery()
+    with serving() as port:
+        server = 'http://127.0.0.1:{0}'.format(port)
+        record(query, server, path, tmpdir)
+    return server, path
+
+
+def record(query, server, path, tmpdir):
+    with Cassette(path, mode='record') as cassette:
+        assert query._request('GET', server + '/data',
+                              cache=False).content == BODY
+        assert query._request('GET', server + '/redirect',
+                              cache=False).content == BODY
+        assert query._request('POST', server + '/echo', data={'a': 'bc'},
+                              cache=False).text == 'cb=a'
+        upload = query._request('POST', server + '/echo',
+                                files={'cat': ('cat.csv', b'1,2')},
+                                cache=False)
+        assert b'2,1' in upload.content
+        query._download_file(server + '/data', tmpdir.join('data').strpath)
+    # the redirection is recorded as well
+    assert len(cassette) == 6
+
+
+def test_replay(recording, tmpdir):
+    # the server is gone...
+    server, path = recording
+    query = BaseQuery()
+    # ...but the responses are replayed
+    with Cassette(path):
+        response = query._request('GET', server + '/data', cache=False)
+        assert response.content == BODY
+        assert response.headers['Content-Type'] == 'text/plain'
+        assert 'Content-Encoding' not in response.headers
+        response = query._request('GET', server + '/redirect', cache=False)
+        assert response.content == BODY
+        assert response.history[0].status_code == 302
+        assert query._request('POST', server + '/echo', data={'a': 'bc'},
+                              cache=False).text == 'cb=a'
+        with pytest.raises(CassetteError):
+            query._request('POST', server + '/echo', data={'a': 'de'},
+                           cache=False)
+        # the multipart boundaries differ from the recorded ones
+        response = query._request('POST', server + '/echo',
+                                  files={'cat': ('cat.csv', b'1,2')},
+                                  cache=False)
+        assert b'2,1' in response.content
+        with pytest.raises(CassetteError):
+            query._request('POST', server + '/echo',
+                           files={'cat': ('cat.csv', b'3,4')}, cache=False)
+        local_path = tmpdir.join('replayed').strpath
+        query._download_file(server + '/data', local_path)
+        with open(local_path, 'rb') as f:
+            assert f.read() == BODY
+
+
+def test_network_shape(recording):
+    server, path = recording
+    query = BaseQuery()
+    with Cassette(path, latency=0.1, bandwidth=10000):
+        start = time.monotonic()
+        query._request('GET', server + '/data', cache=False)
+        # 0.1 s of latency, then 2000 bytes at 10 kB/s
+        assert time.monotonic() - start >= 0.29
+
+
+def test_single_cassette(recording):
+    server, path = recording
+    with Cassette(path):
+        with pytest.raises(CassetteError):
+            Cassette(path).start()
+
+
+def test_tap_connection(tmpdir):
+    path = tmpdir.join('cassette.zip').strpath
+    with serving() as port:
+        connection = TapConn(False, '127.0.0.1', port=port,
+                             server_context='server', tap_context='tap')
+        with Cassette(path, mode='record') as cassette:
+            response = connection.execute_tapget('tables')
+            assert response.getheader('Content-Encoding') is None
+            assert response.read(100) + response.read() == BODY
+            response = connection.execute_tappost('sync', 'a=bc')
+            assert response.read() == b'cb=a'
+        assert len(cassette) == 2
+    # replayed without the server
+    with Cassette(path):
+        response = connection.execute_tapget('tables')
+        assert response.status == 200
+        assert response.getheader('Content-Type') == 'text/plain'
+        output = tmpdir.join('tables').strpath
+        connection.dump_to_file(output, response)
+        with open(output, 'rb') as f:
+            assert f.read() == BODY
+        assert connection.execute_tappost('sync', 'a=bc').read() == b'cb=a'
+        with pytest.raises(CassetteError):
+            connection.execute_tappost('sync', 'a=de')
@@ -0,0 +1,70 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from ...exceptions import TimeoutError
+from ..filelock import FileLock, atomic_write
+
+HOLD_LOCK = """
+import sys, time
+from astroquery.utils.filelock import FileLock
+with FileLock(sys.argv[1]):
+    print('locked', flush=True)
+    time.sleep(float(sys.argv[2]))
+"""
+
+
+def test_atomic_write(tmpdir):
+    path = tmpdir.join('file').strpath
+    with atomic_write(path) as f:
+        f.write(b'old')
+    with pytest.raises(ValueError):
+        with atomic_write(path) as f:
+            f.write(b'partial')
+            raise ValueError
+    with open(path, 'rb') as f:
+        assert f.read() == b'old'
+    assert tmpdir.listdir() == [tmpdir.join('file')]
+
+
+def test_lock_threads(tmpdir):
+    path = tmpdir.join('file.lock').strpath
+    inside = []
+    overlaps = []
+
+    def work():
+        with FileLock(path):
+            inside.append(1)
+            overlaps.append(len(inside))
+            time.sleep(0.01)
+            inside.pop()
+
+    threads = [threading.Thread(target=work) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == [1] * 8
+    assert not os.path.exists(path)
+
+
+def test_lock_processes(tmpdir):
+    path = tmpdir.join('file.lock').strpath
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    holder = subprocess.Popen([sys.executable, '-c', HOLD_LOCK, path, '0.5'],
+                              stdout=subprocess.PIPE, env=env)
+    try:
+        assert holder.stdout.readline().strip() == b'locked'
+        with pytest.raises(TimeoutError):
+            FileLock(path, timeout=0.1).acquire()
+        start = time.monotonic()
+        with FileLock(path, timeout=30) as lock:
+            assert lock.locked
+            assert time.monotonic() - start > 0.2
+    finally:
+        holder.wait()
@@ -0,0 +1,121 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from ..retry import RetryPolicy
+from ..testing_tools import DummyClass, make_response
+from .. import metrics
+
+URL = 'http://example.com/query'
+
+
+@pytest.fixture
+def events():
+    events = []
+    metrics.registry.add_callback(events.append)
+    yield events
+    metrics.registry.remove_callback(events.append)
+
+
+@pytest.fixture
+def dummy(monkeypatch, tmpdir):
+    responses = []
+
+    def request(session, method, url, **kwargs):
+        if responses:
+            return responses.pop(0)
+        return make_response(b'data')
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    dummy = DummyClass()
+    dummy.cache_location = tmpdir.strpath
+    dummy.retry_policy = RetryPolicy(backoff_factor=0.001)
+    dummy.responses = responses
+    return dummy
+
+
+def test_measure(events):
+    registry = metrics.MetricsRegistry()
+    event = metrics.Event('request', 'Dummy', 'GET', URL + '?a=1')
+    assert metrics.current() is None
+    with pytest.raises(ValueError):
+        with metrics.measure(event):
+            assert metrics.current() is event
+            raise ValueError()
+    assert metrics.current() is None
+    assert isinstance(event.error, ValueError)
+    assert event.duration > 0
+    assert event.endpoint == URL
+    assert events[-1] is event
+    registry.record(event)
+    registry.record(event)
+    summary = registry.summary()
+    assert len(summary) == 1
+    assert summary['count'][0] == 2
+    assert summary['errors'][0] == 2
+    registry.reset()
+    assert len(registry.summary()) == 0
+
+
+@pytest.mark.parametrize('has_contextvars', [True, False])
+def test_propagate(monkeypatch, events, has_contextvars):
+    if not has_contextvars:
+        # as on Python 3.6
+        monkeypatch.setattr(metrics, 'contextvars', None)
+        monkeypatch.setattr(metrics, '_current',
+                            metrics._ThreadLocalVar('event'))
+    event = metrics.Event('download', 'Dummy', 'GET', URL)
+    with metrics.measure(event):
+        with ThreadPoolExecutor(2) as executor:
+            assert executor.submit(metrics.current).result() is None
+            assert executor.submit(
+                metrics.propagate(metrics.current)).result() is event
+    assert metrics.current() is None
+
+
+def test_failing_callback(events):
+    def callback(event):
+        raise RuntimeError()
+
+    metrics.registry.add_callback(callback)
+    try:
+        with metrics.measure(metrics.Event('parse', 'Dummy')):
+            pass
+    finally:
+        metrics.registry.remove_callback(callback)
+    assert len(events) == 1
+
+
+def test_query_events(dummy, events):
+    dummy.responses.append(make_response(status_code=503))
+    dummy.query_object(1)
+    request, parse = events
+    assert (request.kind, request.service, request.endpoint) == (
+        'request', 'Dummy', URL)
+    assert request.cache == 'miss'
+    assert request.status == 200
+    assert request.retries == 1
+    assert request.nbytes == 4
+    assert request.wait is not None
+    assert parse.kind == 'parse'
+    assert parse.service == 'Dummy'
+    assert parse.endpoint == URL
+
+    dummy.query_object(1)
+    assert events[2].cache == 'hit'
+    assert events[2].nbytes == 4
+    assert events[2].retries == 0
+
+    dummy.query_object(1, cache=False)
+    assert events[4].cache is None
+
+
+def test_download_events(dummy, events, tmpdir):
+    path = tmpdir.join('file.dat').strpath
+    dummy._download_file(URL, path)
+    assert events[-1].kind == 'download'
+    assert events[-1].nbytes == 4
+    dummy._download_file(URL, path, cache=True)
+    assert events[-1].cache == 'hit'
@@ -0,0 +1,40 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import threading
+import time
+
+from ..ratelimit import TokenBucket, get_token_bucket
+
+
+def test_token_bucket_burst():
+    bucket = TokenBucket(10, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+    delays = [bucket.reserve() for _ in range(3)]
+    assert 0.08 < delays[0] <= 0.1
+    assert 0.18 < delays[1] <= 0.2
+    assert 0.28 < delays[2] <= 0.3
+
+
+def test_token_bucket_threads():
+    bucket = TokenBucket(50)
+    times = []
+
+    def worker():
+        bucket.acquire()
+        times.append(time.monotonic())
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 1 immediate request, then one every 20 ms
+    assert max(times) - start >= 9 / 50. - 0.01
+
+
+def test_get_token_bucket():
+    bucket = get_token_bucket('example.com', 5)
+    assert get_token_bucket('example.com', 5) is bucket
+    assert get_token_bucket('example.org', 5) is not bucket
+    assert get_token_bucket('example.com', 2, burst=4) is bucket
+    assert (bucket.rate, bucket.burst) == (2, 4)
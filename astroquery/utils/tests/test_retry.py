@@ -0,0 +1,85 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import email.utils
+import time
+
+import pytest
+import requests
+
+from ...exceptions import CircuitOpenError
+from ..retry import RetryPolicy, CircuitBreaker, get_circuit_breaker
+from ..testing_tools import make_response
+
+
+def test_is_failure():
+    policy = RetryPolicy()
+    assert policy.is_failure(make_response(status_code=503))
+    assert policy.is_failure(make_response(status_code=429))
+    assert not policy.is_failure(make_response(status_code=200))
+    assert not policy.is_failure(make_response(status_code=404))
+    assert policy.is_failure(exception=requests.exceptions.ConnectionError())
+    assert not policy.is_failure(make_response(status_code=500))
+    assert policy.is_failure(exception=requests.exceptions.ConnectTimeout())
+    # the server may have run the request
+    assert not policy.is_failure(exception=requests.exceptions.ReadTimeout())
+    assert not policy.is_failure(exception=requests.exceptions.SSLError())
+    assert not policy.is_failure(exception=requests.exceptions.InvalidURL())
+    assert not policy.is_failure(exception=ValueError())
+
+
+def test_is_retryable():
+    policy = RetryPolicy()
+    assert policy.is_retryable('GET')
+    assert policy.is_retryable('head')
+    assert not policy.is_retryable('POST')
+    assert RetryPolicy(methods=('GET', 'POST')).is_retryable('POST')
+
+
+def test_backoff():
+    policy = RetryPolicy(max_retries=3, backoff_factor=2, max_backoff=6)
+    for attempt, backoff in enumerate([2, 4, 6]):
+        for _ in range(20):
+            assert backoff / 2 <= policy.delay(attempt) <= backoff
+    assert policy.delay(3) is None
+    assert RetryPolicy(max_retries=0).delay(0) is None
+
+
+def test_retry_after():
+    policy = RetryPolicy(max_backoff=60)
+
+    def retry_after(value):
+        return make_response(status_code=503, headers={'Retry-After': value})
+
+    assert policy.delay(0, retry_after('7')) == 7
+    assert policy.delay(0, retry_after('3600')) is None
+    date = email.utils.formatdate(time.time() + 30, usegmt=True)
+    delay = policy.delay(0, retry_after(date))
+    assert 25 < delay <= 30
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker('example.com', failure_threshold=2,
+                             reset_timeout=0.05)
+    breaker.record_failure()
+    breaker.check()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    time.sleep(0.06)
+    # half-open: a single trial request goes through
+    breaker.check()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    breaker.record_success()
+    assert not breaker.is_open
+    breaker.check()
+
+
+def test_get_circuit_breaker():
+    breaker = get_circuit_breaker('example.com')
+    assert get_circuit_breaker('example.com') is breaker
+    assert get_circuit_breaker('example.org') is not breaker
+    assert get_circuit_breaker('example.com', 3, 5).failure_threshold == 3
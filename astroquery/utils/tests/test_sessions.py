@@ -0,0 +1,46 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import socket
+
+from requests.adapters import HTTPAdapter
+
+from ... import connection_conf
+from ...query import BaseQuery
+from ..sessions import PooledAdapter, close_pools
+
+
+def test_shared_pools():
+    session1 = BaseQuery()._session
+    session2 = BaseQuery()._session
+    assert session1 is not session2
+    adapter = session1.get_adapter('https://example.com/a')
+    assert isinstance(adapter, PooledAdapter)
+    assert session2.get_adapter('https://EXAMPLE.com/b?c=d') is adapter
+    assert session1.get_adapter('http://example.com/a') is not adapter
+    assert session1.get_adapter('https://example.org/a') is not adapter
+
+    # closing a session keeps the shared pools open
+    session1.close()
+    assert session2.get_adapter('https://example.com/a') is adapter
+    assert adapter.poolmanager.pools is not None
+
+    close_pools()
+    assert session2.get_adapter('https://example.com/a') is not adapter
+
+
+def test_pool_configuration():
+    close_pools()
+    with connection_conf.set_temp('connection_pool_size', 42):
+        adapter = BaseQuery()._session.get_adapter('https://example.net/')
+    assert adapter._pool_maxsize == 42
+    assert any(option[1:] == (socket.SO_KEEPALIVE, 1)
+               for option in adapter.poolmanager.connection_pool_kw[
+                   'socket_options'])
+    close_pools()
+
+
+def test_mounted_adapter():
+    session = BaseQuery()._session
+    adapter = HTTPAdapter()
+    session.mount('https://example.com/special', adapter)
+    assert session.get_adapter('https://example.com/special/x') is adapter
+    assert session.get_adapter('https://example.com/other') is not adapter
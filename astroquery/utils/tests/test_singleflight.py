@@ -0,0 +1,62 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ..singleflight import SingleFlight
+
+
+def test_single_flight():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def call():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return len(calls)
+
+    with ThreadPoolExecutor(5) as executor:
+        leader = executor.submit(flight.do, 'key', call)
+        started.wait(5)
+        followers = [executor.submit(flight.do, 'key', call)
+                     for i in range(3)]
+        other = executor.submit(flight.do, 'other', lambda: 'other')
+        assert other.result() == ('other', False)
+        release.set()
+        assert leader.result() == (1, False)
+        assert [follower.result() for follower in followers] == [(1, True)] * 3
+    assert len(flight) == 0
+
+    def fail():
+        raise ValueError('failed')
+
+    with pytest.raises(ValueError):
+        flight.do('key', fail)
+    assert flight.do('key', call) == (2, False)
+
+
+def test_single_flight_aio():
+    flight = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def run():
+        return await asyncio.gather(*[flight.do_aio('key', call)
+                                      for i in range(3)])
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(run()) == [(1, False), (1, True),
+                                                  (1, True)]
+    finally:
+        loop.close()
+    assert len(flight) == 0
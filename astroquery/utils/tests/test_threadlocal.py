@@ -0,0 +1,31 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import threading
+
+import pytest
+
+from ..threadlocal import ThreadLocalAttribute
+
+
+class Service(object):
+    flag = ThreadLocalAttribute(False)
+
+
+def test_thread_local_attribute():
+    service1 = Service()
+    service2 = Service()
+    assert service1.flag is False
+    service1.flag = True
+    assert service1.flag is True
+    assert service2.flag is False
+
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(service1.flag))
+    thread.start()
+    thread.join()
+    assert seen == [False]
+
+    del service1.flag
+    assert service1.flag is False
+    with pytest.raises(AttributeError):
+        del service1.flag
+    assert isinstance(Service.flag, ThreadLocalAttribute)
@@ -0,0 +1,56 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Per-thread state of the query objects.
+
+The query classes are used through module-level instances, which several
+threads may query at once.  The state a query leaves on the instance for
+later use, such as the last response or a flag read by the parser, is kept
+per thread with `ThreadLocalAttribute`, so that concurrent queries do not
+see each other's.
+"""
+import threading
+import weakref
+
+__all__ = ['ThreadLocalAttribute']
+
+
+class ThreadLocalAttribute(object):
+    """
+    A descriptor for an instance attribute holding a separate value in each
+    thread.  Threads which did not set the attribute see ``default``.
+
+    Parameters
+    ----------
+    default : object
+        The value of the attribute until it is set in a thread.
+    """
+
+    def __init__(self, default=None):
+        self.default = default
+        self.name = None
+        self._local = threading.local()
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def _values(self):
+        # The values of the current thread, per instance
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = weakref.WeakKeyDictionary()
+            return values
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return self._values().get(obj, self.default)
+
+    def __set__(self, obj, value):
+        self._values()[obj] = value
+
+    def __delete__(self, obj):
+        try:
+            del self._values()[obj]
+        except KeyError:
+            raise AttributeError(self.name)
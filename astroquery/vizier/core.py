@@ -33,6 +33,8 @@ __doctest_skip__ = ['VizierClass.*']
 @async_to_sync
 class VizierClass(BaseQuery):
 
+    aio_transport = True
+
     _str_schema = schema.Or(*six.string_types)
     _schema_columns = schema.Schema([_str_schema],
                                     error="columns must be a list of strings")
@@ -169,7 +171,7 @@ class VizierClass(BaseQuery):
         self._keywords = None
 
     def find_catalogs(self, keywords, include_obsolete=False, verbose=False,
-                      max_catalogs=None, return_type='votable'):
+                      max_catalogs=None, return_type='votable', cache=True):
         """
         Search Vizier for catalogs based on a set of keywords, e.g. author name
 
@@ -185,6 +187,9 @@ class VizierClass(BaseQuery):
         max_catalogs : int or None
             The maximum number of catalogs to return.  If ``None``, all
             catalogs will be returned.
+        cache : bool or 'revalidate'
+            Whether to use the cache.  ``'revalidate'`` checks with the
+            server that a cached list of catalogs is still current.
 
         Returns
         -------
@@ -216,7 +221,7 @@ class VizierClass(BaseQuery):
             data_payload['-meta.max'] = max_catalogs
         response = self._request(
             method='POST', url=self._server_to_url(return_type=return_type),
-            data=data_payload, timeout=self.TIMEOUT)
+            data=data_payload, timeout=self.TIMEOUT, cache=cache)
 
         if 'STOP, Max. number of RESOURCE reached' in response.text:
             raise ValueError("Maximum number of catalogs exceeded.  Try "
@@ -616,6 +621,11 @@ class VizierClass(BaseQuery):
             script += "\n" + str(self.keywords)
         return script
 
+    def _parse_result_key(self):
+        # the query methods parse with the default options, the columns,
+        # filters and row limit being part of the requests
+        return "get_catalog_names=False invalid='warn'"
+
     def _parse_result(self, response, get_catalog_names=False, verbose=False,
                       invalid='warn'):
         """
@@ -690,12 +700,14 @@ def parse_vizier_tsvfile(data, verbose=False):
 
     Parameters
     ----------
-    data : ascii str
+    data : bytes or ascii str
         An ascii string containing the vizier-formatted list of tables
     """
 
+    if isinstance(data, six.text_type):
+        data = data.encode('ascii')
     # http://stackoverflow.com/questions/4664850/find-all-occurrences-of-a-substring-in-python
-    split_indices = [m.start() for m in re.finditer('\n\n#', data)]
+    split_indices = [m.start() for m in re.finditer(b'\n\n#', data)]
     # we want to slice out chunks of the file each time
     split_limits = zip(split_indices[:-1], split_indices[1:])
     tables = [ascii.read(BytesIO(data[a:b]), format='fast_tab', delimiter='\t',
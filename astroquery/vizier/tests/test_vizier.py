@@ -7,9 +7,9 @@ from astropy.table import Table
 import astropy.units as u
 import six
 from six.moves import urllib_parse as urlparse
-from ... import vizier
+from ... import cache_conf, vizier
 from ...utils import commons
-from ...utils.testing_tools import MockResponse
+from ...utils.testing_tools import MockResponse, make_response
 
 if six.PY3:
     str, = six.string_types
@@ -117,6 +117,14 @@ def test_parse_result(filepath, objlen):
     assert isinstance(result[result.keys()[0]], Table)
 
 
+def test_parse_tsvfile():
+    data = b'#\n\n#Title: tsv\nRA\tDec\n1.5\t-2.5\n3.5\t-4.5\n\n#END\n'
+    for content in (data, data.decode('ascii')):
+        tables = vizier.core.parse_vizier_tsvfile(content)
+        assert len(tables) == 1
+        npt.assert_array_equal(tables[0]['Dec'], [-2.5, -4.5])
+
+
 def test_query_region_async(patch_post):
     target = commons.ICRSCoordGenerator(ra=299.590, dec=35.201,
                                         unit=(u.deg, u.deg))
@@ -135,6 +143,37 @@ def test_query_region(patch_post):
     assert isinstance(result, commons.TableList)
 
 
+def test_parsed_results(monkeypatch, tmpdir):
+    # MockResponse is not cached
+    def request(session, method, url, **kwargs):
+        with open(data_path('viz.xml'), 'rb') as f:
+            return make_response(f.read(), url=url)
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    target = commons.ICRSCoordGenerator(ra=299.590, dec=35.201,
+                                        unit=(u.deg, u.deg))
+    viz = vizier.core.Vizier()
+    viz.cache_location = tmpdir.strpath
+    with cache_conf.set_temp('cache_parsed_results', True):
+        result = viz.query_region(target, radius=5 * u.deg,
+                                  catalog=["HIP", "NOMAD", "UCAC"])
+        # the tables are read back from the cache
+        monkeypatch.setattr(vizier.core, 'parse_vizier_votable', None)
+        cached = viz.query_region(target, radius=5 * u.deg,
+                                  catalog=["HIP", "NOMAD", "UCAC"])
+    assert isinstance(cached, commons.TableList)
+    assert cached.keys() == result.keys()
+    for name in result.keys():
+        assert cached[name].meta == result[name].meta
+        assert cached[name].colnames == result[name].colnames
+        for column in result[name].colnames:
+            assert cached[name][column].unit == result[name][column].unit
+            assert (cached[name][column].description
+                    == result[name][column].description)
+            npt.assert_array_equal(cached[name][column],
+                                   result[name][column])
+
+
 def test_query_regions(patch_post):
     """
     This ONLY tests that calling the function works -
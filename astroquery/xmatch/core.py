@@ -20,6 +20,8 @@ except ImportError:
 class XMatchClass(BaseQuery):
     URL = conf.url
     TIMEOUT = conf.timeout
+    # the cross-matches POSTed to the service only query it
+    idempotent_post = True
 
     def query(self, cat1, cat2, max_distance,
               colRA1=None, colDec1=None, colRA2=None, colDec2=None,
@@ -123,10 +125,12 @@ class XMatchClass(BaseQuery):
             fp = six.StringIO()
             cat.write(fp, format='ascii.csv')
             fp.seek(0)
-            kwargs['files'] = {catstr: ('cat1.csv', fp.read())}
+            kwargs['files'] = {catstr: ('cat1.csv', fp)}
         else:
-            # assume it's a file-like object, support duck-typing
-            kwargs['files'] = {catstr: ('cat1.csv', cat.read())}
+            # assume it's a file-like object, support duck-typing.  It is
+            # passed as is, so that the cache key is hashed from it in
+            # chunks rather than from a copy of the upload.
+            kwargs['files'] = {catstr: ('cat1.csv', cat)}
 
         if not self.is_table_available(cat):
             if ((colRA is None) or (colDec is None)):
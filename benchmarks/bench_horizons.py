@@ -0,0 +1,21 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+from astroquery.jplhorizons import HorizonsClass
+
+from .fixtures import Benchmark, SLOW_SIZES, read_fixture, scale_lines
+
+
+class ParseHorizons(Benchmark):
+    params = (['ephemerides', 'elements', 'vectors'], SLOW_SIZES)
+    param_names = ['query_type', 'rows']
+
+    def setup(self, query_type, rows):
+        self.horizons = HorizonsClass(id='Ceres', location='500',
+                                      id_type='smallbody')
+        self.src = scale_lines(
+            read_fixture('jplhorizons', 'ceres_{0}.txt'.format(query_type)),
+            '$$SOE', '$$EOE', rows)
+        # the parser follows the state left by the query, per thread
+        self.horizons.query_type = query_type
+
+    def time_parse_horizons(self, query_type, rows):
+        self.horizons._parse_horizons(self.src)
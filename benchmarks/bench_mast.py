@@ -0,0 +1,16 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import json
+
+from astroquery.mast.discovery_portal import _json_to_table
+
+from .fixtures import Benchmark, read_fixture, repeat
+
+
+class JSONToTable(Benchmark):
+
+    def setup(self, rows):
+        self.json_obj = json.loads(read_fixture('mast', 'caom.json'))
+        self.json_obj['data'] = repeat(self.json_obj['data'], rows)
+
+    def time_json_to_table(self, rows):
+        _json_to_table(self.json_obj)
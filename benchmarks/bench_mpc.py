@@ -0,0 +1,49 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import json
+
+import astropy.units as u
+
+from astroquery.mpc import MPCClass
+from astroquery.utils.mocks import make_response
+
+from .fixtures import (Benchmark, SLOW_SIZES, read_fixture, repeat,
+                       scale_lines)
+
+
+class ParseEphemeris(Benchmark):
+    params = SLOW_SIZES
+
+    def setup(self, rows):
+        content = scale_lines(
+            read_fixture('mpc', '2P_ephemeris_500-a-t.html'),
+            '            h m s', '</pre>', rows)
+        self.response = make_response(
+            content.encode('utf-8'), encoding='utf-8',
+            body={'TextArea': '2P', 'c': '500', 'raty': 'a', 's': 't'})
+        # the parser follows the state left by the query, per thread
+        self.mpc = MPCClass()
+        self.mpc.query_type = 'ephemeris'
+        self.mpc._ra_format = None
+        self.mpc._dec_format = None
+        self.mpc._proper_motion_unit = u.Unit('arcsec/h')
+        self.mpc._unc_links = False
+
+    def time_parse_result(self, rows):
+        self.mpc._parse_result(self.response)
+
+
+class ParseObservations(Benchmark):
+    params = SLOW_SIZES
+
+    def setup(self, rows):
+        observations = json.loads(read_fixture('mpc', 'mpc_obs.dat'))
+        self.response = make_response(
+            json.dumps(repeat(observations, rows)).encode('utf-8'),
+            encoding='utf-8')
+        self.mpc = MPCClass()
+        self.mpc.query_type = 'observations'
+        self.mpc.obsformat = 'table'
+        self.mpc.get_raw_response = False
+
+    def time_parse_result(self, rows):
+        self.mpc._parse_result(self.response)
@@ -0,0 +1,47 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import shutil
+import tempfile
+
+from astroquery import cache_conf
+from astroquery.query import AstroQuery, BaseQuery
+from astroquery.utils.mocks import make_response
+
+from .fixtures import Benchmark, SIZES, repeat
+
+URL = 'http://benchmark.astroquery/query'
+PARAMS = {'target': 'M1', 'radius': '1 deg'}
+
+
+class BenchmarkQuery(BaseQuery):
+    pass
+
+
+class CacheHit(Benchmark):
+    # asv's defaults, the requests taking microseconds
+    number = 0
+    repeat = 0
+    warmup_time = -1
+    params = (['none', 'gzip'], SIZES)
+    param_names = ['compression', 'rows']
+
+    def setup(self, compression, rows):
+        self.query = BenchmarkQuery()
+        self.query.cache_location = tempfile.mkdtemp()
+        content = '\n'.join(repeat(['101.2871,-16.7161,HD 12345,7.52',
+                                    '101.2950,-16.6994,HD 12346,11.04'],
+                                   rows))
+        with cache_conf.set_temp('cache_compression', compression):
+            self.query._get_cache_backend().set(
+                AstroQuery('GET', URL, params=PARAMS).hash(),
+                make_response(content.encode('utf-8'), url=URL,
+                              encoding='utf-8',
+                              headers={'Content-Type': 'text/csv'}))
+
+    def teardown(self, compression, rows):
+        shutil.rmtree(self.query.cache_location)
+
+    def time_request(self, compression, rows):
+        self.query._request('GET', URL, params=PARAMS)
+
+    def time_request_content(self, compression, rows):
+        self.query._request('GET', URL, params=PARAMS).content
@@ -0,0 +1,13 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+from astroquery.simbad.core import SimbadVOTableResult
+
+from .fixtures import Benchmark, read_fixture, scale_votable
+
+
+class VOTableResult(Benchmark):
+
+    def setup(self, rows):
+        self.txt = scale_votable(read_fixture('simbad', 'm1.data'), rows)
+
+    def time_table(self, rows):
+        SimbadVOTableResult(self.txt).table
@@ -0,0 +1,29 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import io
+
+from astropy.table import Table
+
+from astroquery.utils.tap.xmlparser.utils import read_http_response
+
+from .fixtures import (Benchmark, SIZES, data_path, scale_table,
+                       votable_bytes)
+
+
+class ReadHTTPResponse(Benchmark):
+    params = (['votable', 'csv'], SIZES)
+    param_names = ['format', 'rows']
+
+    def setup(self, output_format, rows):
+        table = scale_table(
+            Table.read(data_path('utils.tap', 'job_1.vot'), format='votable'),
+            rows)
+        if output_format == 'votable':
+            # the serialization of the results of the TAP services
+            self.content = votable_bytes(table, tabledata_format='binary2')
+        else:
+            content = io.StringIO()
+            table.write(content, format='ascii.csv')
+            self.content = content.getvalue().encode('utf-8')
+
+    def time_read_http_response(self, output_format, rows):
+        read_http_response(io.BytesIO(self.content), output_format)
@@ -0,0 +1,27 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+from astroquery.vizier.core import parse_vizier_tsvfile, parse_vizier_votable
+
+from .fixtures import Benchmark, read_fixture, repeat, scale_votable
+
+
+class VOTable(Benchmark):
+
+    def setup(self, rows):
+        self.data = scale_votable(read_fixture('vizier', 'viz.xml'),
+                                  rows).encode('utf-8')
+
+    def time_parse_vizier_votable(self, rows):
+        parse_vizier_votable(self.data)
+
+
+class TSV(Benchmark):
+
+    def setup(self, rows):
+        rows = repeat(['101.2871\t-16.7161\tHD 12345\t7.52',
+                       '101.2950\t-16.6994\tHD 12346\t11.04'], rows)
+        self.data = '\n'.join(['#', '', '#Title: benchmark',
+                               '_RAJ2000\t_DEJ2000\tName\tVmag']
+                              + rows + ['', '#END', '']).encode('ascii')
+
+    def time_parse_vizier_tsvfile(self, rows):
+        parse_vizier_tsvfile(self.data)
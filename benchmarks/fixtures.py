@@ -0,0 +1,90 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Payloads of the benchmarks, built from the responses stored with the tests
+of the services by repeating their rows up to the requested size.
+"""
+import io
+import itertools
+import os
+import re
+
+import numpy as np
+
+import astroquery
+
+__all__ = ['SIZES', 'SLOW_SIZES', 'Benchmark', 'data_path', 'read_fixture',
+           'repeat', 'scale_lines', 'scale_votable', 'scale_table',
+           'votable_bytes']
+
+#: Numbers of rows the parsers are benchmarked with
+SIZES = [1000, 100000, 10000000]
+#: Numbers of rows for the parsers converting the rows one by one in Python,
+#: which take hours for the largest of `SIZES`
+SLOW_SIZES = [1000, 10000, 100000]
+
+
+class Benchmark:
+    """
+    Settings of the benchmarks parsing a payload of ``rows`` rows, timed
+    once per sample and with few samples for the largest payloads.
+    """
+    params = SIZES
+    param_names = ['rows']
+    number = 1
+    repeat = (1, 5, 60.)
+    warmup_time = 0.
+    timeout = 3600.
+
+
+def data_path(module, filename):
+    """ Path of the test data file ``filename`` of the service ``module`` """
+    return os.path.join(os.path.dirname(astroquery.__file__),
+                        *(module.split('.') + ['tests', 'data', filename]))
+
+
+def read_fixture(module, filename, mode='r'):
+    with open(data_path(module, filename), mode) as f:
+        return f.read()
+
+
+def repeat(items, nrows):
+    """ The first ``nrows`` items of ``items`` repeated over and over """
+    return list(itertools.islice(itertools.cycle(items), nrows))
+
+
+def scale_lines(text, start, end, nrows):
+    """
+    ``text`` with its lines between the (excluded) lines starting with
+    ``start`` and ``end`` repeated to ``nrows`` lines.
+    """
+    lines = text.splitlines(True)
+    first = next(i for i, line in enumerate(lines) if line.startswith(start))
+    last = next(i for i, line in enumerate(lines)
+                if i > first and line.startswith(end))
+    return ''.join(lines[:first + 1] + repeat(lines[first + 1:last], nrows)
+                   + lines[last:])
+
+
+def scale_votable(text, nrows):
+    """
+    ``text``, a VOTable in the TABLEDATA serialization, with the rows of its
+    first table repeated to ``nrows`` rows.  The other tables are unchanged.
+    """
+    match = re.search(r'(?s)<TABLEDATA>\s*(.*?)\s*</TABLEDATA>', text)
+    rows = re.findall(r'(?s)<TR>.*?</TR>', match.group(1))
+    return ''.join([text[:match.start(1)],
+                    '\n'.join(repeat(rows, nrows)),
+                    text[match.end(1):]])
+
+
+def scale_table(table, nrows):
+    """ ``table`` (an `~astropy.table.Table`) with its rows repeated """
+    return table[np.resize(np.arange(len(table)), nrows)]
+
+
+def votable_bytes(table, tabledata_format='tabledata'):
+    """ ``table`` serialized as a VOTable """
+    from astropy.io.votable import from_table
+    out = io.BytesIO()
+    from_table(table).to_xml(out, tabledata_format=tabledata_format)
+    return out.getvalue()
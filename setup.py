@@ -82,14 +82,9 @@ package_info = get_package_info()
 package_info['package_data'].setdefault(PACKAGENAME, [])
 package_info['package_data'][PACKAGENAME].append('data/*')
 
-# These lines are only needed if astroquery acquires command line scripts
-# # Define entry points for command-line scripts
-# entry_points = {}
-# entry_points = {'console_scripts': []}
-
-# Currently the only entry points installed by Astropy are hooks to
-# zest.releaser for doing Astropy's releases
-entry_points = {}
+# Define entry points for command-line scripts, listed in setup.cfg, and
+# the hooks to zest.releaser for doing Astropy's releases
+entry_points = {'console_scripts': []}
 for hook in [('prereleaser', 'middle'), ('releaser', 'middle'),
              ('postreleaser', 'before'), ('postreleaser', 'middle')]:
     hook_ep = 'zest.releaser.' + '.'.join(hook)